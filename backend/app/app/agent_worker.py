@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Agent worker: runs the agent runs enqueued by the API when `RUN_QUEUE_ENABLED` is set (see `RunQueue`).
+
+Run as many worker processes as needed, independently of the API: `python app/agent_worker.py`. On SIGTERM or
+SIGINT, the worker stops reading the queue and lets its runs in progress finish (`RUN_WORKER_SHUTDOWN_TIMEOUT`).
+"""
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import socket
+
+from app.core.config import settings
+from app.core.resources import process_resources
+from app.services.chat_agent.run_queue import AgentRunWorker, RunQueue
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    """Start up, process the run queue until stopped, then shut down."""
+    async with process_resources():
+        worker = AgentRunWorker(
+            RunQueue(),
+            consumer=f"{socket.gethostname()}-{os.getpid()}",
+            concurrency=settings.RUN_WORKER_CONCURRENCY,
+        )
+        worker_task = asyncio.create_task(worker.arun_forever())
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker_task.cancel)
+        with contextlib.suppress(asyncio.CancelledError):
+            await worker_task
+    logger.info("Agent worker stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -18,30 +18,39 @@ async def read_users(
     ...
 """
 from collections.abc import AsyncGenerator
+from functools import lru_cache
+from typing import Optional
 
-import redis.asyncio as aioredis
+from fastapi import WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi_nextauth_jwt import NextAuthJWT
-from langchain_community.storage import RedisStore
+from fastapi_nextauth_jwt.exceptions import NextAuthJWTException
 from redis import Redis as RedisSync
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, ConnectionPool, Redis
 from sqlmodel.ext.asyncio.session import AsyncSession
-from starlette.requests import Request
+from starlette.requests import HTTPConnection
 
 from app.core.config import settings
-from app.db.session import SessionLocal, SessionLocalCelery
+from app.core.prometheus import track_redis_pool
+from app.db.session import db_resources
 from app.utils.minio_client import MinioClient
 
 reusable_oauth2 = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/access-token")
 
 
-def get_redis_store() -> RedisStore:
-    store = RedisStore(
-        redis_url=f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-        client_kwargs={"db": 2},
-        namespace="embedding_caches",
+@lru_cache(maxsize=1)
+def get_embedding_cache_redis_client() -> RedisSync:
+    """
+    Returns the synchronous Redis client of the embedding cache (binary values, shared by the process).
+
+    Used by sync embedding calls only, async ones go through `get_redis_client` (same database).
+    """
+    return RedisSync(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        db=0,
+        socket_keepalive=True,
     )
-    return store
 
 
 def get_redis_client_sync() -> RedisSync:
@@ -54,15 +63,75 @@ def get_redis_client_sync() -> RedisSync:
     )
 
 
-async def get_redis_client() -> Redis:
-    """Returns an asynchronous Redis client as a coroutine function which should be
-    awaited."""
-    return await aioredis.from_url(
+redis_pool: Optional[ConnectionPool] = None
+redis_client: Optional[Redis] = None
+redis_blocking_pool: Optional[ConnectionPool] = None
+redis_blocking_client: Optional[Redis] = None
+
+
+def init_redis_pool() -> ConnectionPool:
+    """
+    Create the process-wide asynchronous Redis connection pool and the client sharing it.
+
+    When all connections are checked out, callers wait up to `REDIS_POOL_TIMEOUT` seconds for one to be released
+    instead of failing immediately with "Too many connections".
+    """
+    global redis_pool, redis_client  # pylint: disable=global-statement
+    redis_pool = BlockingConnectionPool.from_url(
         f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-        max_connections=10,
+        max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_keepalive=True,
         encoding="utf8",
         decode_responses=True,
     )
+    redis_client = Redis(connection_pool=redis_pool)
+    track_redis_pool(redis_pool)
+    return redis_pool
+
+
+async def close_redis_pool() -> None:
+    """Disconnect all pooled Redis connections (called on shutdown)."""
+    global redis_pool, redis_client, redis_blocking_pool, redis_blocking_client  # pylint: disable=global-statement
+    for pool in (redis_pool, redis_blocking_pool):
+        if pool is not None:
+            await pool.disconnect()
+    redis_pool = None
+    redis_client = None
+    redis_blocking_pool = None
+    redis_blocking_client = None
+
+
+async def get_redis_client() -> Redis:
+    """Returns the shared asynchronous Redis client as a coroutine function which should
+    be awaited.
+
+    All callers share one connection pool, created in the FastAPI lifespan or lazily
+    on first use (e.g. in Celery workers or scripts).
+    """
+    if redis_client is None:
+        init_redis_pool()
+    assert redis_client is not None
+    return redis_client
+
+
+async def get_redis_blocking_client() -> Redis:
+    """Returns the asynchronous Redis client of the blocking reads (`XREAD BLOCK` of the run event streams).
+
+    Each reader holds a connection while it waits for events, so the readers have their own pool (up to
+    `REDIS_BLOCKING_POOL_MAX_CONNECTIONS`): many open streams do not exhaust the shared pool.
+    """
+    global redis_blocking_pool, redis_blocking_client  # pylint: disable=global-statement
+    if redis_blocking_client is None:
+        redis_blocking_pool = ConnectionPool.from_url(
+            f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
+            max_connections=settings.REDIS_BLOCKING_POOL_MAX_CONNECTIONS,
+            socket_keepalive=True,
+            encoding="utf8",
+            decode_responses=True,
+        )
+        redis_blocking_client = Redis(connection_pool=redis_blocking_pool)
+    return redis_blocking_client
 
 
 async def get_db() -> AsyncGenerator[
@@ -71,7 +140,7 @@ async def get_db() -> AsyncGenerator[
 ]:
     """Returns an asynchronous database session as a coroutine function which should be
     awaited."""
-    async with SessionLocal() as session:
+    async with db_resources.session_local() as session:
         yield session
 
 
@@ -81,7 +150,7 @@ async def get_jobs_db() -> AsyncGenerator[
 ]:
     """Returns an asynchronous database session as a coroutine function which should be
     awaited."""
-    async with SessionLocalCelery() as session:
+    async with db_resources.session_local_celery() as session:
         yield session
 
 
@@ -95,14 +164,30 @@ def minio_auth() -> MinioClient:
     )
 
 
-def get_jwt(req: Request) -> NextAuthJWT:
-    """Returns a NextAuthJWT instance."""
+def get_jwt(req: HTTPConnection) -> NextAuthJWT:
+    """Returns a NextAuthJWT instance.
+
+    Also used by WebSocket routes: the token is validated on the handshake, which is refused if it is missing or
+    invalid.
+    """
     if not settings.ENABLE_AUTH:
         return None
     if not settings.NEXTAUTH_SECRET:
         raise ValueError("Authentication enabled, but NextAuth secret is not set")
 
-    return NextAuthJWT(
-        secret=settings.NEXTAUTH_SECRET,
-        csrf_prevention_enabled=False,
-    )(req)
+    try:
+        return NextAuthJWT(
+            secret=settings.NEXTAUTH_SECRET,
+            csrf_prevention_enabled=False,
+        )(req)
+    except NextAuthJWTException as e:
+        if isinstance(req, WebSocket):
+            raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.message) from e
+        raise
+
+
+def get_jwt_subject(jwt: Optional[dict]) -> Optional[str]:
+    """Returns the user of a decoded JWT (`sub`, or `email`), None without authentication."""
+    if not jwt:
+        return None
+    return jwt.get("sub") or jwt.get("email")
@@ -1,21 +1,29 @@
 # -*- coding: utf-8 -*-
-import asyncio
 import logging
-from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, status
 from fastapi.responses import StreamingResponse
 from langchain.agents import AgentExecutor
 
-from app.api.deps import get_jwt
+from app.api.deps import get_jwt, get_jwt_subject
 from app.core.config import settings
 from app.deps import agent_deps
-from app.schemas.message_schema import IChatQuery
+from app.schemas.message_schema import IAgentRun, IChatQuery
 from app.services.chat_agent.helpers.run_helper import is_running, stop_run
-from app.services.chat_agent.meta_agent import get_conv_token_buffer_memory
-from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
-from app.utils.streaming.helpers import event_generator, handle_exceptions
+from app.services.chat_agent.run_queue import RunQueue, astart_agent_run
+from app.utils.fastapi_globals import g
+from app.utils.streaming.helpers import (
+    RUN_ID_HEADER,
+    SSE_HEADERS,
+    SSE_MEDIA_TYPE,
+    accepts_event_stream,
+    event_generator,
+    ndjson_event_generator,
+    sse_event_generator,
+    websocket_send_events,
+)
+from app.utils.streaming.run_events import RunEventStream, start_run_event_publisher
 from app.utils.streaming.StreamingJsonListResponse import StreamingJsonListResponse
 
 router = APIRouter()
@@ -52,61 +60,114 @@ async def run_cancel(
     return True
 
 
+@router.get("/run/{run_id}/events")
+async def run_events(
+    run_id: str,
+    jwt: Annotated[dict, Depends(get_jwt)],
+    last_event_id: Annotated[Optional[str], Header()] = None,
+    after: Annotated[Optional[str], Query(description="Event id to resume after, if not in Last-Event-ID")] = None,
+) -> StreamingResponse:
+    """
+    Stream the events of a run as Server-Sent Events, from the start or after `Last-Event-ID`, without running the
+    agent again. Only runs started with the event stream transport keep their events, only the user who started the
+    run can read them.
+    """
+    logger.info(f"User JWT from request: {jwt}")
+    events = RunEventStream(run_id)
+    if not await events.aexists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown run {run_id}")
+    if not await events.ais_owned_by(get_jwt_subject(jwt)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Run {run_id} belongs to another user")
+    return StreamingResponse(
+        sse_event_generator(events, last_event_id or after),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS,
+    )
+
+
+@router.websocket("/run/{run_id}/ws")
+async def run_events_websocket(
+    websocket: WebSocket,
+    run_id: str,
+    jwt: Annotated[dict, Depends(get_jwt)],
+    last_event_id: Optional[str] = None,
+) -> None:
+    """
+    Send the events of a run on a WebSocket, from the start or after `last_event_id`. The JWT is validated on the
+    handshake, only the user who started the run can read its events.
+    """
+    events = RunEventStream(run_id)
+    if not await events.aexists():
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Unknown run {run_id}")
+        return
+    if not await events.ais_owned_by(get_jwt_subject(jwt)):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=f"Run {run_id} belongs to another user")
+        return
+    await websocket.accept()
+    await websocket_send_events(websocket, events, last_event_id)
+
+
 @router.post("/agent", dependencies=[Depends(agent_deps.set_global_tool_context)])
 async def agent_chat(
     chat: IChatQuery,
     jwt: Annotated[dict, Depends(get_jwt)],
     meta_agent: AgentExecutor = Depends(get_meta_agent_with_api_key),
+    accept: Annotated[Optional[str], Header()] = None,
 ) -> StreamingResponse:
     """
     This function handles the chat interaction with an agent. It converts the chat
-    messages to the Langchain format, creates a memory of the conversation, and sets up
-    a stream handler. It then creates an asyncio task to handle the conversation with
-    the agent and returns a streaming response of the conversation.
+    messages to the Langchain format, loads the chat history window (cached per conversation),
+    and sets up a stream handler. It then starts a cancellable run (an asyncio task) to handle the
+    conversation with the agent and returns a streaming response of the conversation.
+
+    With `RUN_QUEUE_ENABLED`, the run is enqueued for the agent workers instead (see `RunQueue`) and the response
+    streams its events from the run event stream. The run id is also returned in the `X-Run-Id` header.
+
+    The response is newline-separated JSON by default. With `Accept: text/event-stream`, the events of the run are
+    published to a replay buffer and streamed as Server-Sent Events with ids, a client that lost the connection
+    resumes with `/run/{run_id}/events` (or `/run/{run_id}/ws`) and `Last-Event-ID`.
 
     Args:
         chat (IChatQuery): The chat query containing the messages and other details.
         jwt (Annotated[dict, Depends(get_jwt)]): The JWT token from the request.
         meta_agent (AgentExecutor, optional): The MetaAgent instance. Defaults to the one returned by get_
         meta_agent_with_api_key.
+        accept (Optional[str]): The Accept header, selects the transport.
 
     Returns:
         StreamingResponse: The streaming response of the conversation.
     """
     logger.info(f"User JWT from request: {jwt}")
-
-    api_key = chat.api_key
-    if api_key is None or api_key == "":
-        api_key = settings.OPENAI_API_KEY
-
-    chat_messages = [m.to_langchain() for m in chat.messages]
-    memory = get_conv_token_buffer_memory(
-        chat_messages[:-1],  # type: ignore
-        api_key,
-    )
-    stream_handler = AsyncIteratorCallbackHandler()
-    chat_content = chat_messages[-1].content if chat_messages[-1] is not None else ""
-    asyncio.create_task(
-        handle_exceptions(
-            meta_agent.arun(
-                input=chat_content,
-                chat_history=memory.load_memory_variables({})["chat_history"],
-                callbacks=[stream_handler],
-                user_settings=chat.settings,
-                tags=[
-                    "agent_chat",
-                    f"user_email={chat.user_email}",
-                    f"conversation_id={chat.conversation_id}",
-                    f"message_id={chat.new_message_id}",
-                    f"timestamp={datetime.now()}",
-                    f"version={chat.settings.version if chat.settings is not None else 'N/A'}",
-                ],
-            ),
-            stream_handler,
+    run_id = g.query_context["run_id"]
+
+    if settings.RUN_QUEUE_ENABLED:
+        events = RunEventStream(run_id)
+        await events.aset_owner(get_jwt_subject(jwt))
+        await RunQueue().aenqueue(IAgentRun(run_id=run_id, chat=chat))
+        if accepts_event_stream(accept):
+            return StreamingResponse(
+                sse_event_generator(events),
+                media_type=SSE_MEDIA_TYPE,
+                headers={**SSE_HEADERS, RUN_ID_HEADER: run_id},
+            )
+        return StreamingResponse(
+            ndjson_event_generator(events),
+            media_type="text/plain",
+            headers={RUN_ID_HEADER: run_id},
         )
-    )
 
+    stream_handler, _ = await astart_agent_run(chat, meta_agent, run_id)
+    if accepts_event_stream(accept):
+        events = RunEventStream(run_id)
+        await events.aset_owner(get_jwt_subject(jwt))
+        start_run_event_publisher(stream_handler, events)
+        return StreamingResponse(
+            sse_event_generator(events),
+            media_type=SSE_MEDIA_TYPE,
+            headers={**SSE_HEADERS, RUN_ID_HEADER: run_id},
+        )
     return StreamingJsonListResponse(
         event_generator(stream_handler),
         media_type="text/plain",
+        headers={RUN_ID_HEADER: run_id},
     )
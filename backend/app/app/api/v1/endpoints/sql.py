@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 # mypy: disable-error-code="attr-defined"
-from fastapi import APIRouter
-from fastapi_cache.decorator import cache
+from typing import Annotated, Optional
 
-from app.db.session import sql_tool_db
-from app.schemas.response_schema import IGetResponseBase, create_response
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_jwt
+from app.core.config import settings
+from app.db.session import db_resources
+from app.db.sql_query_cache import publish_invalidation
+from app.schemas.response_schema import IGetResponseBase, IResponseBase, create_response
 from app.schemas.tool_schemas.sql_tool_schema import ExecutionResult
 from app.utils.sql import is_sql_query_safe
 
@@ -12,17 +16,22 @@ router = APIRouter()
 
 
 @router.get("/execute")
-@cache(expire=600)  # -> Bug on POST requests https://github.com/long2ice/fastapi-cache/issues/113
 async def execute_sql(
     statement: str,
 ) -> IGetResponseBase[ExecutionResult]:
-    """Executes an SQL query on the database and returns the result."""
+    """
+    Executes an SQL query on the database and returns the result.
+
+    Results are cached in the query result cache shared with the SQL tool, keyed on the normalized statement.
+    At most `SQL_TOOL_DB_MAX_ROWS` rows are returned, `truncated` tells whether the result had more.
+    """
     if not is_sql_query_safe(statement):
         return create_response(
             message="SQL query contains forbidden keywords (DML, DDL statements)",
             data=None,
             meta={},
         )
+    sql_tool_db = db_resources.sql_tool_db
     if sql_tool_db is None:
         return create_response(
             message="SQL query execution is disabled",
@@ -34,7 +43,8 @@ async def execute_sql(
         (
             columns,
             rows,
-        ) = sql_tool_db.execute(statement)
+            truncated,
+        ) = await sql_tool_db.aexecute(statement)
         execution_result = ExecutionResult(
             raw_result=[
                 dict(
@@ -47,6 +57,7 @@ async def execute_sql(
             ],
             affected_rows=None,
             error=None,
+            truncated=truncated,
         )
     except Exception as e:
         return create_response(
@@ -58,3 +69,25 @@ async def execute_sql(
         message="Successfully executed SQL query",
         data=execution_result,
     )
+
+
+@router.post("/cache/invalidate")
+async def invalidate_sql_cache(
+    jwt: Annotated[dict, Depends(get_jwt)],
+    schema: Optional[str] = None,
+) -> IResponseBase[None]:
+    """
+    Invalidates the cached query results of a schema (all schemas if none is given) in all workers.
+
+    Requires authentication, like the chat endpoints, as every call empties the cache of every worker.
+    """
+    if schema is not None and schema not in settings.SQL_TOOL_DB_SCHEMAS:
+        return create_response(
+            message=f"Unknown schema {schema}",
+            data=None,
+        )
+    await publish_invalidation(schema)
+    return create_response(
+        message="Invalidated cached SQL query results",
+        data=None,
+    )
@@ -176,7 +176,7 @@ async def system_health_check() -> IGetResponseBase[Dict[str, Any]]:
     - details: Additional information about the component status
     """
     from app.db.session import engine
-    from app.api.deps import get_redis_store
+    from app.api.deps import get_redis_client
     from app.core.config import settings
     import sqlalchemy as sa
     import redis
@@ -200,8 +200,8 @@ async def system_health_check() -> IGetResponseBase[Dict[str, Any]]:
     
     # Check Redis
     try:
-        redis_store = get_redis_store()
-        redis_store.ping()
+        redis_client = await get_redis_client()
+        await redis_client.ping()
         health_status["redis"] = {
             "status": "healthy",
             "details": "Connection successful"
@@ -27,6 +27,35 @@ class Settings(BaseSettings):
     DATABASE_CELERY_NAME: str = "celery_schedule_jobs"
     REDIS_HOST: str
     REDIS_PORT: int
+    REDIS_POOL_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT: int = 5
+    REDIS_BLOCKING_POOL_MAX_CONNECTIONS: int = 1000
+    CONVERSATION_MEMORY_TTL: int = 60 * 60 * 24
+    STREAMING_FRAME_INTERVAL: float = 0.02
+    STREAMING_FRAME_MAX_SIZE: int = 512
+    RUN_EVENTS_MAX_LEN: int = 10000
+    RUN_EVENTS_TTL: int = 60 * 60
+    RUN_EVENTS_HEARTBEAT_INTERVAL: float = 15
+    RUN_EVENTS_IDLE_TIMEOUT: float = 60 * 5
+    RUN_QUEUE_ENABLED: bool = False
+    RUN_QUEUE_STREAM: str = "agent_runs"
+    RUN_QUEUE_CLAIM_IDLE_TIME: float = 60
+    RUN_QUEUE_HEARTBEAT_INTERVAL: float = 10
+    RUN_QUEUE_MAX_DELIVERIES: int = 3
+    RUN_QUEUE_API_KEY_TTL: int = 60 * 60
+    RUN_WORKER_CONCURRENCY: int = 16
+    RUN_WORKER_SHUTDOWN_TIMEOUT: float = 60 * 5
+    EMBEDDING_CACHE_MAX_SIZE: int = 4096
+    EMBEDDING_CACHE_TTL: Optional[int] = None
+    LLM_CACHE_TTL: int = 60 * 60 * 24
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_MAX_RESPONSE_BYTES: int = 64 * 1024
+    LLM_CACHE_SEMANTIC_MAX_ENTRIES: int = 256
+    ROUTING_CACHE_ENABLED: bool = True
+    ROUTING_CACHE_MAX_SIZE: int = 1024
+    ROUTING_CACHE_TTL: int = 60 * 60
+    ROUTING_CACHE_SEMANTIC_ENABLED: bool = False  # one embedding call per cache miss, enable after tuning the threshold
+    ROUTING_CACHE_SIMILARITY_THRESHOLD: float = 0.97
     DB_POOL_SIZE: int = 83
     WEB_CONCURRENCY: int = 9
     POOL_SIZE: int = max(
@@ -187,6 +216,16 @@ class Settings(BaseSettings):
     SQL_TOOL_DB_INFO_PATH: str
     SQL_TOOL_DB_URI: str
     SQL_TOOL_DB_OVERWRITE_ON_START: bool = True
+    SQL_TOOL_DB_INTROSPECTION_WORKERS: int = 8
+    SQL_TOOL_DB_POOL_SIZE: int = 5
+    SQL_TOOL_DB_MAX_OVERFLOW: int = 10
+    SQL_TOOL_DB_STATEMENT_TIMEOUT: Optional[float] = 60
+    SQL_TOOL_DB_MAX_ROWS: Optional[int] = 10000
+    SQL_TOOL_SCHEMA_INDEX_EMBEDDINGS: bool = True
+    SQL_QUERY_CACHE_ENABLED: bool = True
+    SQL_QUERY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    SQL_QUERY_CACHE_TTL: int = 600
+    SQL_QUERY_CACHE_ROWS: int = 1000
 
     @validator(
         "SQL_TOOL_DB_URI",
@@ -214,6 +253,37 @@ class Settings(BaseSettings):
     PDF_TOOL_LOG_QUERY_PATH: str = "app/tool_constants/query_log"
     PDF_TOOL_DATA_PATH: str
     PDF_TOOL_DATABASE: str
+    PDF_TOOL_COLLECTION_NAME: str = "pdf_indexing_1"
+    PDF_TOOL_DB_POOL_SIZE: int = 5
+    PDF_TOOL_DB_MAX_OVERFLOW: int = 10
+    PDF_TOOL_HNSW_EF_SEARCH: Optional[int] = None
+    PDF_TOOL_IVFFLAT_PROBES: Optional[int] = None
+    PDF_TOOL_ASYNC_DATABASE_URI: Optional[str] = None
+
+    @validator(
+        "PDF_TOOL_ASYNC_DATABASE_URI",
+        pre=True,
+    )
+    def assemble_pdf_tool_db_connection(
+        cls,
+        v: str | None,
+        values: dict[
+            str,
+            Any,
+        ],
+    ) -> Any:
+        if isinstance(
+            v,
+            str,
+        ):
+            return v
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            username=values.get("DATABASE_USER"),
+            password=values.get("DATABASE_PASSWORD"),
+            host=f"{values.get('DATABASE_HOST')}:{values.get('DATABASE_PORT')}",
+            path=f"{values.get('PDF_TOOL_DATABASE') or ''}",
+        ).unicode_string()
 
     class Config:
         case_sensitive = True
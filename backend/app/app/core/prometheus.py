@@ -3,7 +3,9 @@
 Configuration de Prometheus pour le monitoring de l'application.
 """
 from prometheus_fastapi_instrumentator import Instrumentator, metrics
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
+from redis.asyncio import ConnectionPool
+from typing import Tuple
 import time
 
 # Métriques personnalisées
@@ -25,6 +27,73 @@ db_query_duration = Histogram(
     ["operation"]
 )
 
+redis_pool_max_connections = Gauge(
+    "redis_pool_max_connections",
+    "Maximum number of connections of the shared async Redis pool",
+)
+
+redis_pool_created_connections = Gauge(
+    "redis_pool_created_connections",
+    "Number of connections currently opened by the shared async Redis pool",
+)
+
+redis_pool_in_use_connections = Gauge(
+    "redis_pool_in_use_connections",
+    "Number of connections of the shared async Redis pool currently checked out",
+)
+
+routing_cache_requests_counter = Counter(
+    "routing_cache_requests_total",
+    "Lookups of router decisions in the routing cache",
+    ["tier", "result"]
+)
+
+embedding_cache_requests_counter = Counter(
+    "embedding_cache_requests_total",
+    "Lookups of text embeddings in the embedding cache",
+    ["tier", "result"]
+)
+
+llm_cache_requests_counter = Counter(
+    "llm_cache_requests_total",
+    "Lookups of LLM responses in the LLM response cache",
+    ["cache", "tier", "result"]
+)
+
+sql_query_cache_requests_counter = Counter(
+    "sql_query_cache_requests_total",
+    "Lookups of SQL query results in the query result cache",
+    ["result"]
+)
+
+
+def _count_redis_pool_connections(pool: ConnectionPool) -> Tuple[float, float]:
+    """
+    Count the created and in-use connections of a redis.asyncio pool.
+
+    redis-py has no public API for this, and the private bookkeeping differs between pool classes and versions:
+    the counts are NaN when none of the known layouts is found.
+    """
+    in_use = getattr(pool, "_in_use_connections", None)
+    if in_use is not None:  # ConnectionPool
+        created = getattr(pool, "_created_connections", None)
+        if created is None:
+            created = len(in_use) + len(getattr(pool, "_available_connections", ()))
+        return float(created), float(len(in_use))
+    connections = getattr(pool, "_connections", None)
+    idle = getattr(getattr(pool, "pool", None), "_queue", None)
+    if connections is not None and idle is not None:  # BlockingConnectionPool of redis-py 4
+        return float(len(connections)), float(len(connections) - sum(c is not None for c in idle))
+    return float("nan"), float("nan")
+
+
+def track_redis_pool(pool: ConnectionPool) -> None:
+    """Expose the size and usage of a redis.asyncio connection pool, read at scrape time."""
+    redis_pool_max_connections.set(pool.max_connections)
+    redis_pool_created_connections.set_function(lambda: _count_redis_pool_connections(pool)[0])
+    redis_pool_in_use_connections.set_function(lambda: _count_redis_pool_connections(pool)[1])
+
+
 # Classe pour mesurer le temps d'exécution
 class TimerContextManager:
     def __init__(self, histogram, labels=None):
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import contextlib
+import gc
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from app.api.deps import close_redis_pool, init_redis_pool
+from app.core.config import yaml_configs
+from app.db.session import db_resources
+from app.db.sql_query_cache import listen_for_invalidations
+from app.services.chat_agent.agent_registry import clear_meta_agent_registry, init_meta_agent_registry
+from app.services.chat_agent.helpers.run_helper import listen_for_run_cancellations
+from app.utils.config_loader import load_agent_config, load_ingestion_configs
+from app.utils.fastapi_globals import g
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def process_resources() -> AsyncGenerator[None, None]:
+    """
+    Start up and shut down the resources of a process running agents: the FastAPI lifespan and the agent worker.
+
+    Starts the database resources, loads the yaml configs, builds the meta agent registry, creates the Redis pool
+    and listens for run cancellations and SQL query cache invalidations until shutdown.
+    """
+    # startup
+    await db_resources.astart()
+    yaml_configs["agent_config"] = load_agent_config()
+    yaml_configs["ingestion_config"] = load_ingestion_configs()
+    init_meta_agent_registry(yaml_configs["agent_config"])
+    init_redis_pool()
+
+    run_cancellation_listener = asyncio.create_task(listen_for_run_cancellations())
+    sql_tool_db = db_resources.sql_tool_db
+    sql_query_cache_listener = (
+        asyncio.create_task(listen_for_invalidations(sql_tool_db.query_cache))
+        if sql_tool_db is not None and sql_tool_db.query_cache is not None
+        else None
+    )
+    try:
+        yield
+    finally:
+        # shutdown
+        for listener in (run_cancellation_listener, sql_query_cache_listener):
+            if listener is not None:
+                listener.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await listener
+        clear_meta_agent_registry()
+        await close_redis_pool()
+        await db_resources.aclose()
+        g.cleanup()
+        gc.collect()
+        yaml_configs.clear()
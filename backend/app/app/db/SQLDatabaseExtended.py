@@ -1,28 +1,102 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import importlib.util
 import logging
-from typing import Any, List, Optional, Sequence, Tuple
+import sqlite3
+import time
+from typing import Any, Callable, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
 
 from langchain.utilities.sql_database import SQLDatabase
 from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy.engine import Connection, Engine, make_url
 from sqlalchemy.engine.result import Row
+from sqlalchemy.exc import DBAPIError, ResourceClosedError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
+from app.db.sql_query_cache import SQLQueryCache
 from app.schemas.tool_schemas.sql_tool_schema import DatabaseInfo
+from app.utils.sql import normalize_sql
 
 logger = logging.getLogger(__name__)
 
+# rows per round trip of server-side cursors
+STREAM_BATCH_SIZE = 1000
+
+# SQLite virtual machine instructions between two checks of the statement deadline
+SQLITE_PROGRESS_STEPS = 10000
+
+# dialects on which the statement timeout is enforced by the database or the driver (see `_set_session`)
+STATEMENT_TIMEOUT_DIALECTS = ("postgresql", "mysql", "sqlite")
+
+T = TypeVar("T")
+
+# async drivers by sync dialect, used if the driver is installed
+ASYNC_DRIVERS = {
+    "postgresql": ("asyncpg", "asyncpg"),
+    "sqlite": ("aiosqlite", "aiosqlite"),
+}
+
+
+def get_async_database_uri(
+    database_uri: str,
+) -> Optional[str]:
+    """Get the URI of the async driver for a database URI, None if no async driver is available."""
+    url = make_url(database_uri)
+    if url.get_dialect().is_async:
+        return database_uri
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or importlib.util.find_spec(driver[1]) is None:
+        return None
+    return url.set(drivername=f"{url.get_backend_name()}+{driver[0]}").render_as_string(hide_password=False)
+
+
+class QuerySample(NamedTuple):
+    """First rows of a query result and its row count."""
+
+    columns: List[str]
+    rows: Sequence[Sequence[Any]]
+    """Database rows, or tuples when served from the query result cache."""
+    row_count: int
+    row_count_exact: bool
+
+
+def count_query(
+    command: str,
+) -> str:
+    """Wrap a query to count its rows on the database."""
+    return f"SELECT COUNT(*) FROM ({command.strip().rstrip(';')}) AS counted_query"
+
 
 class SQLDatabaseExtended(SQLDatabase):
-    """SQL database wrapper."""
+    """
+    SQL database wrapper.
+
+    The async methods (`aexecute`, `arun_no_str`, `asample`) never block the event loop: they run on a pooled
+    async engine if the database has an async driver, otherwise the sync engine runs in a worker thread. They apply
+    a statement timeout and cap the number of rows fetched. `aexecute` and `asample` share the query result cache.
+
+    The statement timeout is set on the connection, so that the database (or the SQLite driver) aborts the query
+    and the connection goes back to the pool: a worker thread cannot be cancelled from the event loop.
+    """
 
     db_info: Optional[DatabaseInfo]
+    statement_timeout: Optional[float]
+    max_rows: Optional[int]
+    query_cache: Optional[SQLQueryCache]
+    query_cache_rows: int
 
     def __init__(
         self,
         engine: Engine,
         db_info: Optional[DatabaseInfo] = None,
+        async_engine: Optional[AsyncEngine] = None,
+        statement_timeout: Optional[float] = None,
+        max_rows: Optional[int] = None,
+        query_cache: Optional[SQLQueryCache] = None,
+        query_cache_rows: int = 1000,
         **kwargs: Any,
     ):
         """Initialize the SQL database."""
@@ -31,6 +105,15 @@ class SQLDatabaseExtended(SQLDatabase):
             **kwargs,
         )
         self.db_info = db_info
+        self._async_engine = async_engine
+        self.statement_timeout = statement_timeout
+        self.max_rows = max_rows
+        self.query_cache = query_cache
+        self.query_cache_rows = query_cache_rows
+        if statement_timeout is not None and self.dialect not in STATEMENT_TIMEOUT_DIALECTS:
+            logger.warning(
+                f"Statement timeout not supported by {self.dialect}, timed out queries keep their connection"
+            )
 
     def execute(
         self,
@@ -78,19 +161,394 @@ class SQLDatabaseExtended(SQLDatabase):
                 return result
         return None
 
+    def get_table_fingerprint(
+        self,
+        table_name: str,
+    ) -> str:
+        """Hash of the reflected columns and keys of a table, changes with the table DDL."""
+        table = self._metadata.tables[f"{self._schema}.{table_name}" if self._schema else table_name]
+        columns = [
+            (
+                column.name,
+                repr(column.type),
+                column.nullable,
+                column.primary_key,
+                sorted(foreign_key.target_fullname for foreign_key in column.foreign_keys),
+            )
+            for column in table.columns
+        ]
+        return hashlib.sha256(repr(columns).encode("utf-8")).hexdigest()
+
+    def _set_session(
+        self,
+        connection: Connection,
+    ) -> None:
+        """
+        Set the schema and the statement timeout of a connection.
+
+        On SQLite, the timeout is a progress handler of the `sqlite3` connection, so it only applies to the sync
+        engine. The connection of an aiosqlite async engine lives in aiosqlite's thread and gets no handler: a
+        query timed out by `wait_for` keeps running in that thread until it completes.
+        """
+        if self._schema is not None:
+            if self.dialect == "snowflake":
+                connection.exec_driver_sql(f"ALTER SESSION SET search_path='{self._schema}'")
+            else:
+                connection.exec_driver_sql(f"SET search_path TO {self._schema}")
+        if self.statement_timeout is None:
+            return
+        if self.dialect == "postgresql":
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.statement_timeout * 1000)}")
+        elif self.dialect == "mysql" and getattr(connection.dialect, "is_mariadb", False):
+            connection.exec_driver_sql(f"SET SESSION max_statement_time = {self.statement_timeout}")
+        elif self.dialect == "mysql":
+            connection.exec_driver_sql(f"SET SESSION max_execution_time = {int(self.statement_timeout * 1000)}")
+        elif self.dialect == "sqlite":
+            dbapi_connection = connection.connection.dbapi_connection
+            if isinstance(dbapi_connection, sqlite3.Connection):
+                deadline = time.monotonic() + self.statement_timeout
+                dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+
+    def _reset_session(
+        self,
+        connection: Connection,
+    ) -> None:
+        """Remove the statement timeout of `_set_session` from a connection before it goes back to the pool."""
+        if self.statement_timeout is None:
+            return
+        if self.dialect == "mysql" and getattr(connection.dialect, "is_mariadb", False):
+            connection.exec_driver_sql("SET SESSION max_statement_time = 0")
+        elif self.dialect == "mysql":
+            connection.exec_driver_sql("SET SESSION max_execution_time = 0")
+        elif self.dialect == "sqlite":
+            dbapi_connection = connection.connection.dbapi_connection
+            if isinstance(dbapi_connection, sqlite3.Connection):
+                dbapi_connection.set_progress_handler(None, 0)
+
+    async def _arun_sync(
+        self,
+        function: Callable[..., T],
+        *args: Any,
+    ) -> T:
+        """
+        Run a method of the sync engine in a worker thread.
+
+        A query aborted by the statement timeout raises `asyncio.TimeoutError`, as on the async engine. On
+        dialects without a statement timeout, the caller stops waiting but the query keeps its connection.
+        """
+        if self.statement_timeout is not None and self.dialect not in STATEMENT_TIMEOUT_DIALECTS:
+            return await asyncio.wait_for(asyncio.to_thread(function, *args), timeout=self.statement_timeout)
+        started = time.monotonic()
+        try:
+            return await asyncio.to_thread(function, *args)
+        except DBAPIError as e:
+            if self.statement_timeout is not None and time.monotonic() - started >= self.statement_timeout:
+                raise asyncio.TimeoutError(f"Statement timed out after {self.statement_timeout}s") from e
+            raise
+
+    def _fetch(
+        self,
+        command: str,
+    ) -> Tuple[list[str], Optional[list[Row]]]:
+        with self._engine.begin() as connection:
+            self._set_session(connection)
+            try:
+                cursor = connection.execute(text(command))
+                if not cursor.returns_rows:
+                    return [], None
+                # one row more than the cap tells whether the result was truncated
+                rows = cursor.fetchmany(self.max_rows + 1) if self.max_rows is not None else cursor.fetchall()
+                return list(cursor.keys()), list(rows)
+            finally:
+                self._reset_session(connection)
+
+    async def _afetch_async_engine(
+        self,
+        command: str,
+    ) -> Tuple[list[str], Optional[list[Row]]]:
+        assert self._async_engine is not None
+        async with self._async_engine.begin() as connection:
+            await connection.run_sync(self._set_session)
+            try:
+                cursor = await connection.execute(text(command))
+                if not cursor.returns_rows:
+                    return [], None
+                rows = cursor.fetchmany(self.max_rows + 1) if self.max_rows is not None else cursor.fetchall()
+                return list(cursor.keys()), list(rows)
+            finally:
+                await connection.run_sync(self._reset_session)
+
+    async def _afetch(
+        self,
+        command: str,
+    ) -> Tuple[list[str], Optional[list[Row]]]:
+        if self._async_engine is not None:
+            return await asyncio.wait_for(self._afetch_async_engine(command), timeout=self.statement_timeout)
+        return await self._arun_sync(self._fetch, command)
+
+    def _sample(
+        self,
+        command: str,
+        nb_rows: int,
+        count_cutoff: int,
+    ) -> Optional[QuerySample]:
+        with self._engine.begin() as connection:
+            self._set_session(connection)
+            try:
+                return self._sample_connection(connection, command, nb_rows, count_cutoff)
+            finally:
+                self._reset_session(connection)
+
+    @staticmethod
+    def _sample_connection(
+        connection: Connection,
+        command: str,
+        nb_rows: int,
+        count_cutoff: int,
+    ) -> Optional[QuerySample]:
+        cursor = connection.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE).execute(text(command))
+        if not cursor.returns_rows:
+            return None
+        columns = list(cursor.keys())
+        rows: List[Row] = []
+        row_count = 0
+        for partition in cursor.partitions():
+            rows.extend(partition[: max(nb_rows - len(rows), 0)])
+            row_count += len(partition)
+            if row_count > count_cutoff:
+                break
+        cursor.close()
+        if row_count <= count_cutoff:
+            return QuerySample(columns, rows, row_count, True)
+        try:
+            with connection.begin_nested():
+                exact_count = connection.execute(text(count_query(command))).scalar_one()
+            return QuerySample(columns, rows, exact_count, True)
+        except Exception as e:
+            logger.info(f"Could not count rows of query, row count is estimated: {repr(e)}")
+            return QuerySample(columns, rows, row_count, False)
+
+    async def _asample_async_engine(
+        self,
+        command: str,
+        nb_rows: int,
+        count_cutoff: int,
+    ) -> Optional[QuerySample]:
+        assert self._async_engine is not None
+        async with self._async_engine.begin() as connection:
+            await connection.run_sync(self._set_session)
+            try:
+                return await self._asample_connection(connection, command, nb_rows, count_cutoff)
+            finally:
+                await connection.run_sync(self._reset_session)
+
+    async def _asample_connection(
+        self,
+        connection: AsyncConnection,
+        command: str,
+        nb_rows: int,
+        count_cutoff: int,
+    ) -> Optional[QuerySample]:
+        cursor = await connection.stream(text(command))
+        try:
+            columns = list(cursor.keys())
+        except ResourceClosedError:  # AsyncResult has no `returns_rows`, the statement does not return rows
+            await cursor.close()
+            return None
+        rows: List[Row] = []
+        row_count = 0
+        async for partition in cursor.partitions(STREAM_BATCH_SIZE):
+            rows.extend(partition[: max(nb_rows - len(rows), 0)])
+            row_count += len(partition)
+            if row_count > count_cutoff:
+                break
+        await cursor.close()
+        if row_count <= count_cutoff:
+            return QuerySample(columns, rows, row_count, True)
+        return await self._acount(connection, command, columns, rows, row_count)
+
+    @staticmethod
+    async def _acount(
+        connection: AsyncConnection,
+        command: str,
+        columns: List[str],
+        rows: List[Row],
+        row_count: int,
+    ) -> QuerySample:
+        try:
+            async with connection.begin_nested():
+                exact_count = (await connection.execute(text(count_query(command)))).scalar_one()
+            return QuerySample(columns, rows, exact_count, True)
+        except Exception as e:
+            logger.info(f"Could not count rows of query, row count is estimated: {repr(e)}")
+            return QuerySample(columns, rows, row_count, False)
+
+    async def asample(
+        self,
+        command: str,
+        nb_rows: int,
+        count_cutoff: int = 10000,
+    ) -> Optional[QuerySample]:
+        """
+        Execute a SQL query and get its first rows and row count, with bounded memory.
+
+        Rows are streamed with a server-side cursor and only the first `nb_rows` are kept. Rows are counted while
+        streaming up to `count_cutoff`, larger results are counted by the database with a `COUNT(*)` wrapper. If
+        that fails, the count is a lower bound (`row_count_exact` is False).
+
+        Args:
+            command (str): The SQL query.
+            nb_rows (int): The number of sample rows.
+            count_cutoff (int): The number of rows counted while streaming.
+
+        Returns:
+            Optional[QuerySample]: The sample, None if the statement does not return rows.
+        """
+        cache_key, schemas = self._query_cache_key(command)
+        cached = self.query_cache.get(cache_key) if self.query_cache is not None else None
+        if cached is not None and (cached.complete or cached.nb_rows >= nb_rows):
+            return QuerySample(cached.columns, cached.rows(nb_rows), cached.row_count, cached.row_count_exact)
+
+        # with a cache, more rows are kept so that the result can also serve `aexecute`
+        keep_rows = max(nb_rows, self.query_cache_rows) if self.query_cache is not None else nb_rows
+        if self._async_engine is not None:
+            sample = await asyncio.wait_for(
+                self._asample_async_engine(command, keep_rows, count_cutoff), timeout=self.statement_timeout
+            )
+        else:
+            sample = await self._arun_sync(self._sample, command, keep_rows, count_cutoff)
+        if sample is None:
+            return None
+
+        if self.query_cache is not None:
+            expected_rows = sample.row_count if self.max_rows is None else min(sample.row_count, self.max_rows)
+            self.query_cache.set(
+                cache_key,
+                sample.columns,
+                sample.rows,
+                sample.row_count,
+                sample.row_count_exact,
+                complete=sample.row_count_exact and len(sample.rows) == expected_rows,
+                schemas=schemas,
+            )
+        return sample._replace(rows=sample.rows[:nb_rows])
+
+    def _truncate(
+        self,
+        rows: List[Row],
+    ) -> Tuple[List[Row], bool]:
+        """Cap rows fetched by `_fetch` to `max_rows`, and tell whether the result was truncated."""
+        if self.max_rows is None or len(rows) <= self.max_rows:
+            return rows, False
+        return rows[: self.max_rows], True
+
+    async def aexecute(
+        self,
+        command: str,
+    ) -> Tuple[list[str], Sequence[Sequence[Any]], bool]:
+        """
+        Execute a SQL command without blocking the event loop.
+
+        Returns:
+            Tuple[list[str], Sequence[Sequence[Any]], bool]: The columns, the rows and whether the rows were
+                truncated to `max_rows`.
+        """
+        cache_key, schemas = self._query_cache_key(command)
+        cached = self.query_cache.get(cache_key) if self.query_cache is not None else None
+        if cached is not None and cached.complete:
+            return (
+                cached.columns,
+                cached.rows(),
+                not cached.row_count_exact or cached.row_count > cached.nb_rows,
+            )
+
+        columns, fetched_rows = await self._afetch(command)
+        rows, truncated = self._truncate(fetched_rows or [])
+        if self.query_cache is not None and fetched_rows is not None:
+            self.query_cache.set(
+                cache_key,
+                columns,
+                rows,
+                len(rows),
+                not truncated,
+                complete=True,
+                schemas=schemas,
+            )
+        return (
+            columns,
+            rows,
+            truncated,
+        )
+
+    def _query_cache_key(
+        self,
+        command: str,
+    ) -> Tuple[str, FrozenSet[str]]:
+        """Get the cache key of a query and the schemas of the tables it reads."""
+        if self.query_cache is None:
+            return "", frozenset()
+        normalized_sql = normalize_sql(command)
+        schemas: FrozenSet[str] = frozenset()
+        if self.db_info is not None:
+            tokens = {token.strip('"').lower() for token in normalized_sql.split(" ")}
+            schemas = frozenset(
+                table.schema_name for table in self.db_info.tables if table.table_name.lower() in tokens
+            )
+        return SQLQueryCache.key(normalized_sql, self._schema), schemas
+
+    async def arun_no_str(
+        self,
+        command: str,
+        fetch: str = "all",
+    ) -> Sequence | Row | List[Row] | None:
+        """
+        Execute a SQL command without blocking the event loop and return the results.
+
+        If the statement returns rows, the results are returned. If the statement
+        returns no rows, None is returned.
+        """
+        if fetch not in ("all", "one"):
+            raise ValueError("Fetch parameter must be either 'one' or 'all'")
+        _, rows = await self._afetch(command)
+        if rows is None:
+            return None
+        return self._truncate(rows)[0] if fetch == "all" else rows[0][0]
+
+    async def adispose(
+        self,
+    ) -> None:
+        """Close the connections of the engine pools."""
+        self._engine.dispose()
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+
     @classmethod
     def from_uri(
         cls,
         database_uri: str,
         engine_args: Optional[dict] = None,
+        async_engine_args: Optional[dict] = None,
         **kwargs: Any,
     ) -> SQLDatabaseExtended:
-        """Construct a SQLAlchemy engine from URI."""
+        """
+        Construct a SQLAlchemy engine from URI.
+
+        If `async_engine_args` is given, a pooled async engine is created as well when the database has an
+        async driver.
+        """
         _engine_args = engine_args or {}
+        async_engine = None
+        async_database_uri = get_async_database_uri(database_uri) if async_engine_args is not None else None
+        if async_database_uri is not None:
+            async_engine = create_async_engine(
+                async_database_uri,
+                **(async_engine_args or {}),
+            )
         return cls(
             create_engine(
                 database_uri,
                 **_engine_args,
             ),
+            async_engine=async_engine,
             **kwargs,
         )
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Ingestion manifest of the vectorstore collections.
+
+The manifest table records, per collection and source file, the content hash, mtime, size, parser and chunking
+config the file was ingested with. It is loaded once per ingestion run and compared with the files on disk in one
+pass (`plan_ingestion`):
+
+- files with the same size and mtime are unchanged without being read, others are hashed;
+- new files are added, files whose content, parser or chunking config changed are re-ingested;
+- files found under a new path with the hash of a file that disappeared are moved, their chunks are kept;
+- files that disappeared are deleted, with their chunks.
+
+This replaces one `cmetadata->>'source'` lookup per file, which scanned the embeddings table, never re-ingested
+edited files and duplicated moved files.
+"""
+import hashlib
+import logging
+import os
+from dataclasses import dataclass, field, replace
+from typing import Any, Collection, Dict, Iterable, List, Tuple
+
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+CREATE_MANIFEST_STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS ingestion_manifest (
+        collection_name TEXT NOT NULL,
+        source TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        mtime DOUBLE PRECISION NOT NULL,
+        size BIGINT NOT NULL,
+        parser TEXT NOT NULL,
+        chunking_config TEXT NOT NULL,
+        ingested_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (collection_name, source)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_ingestion_manifest_content_hash
+    ON ingestion_manifest (collection_name, content_hash)
+    """,
+    # deletes and moves of the chunks of a file
+    """
+    CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_source
+    ON langchain_pg_embedding (collection_id, (cmetadata->>'source'))
+    """,
+)
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    source: str
+    content_hash: str
+    mtime: float
+    size: int
+    parser: str
+    chunking_config: str
+
+
+@dataclass
+class IngestionPlan:
+    """Changes between the manifest and the files on disk."""
+
+    added: List[ManifestEntry] = field(default_factory=list)
+    changed: List[ManifestEntry] = field(default_factory=list)
+    moved: List[Tuple[str, ManifestEntry]] = field(default_factory=list)
+    """Previous source and new entry of the moved files."""
+    touched: List[ManifestEntry] = field(default_factory=list)
+    """Files with a new mtime but the same content."""
+    deleted: List[str] = field(default_factory=list)
+    nb_unchanged: int = 0
+
+    @property
+    def to_ingest(
+        self,
+    ) -> List[ManifestEntry]:
+        return self.added + self.changed
+
+    @property
+    def stale_sources(
+        self,
+    ) -> List[str]:
+        """Sources whose chunks must be deleted before ingestion (re-ingested after a failed run for added files)."""
+        return [entry.source for entry in self.to_ingest] + self.deleted
+
+    def without_failed(
+        self,
+        failed_sources: Collection[str],
+    ) -> "IngestionPlan":
+        """
+        The plan without the files that failed to parse or produced no chunk, to save in the manifest.
+
+        Failed files get no entry, or keep the entry of their previous version, so the next run ingests them again.
+        """
+        return replace(
+            self,
+            added=[entry for entry in self.added if entry.source not in failed_sources],
+            changed=[entry for entry in self.changed if entry.source not in failed_sources],
+        )
+
+    def __str__(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, {len(self.moved)} moved, "
+            f"{len(self.deleted)} deleted, {len(self.touched) + self.nb_unchanged} unchanged files"
+        )
+
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of the content of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def plan_ingestion(
+    manifest: Dict[str, ManifestEntry],
+    file_paths: Iterable[str],
+    parser: str,
+    chunking_config: str,
+) -> IngestionPlan:
+    """
+    Compare the files on disk with the manifest of a collection.
+
+    Args:
+        manifest (Dict[str, ManifestEntry]): The manifest entries of the collection, by source.
+        file_paths (Iterable[str]): The files on disk.
+        parser (str): The PDF parser of this run.
+        chunking_config (str): The chunking config of this run.
+
+    Returns:
+        IngestionPlan: The files to add, re-ingest, move and delete.
+    """
+    plan = IngestionPlan()
+    new_entries: List[ManifestEntry] = []
+    seen = set()
+    for file_path in file_paths:
+        seen.add(file_path)
+        stat = os.stat(file_path)
+        previous = manifest.get(file_path)
+        same_config = previous is not None and (previous.parser, previous.chunking_config) == (parser, chunking_config)
+        if same_config and previous is not None and (previous.size, previous.mtime) == (stat.st_size, stat.st_mtime):
+            plan.nb_unchanged += 1
+            continue
+        entry = ManifestEntry(file_path, hash_file(file_path), stat.st_mtime, stat.st_size, parser, chunking_config)
+        if previous is None:
+            new_entries.append(entry)
+        elif same_config and previous.content_hash == entry.content_hash:
+            plan.touched.append(entry)
+        else:
+            plan.changed.append(entry)
+
+    missing = {source: entry for source, entry in manifest.items() if source not in seen}
+    missing_by_hash = {
+        (entry.content_hash, entry.parser, entry.chunking_config): source for source, entry in missing.items()
+    }
+    for entry in new_entries:
+        previous_source = missing_by_hash.pop((entry.content_hash, entry.parser, entry.chunking_config), None)
+        if previous_source is not None:
+            plan.moved.append((previous_source, entry))
+            del missing[previous_source]
+        else:
+            plan.added.append(entry)
+    plan.deleted = list(missing)
+    return plan
+
+
+class IngestionManifestStore:
+    """Manifest table on the psycopg2 connection of the ingestion pipeline."""
+
+    def __init__(
+        self,
+        connection: Any,
+    ) -> None:
+        self.connection = connection
+
+    def create_table_if_not_exists(
+        self,
+    ) -> None:
+        with self.connection.cursor() as cursor:
+            for statement in CREATE_MANIFEST_STATEMENTS:
+                cursor.execute(statement)
+        self.connection.commit()
+
+    def load(
+        self,
+        collection_name: str,
+    ) -> Dict[str, ManifestEntry]:
+        """Load the manifest of a collection, by source."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT source, content_hash, mtime, size, parser, chunking_config FROM ingestion_manifest "
+                "WHERE collection_name = %s",
+                (collection_name,),
+            )
+            return {row[0]: ManifestEntry(*row) for row in cursor.fetchall()}
+
+    def delete_chunks(
+        self,
+        collection_id: str,
+        sources: List[str],
+    ) -> None:
+        """Delete the chunks of files from the embeddings table."""
+        if not sources:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM langchain_pg_embedding WHERE collection_id = %s AND cmetadata->>'source' = ANY(%s)",
+                (collection_id, sources),
+            )
+            logger.info(f"Deleted {cursor.rowcount} stale chunks of {len(sources)} files")
+        self.connection.commit()
+
+    def move_chunks(
+        self,
+        collection_id: str,
+        moves: List[Tuple[str, str]],
+    ) -> None:
+        """Update the source of the chunks of moved files."""
+        if not moves:
+            return
+        with self.connection.cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                UPDATE langchain_pg_embedding e
+                SET cmetadata = jsonb_set(e.cmetadata::jsonb, '{source}', to_jsonb(m.new_source))::json
+                FROM (VALUES %s) AS m (collection_id, previous_source, new_source)
+                WHERE e.collection_id = m.collection_id::uuid AND e.cmetadata->>'source' = m.previous_source
+                """,
+                [(collection_id, previous, new) for previous, new in moves],
+            )
+        self.connection.commit()
+
+    def save(
+        self,
+        collection_name: str,
+        plan: IngestionPlan,
+    ) -> None:
+        """Record the outcome of an ingestion run."""
+        entries = plan.to_ingest + [entry for _, entry in plan.moved] + plan.touched
+        with self.connection.cursor() as cursor:
+            sources_to_remove = plan.deleted + [source for source, _ in plan.moved]
+            if sources_to_remove:
+                cursor.execute(
+                    "DELETE FROM ingestion_manifest WHERE collection_name = %s AND source = ANY(%s)",
+                    (collection_name, sources_to_remove),
+                )
+            if entries:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO ingestion_manifest
+                        (collection_name, source, content_hash, mtime, size, parser, chunking_config)
+                    VALUES %s
+                    ON CONFLICT (collection_name, source) DO UPDATE SET
+                        content_hash = EXCLUDED.content_hash,
+                        mtime = EXCLUDED.mtime,
+                        size = EXCLUDED.size,
+                        parser = EXCLUDED.parser,
+                        chunking_config = EXCLUDED.chunking_config,
+                        ingested_at = now()
+                    """,
+                    [
+                        (
+                            collection_name,
+                            entry.source,
+                            entry.content_hash,
+                            entry.mtime,
+                            entry.size,
+                            entry.parser,
+                            entry.chunking_config,
+                        )
+                        for entry in entries
+                    ],
+                )
+        self.connection.commit()
@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
+"""
+Database sessions and the SQL tool database.
+
+Nothing connects to a database at import time: the engines, the session makers and the SQL tool database (which
+introspects the schemas) are created by `db_resources` on first use, so importing `app.api.deps` stays cheap for
+tests, Celery workers and scripts. The FastAPI lifespan starts the resources before serving and closes them on
+shutdown.
+"""
+import asyncio
 import logging
 import os.path
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
+from app.db.sql_query_cache import SQLQueryCache
 from app.db.SQLDatabaseExtended import SQLDatabaseExtended
+from app.db.vector_db_retriever import PGVectorAsyncStore
 from app.schemas.tool_schemas.sql_tool_schema import DatabaseInfo, TableInfo
+from app.utils.config_loader import get_ingestion_configs
 
 DB_POOL_SIZE = 83
 WEB_CONCURRENCY = 9
@@ -70,7 +85,13 @@ def get_sql_tool_db() -> SQLDatabaseExtended:
             "app/tool_constants",
             exist_ok=True,
         )
-        db_info = _get_table_infos_multi_db(settings.SQL_TOOL_DB_SCHEMAS)
+        # tables with the same fingerprint as in the previous file are not introspected again
+        previous_db_info = (
+            DatabaseInfo.parse_file(settings.SQL_TOOL_DB_INFO_PATH)
+            if os.path.isfile(settings.SQL_TOOL_DB_INFO_PATH)
+            else None
+        )
+        db_info = _get_table_infos_multi_db(settings.SQL_TOOL_DB_SCHEMAS, previous_db_info)
         with open(
             settings.SQL_TOOL_DB_INFO_PATH,
             "w",
@@ -80,39 +101,183 @@ def get_sql_tool_db() -> SQLDatabaseExtended:
 
     return SQLDatabaseExtended.from_uri(
         settings.SQL_TOOL_DB_URI,
+        async_engine_args={
+            "pool_size": settings.SQL_TOOL_DB_POOL_SIZE,
+            "max_overflow": settings.SQL_TOOL_DB_MAX_OVERFLOW,
+            "pool_pre_ping": True,
+        },
         db_info=db_info,
+        statement_timeout=settings.SQL_TOOL_DB_STATEMENT_TIMEOUT,
+        max_rows=settings.SQL_TOOL_DB_MAX_ROWS,
+        query_cache=(
+            SQLQueryCache(
+                max_bytes=settings.SQL_QUERY_CACHE_MAX_BYTES,
+                ttl=settings.SQL_QUERY_CACHE_TTL,
+            )
+            if settings.SQL_QUERY_CACHE_ENABLED
+            else None
+        ),
+        query_cache_rows=settings.SQL_QUERY_CACHE_ROWS,
+    )
+
+
+def _get_table_info(
+    database: SQLDatabaseExtended,
+    schema_name: str,
+    table_name: str,
+    previous_table_info: Optional[TableInfo],
+) -> TableInfo:
+    """Get the table information, reusing the previous one if the table did not change."""
+    fingerprint = database.get_table_fingerprint(table_name)
+    if previous_table_info is not None and previous_table_info.fingerprint == fingerprint:
+        return previous_table_info
+    try:
+        table_info = database.get_table_info_no_throw([table_name])
+    except Exception as e:
+        logger.error(f"Failed to get table info for {table_name}: {e}")
+        table_info = f"Failed to get table info for {table_name}: {e}"
+    return TableInfo(
+        schema_name=schema_name,
+        table_name=table_name,
+        structure=table_info,
+        fingerprint=fingerprint,
     )
 
 
 def _get_table_infos_multi_db(
     schema_names: List[str],
+    previous_db_info: Optional[DatabaseInfo] = None,
+    database_uri: Optional[str] = None,
+    max_workers: int = settings.SQL_TOOL_DB_INTROSPECTION_WORKERS,
 ) -> DatabaseInfo:
-    """Get the table information for multiple databases."""
-    tables = []
-    for schema_name in schema_names:
-        database = SQLDatabaseExtended.from_uri(
-            settings.SQL_TOOL_DB_URI,
-            schema=schema_name,
-        )
-        table_names = list(set(database.get_usable_table_names()))
-        for table_name in table_names:
-            try:
-                table_info = database.get_table_info_no_throw([table_name])
-            except Exception as e:
-                logger.error(f"Failed to get table info for {table_name}: {e}")
-                table_info = f"Failed to get table info for {table_name}: {e}"
-            tables.append(
-                TableInfo(
-                    schema_name=schema_name,
-                    table_name=table_name,
-                    structure=table_info,
+    """
+    Get the table information for multiple databases.
+
+    Schemas are reflected and tables introspected concurrently on one engine with a bounded pool. Tables whose
+    fingerprint matches the previous table information are not introspected again (no sample rows queries).
+    """
+    engine: Engine = create_engine(
+        database_uri or settings.SQL_TOOL_DB_URI,
+        pool_size=max_workers,
+        max_overflow=0,
+    )
+    previous_tables: Dict[Tuple[str, str], TableInfo] = (
+        {(t.schema_name, t.table_name): t for t in previous_db_info.tables} if previous_db_info is not None else {}
+    )
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            databases = dict(
+                zip(
+                    schema_names,
+                    executor.map(lambda schema_name: SQLDatabaseExtended(engine, schema=schema_name), schema_names),
                 )
             )
+            jobs = [
+                (schema_name, table_name)
+                for schema_name, database in databases.items()
+                for table_name in sorted(set(database.get_usable_table_names()))
+            ]
+            tables = list(
+                executor.map(
+                    lambda job: _get_table_info(databases[job[0]], job[0], job[1], previous_tables.get(job)),
+                    jobs,
+                )
+            )
+    finally:
+        engine.dispose()
 
+    nb_reused = sum(1 for table in tables if previous_tables.get((table.schema_name, table.table_name)) is table)
+    logger.info(f"Introspected {len(tables) - nb_reused} tables, {nb_reused} unchanged tables reused")
     return DatabaseInfo(tables=tables)
 
 
-sql_tool_db = get_sql_tool_db() if settings.SQL_TOOL_DB_ENABLED else None
+class DatabaseResources:
+    """Lazily created database resources of the process."""
+
+    def __init__(
+        self,
+    ) -> None:
+        self._session_local: Optional[sessionmaker] = None
+        self._session_local_celery: Optional[sessionmaker] = None
+        self._sql_tool_db: Optional[SQLDatabaseExtended] = None
+        self._sql_tool_db_loaded = False
+        self._pdf_vector_store: Optional[PGVectorAsyncStore] = None
+
+    @property
+    def session_local(
+        self,
+    ) -> sessionmaker:
+        """Session maker of the application database."""
+        if self._session_local is None:
+            self._session_local = _get_local_session()
+        return self._session_local
+
+    @property
+    def session_local_celery(
+        self,
+    ) -> sessionmaker:
+        """Session maker of the Celery beat database."""
+        if self._session_local_celery is None:
+            self._session_local_celery = _get_local_celery_session()
+        return self._session_local_celery
+
+    @property
+    def sql_tool_db(
+        self,
+    ) -> Optional[SQLDatabaseExtended]:
+        """SQL tool database, None if the SQL tool is disabled. Loaded on first use outside of the FastAPI app."""
+        if not self._sql_tool_db_loaded:
+            self._sql_tool_db = get_sql_tool_db() if settings.SQL_TOOL_DB_ENABLED else None
+            self._sql_tool_db_loaded = True
+        return self._sql_tool_db
+
+    @property
+    def pdf_vector_store(
+        self,
+    ) -> PGVectorAsyncStore:
+        """Async handle on the PDF tool collection, connections are opened on first search."""
+        if self._pdf_vector_store is None:
+            assert settings.PDF_TOOL_ASYNC_DATABASE_URI is not None  # assembled by the settings validator
+            self._pdf_vector_store = PGVectorAsyncStore(
+                settings.PDF_TOOL_ASYNC_DATABASE_URI,
+                settings.PDF_TOOL_COLLECTION_NAME,
+                engine_args={
+                    "pool_size": settings.PDF_TOOL_DB_POOL_SIZE,
+                    "max_overflow": settings.PDF_TOOL_DB_MAX_OVERFLOW,
+                    "pool_pre_ping": True,
+                },
+                ef_search=settings.PDF_TOOL_HNSW_EF_SEARCH,
+                probes=settings.PDF_TOOL_IVFFLAT_PROBES,
+                text_search_config=get_ingestion_configs().indexing_config.vector_index.text_search_config,
+            )
+        return self._pdf_vector_store
+
+    async def astart(
+        self,
+    ) -> None:
+        """Create the resources, the SQL tool database schemas are introspected in a worker thread."""
+        if not self._sql_tool_db_loaded and settings.SQL_TOOL_DB_ENABLED:
+            self._sql_tool_db = await asyncio.to_thread(get_sql_tool_db)
+        self._sql_tool_db_loaded = True
+        _ = self.session_local, self.session_local_celery
+
+    async def aclose(
+        self,
+    ) -> None:
+        """Dispose the engines, the resources are created again on next use."""
+        if self._sql_tool_db is not None:
+            await self._sql_tool_db.adispose()
+        if self._pdf_vector_store is not None:
+            await self._pdf_vector_store.aclose()
+        for session_local in (self._session_local, self._session_local_celery):
+            engine = session_local.kw.get("bind") if session_local is not None else None
+            if engine is not None:
+                await engine.dispose()
+        self._session_local = None
+        self._session_local_celery = None
+        self._sql_tool_db = None
+        self._sql_tool_db_loaded = False
+        self._pdf_vector_store = None
+
 
-SessionLocal = _get_local_session()
-SessionLocalCelery = _get_local_celery_session()
+db_resources = DatabaseResources()
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Query result cache of the SQL tool database.
+
+Results of `/sql/execute` and of the SQL tool validation are cached in one process-wide LRU, keyed on the
+normalized SQL statement, so the query generated by the SQL tool and re-run by the visualizer (or on a retry)
+does not hit the database again. Results are stored column by column, the cache is bounded by an estimate of
+the memory of the stored values and entries expire after a TTL.
+
+Entries are tagged with the schemas of the tables they read. `invalidate` drops the entries of a schema in this
+process, `publish_invalidation` drops them in all workers (e.g. after a data load).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, FrozenSet, List, Optional, Sequence
+
+from app.core.prometheus import sql_query_cache_requests_counter
+
+logger = logging.getLogger(__name__)
+
+SQL_QUERY_CACHE_INVALIDATION_CHANNEL = "sql_query_cache_invalidate"
+ALL_SCHEMAS = "*"
+
+
+@dataclass
+class CachedQueryResult:
+    """Columnar query result."""
+
+    columns: List[str]
+    data: List[tuple]
+    row_count: int
+    row_count_exact: bool
+    complete: bool
+    """True if `data` holds all the rows the query returns (up to the row cap of the database)."""
+    schemas: FrozenSet[str]
+    """Schemas read by the query, empty if unknown (invalidated with any schema)."""
+    size: int
+    expires_at: float
+
+    @property
+    def nb_rows(
+        self,
+    ) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def rows(
+        self,
+        limit: Optional[int] = None,
+    ) -> List[tuple]:
+        return list(zip(*(column[:limit] for column in self.data)))
+
+
+def _estimate_size(columns: List[str], data: List[tuple]) -> int:
+    return sum(sys.getsizeof(c) for c in columns) + sum(
+        sys.getsizeof(column) + sum(sys.getsizeof(value) for value in column) for column in data
+    )
+
+
+class SQLQueryCache:
+    """Size-bounded LRU cache of query results with a TTL."""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 600,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries: OrderedDict[str, CachedQueryResult] = OrderedDict()
+
+    @staticmethod
+    def key(
+        normalized_sql: str,
+        search_path: Optional[str] = None,
+    ) -> str:
+        return hashlib.blake2b(f"{search_path}\0{normalized_sql}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+    def get(
+        self,
+        key: str,
+    ) -> Optional[CachedQueryResult]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._pop(key)
+            entry = None
+        sql_query_cache_requests_counter.labels(result="miss" if entry is None else "hit").inc()
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(
+        self,
+        key: str,
+        columns: List[str],
+        rows: Sequence[Sequence[Any]],
+        row_count: int,
+        row_count_exact: bool,
+        complete: bool,
+        schemas: FrozenSet[str] = frozenset(),
+    ) -> Optional[CachedQueryResult]:
+        """Cache a query result, unless it is larger than the whole cache."""
+        data = list(zip(*rows)) if rows else [() for _ in columns]
+        size = _estimate_size(columns, data)
+        if size > self.max_bytes:
+            return None
+        if key in self._entries:
+            self._pop(key)
+        entry = CachedQueryResult(
+            columns=columns,
+            data=data,
+            row_count=row_count,
+            row_count_exact=row_count_exact,
+            complete=complete,
+            schemas=schemas,
+            size=size,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries[key] = entry
+        self.size += size
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+        return entry
+
+    def invalidate(
+        self,
+        schema: Optional[str] = None,
+    ) -> int:
+        """Drop the entries reading a schema (all entries if no schema is given), return the number dropped."""
+        keys = [
+            key
+            for key, entry in self._entries.items()
+            if schema is None or schema == ALL_SCHEMAS or not entry.schemas or schema in entry.schemas
+        ]
+        for key in keys:
+            self._pop(key)
+        logger.info(f"Invalidated {len(keys)} cached SQL query results (schema={schema})")
+        return len(keys)
+
+
+async def publish_invalidation(
+    schema: Optional[str] = None,
+) -> None:
+    """Invalidate the cached results of a schema in all workers."""
+    # imported here, app.api.deps imports the database session which imports this module
+    from app.api.deps import get_redis_client  # pylint: disable=import-outside-toplevel
+
+    redis_client = await get_redis_client()
+    await redis_client.publish(SQL_QUERY_CACHE_INVALIDATION_CHANNEL, schema or ALL_SCHEMAS)
+
+
+async def listen_for_invalidations(
+    query_cache: SQLQueryCache,
+    reconnect_delay: float = 1.0,
+) -> None:
+    """Invalidate cached results on messages of the invalidation channel (started in the FastAPI lifespan)."""
+    from app.api.deps import get_redis_client  # pylint: disable=import-outside-toplevel
+
+    while True:
+        try:
+            redis_client = await get_redis_client()
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(SQL_QUERY_CACHE_INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message is not None and message["type"] == "message":
+                        query_cache.invalidate(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"SQL query cache invalidation listener disconnected: {repr(e)}")
+            await asyncio.sleep(reconnect_delay)
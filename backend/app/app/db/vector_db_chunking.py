@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Chunking stage of the ingestion pipeline.
+
+Every parsed document is chunked exactly once, by one splitter per run. The texts of a batch of documents are
+tokenized in one `encode_ordinary_batch` call; documents within the chunk size, like most CSV rows, are kept as they
+are without decoding, longer ones are cut into overlapping token windows. Chunks keep a copy of the metadata of
+their document.
+"""
+import logging
+from typing import List, Sequence
+
+import tiktoken
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentChunker:
+    """Token window splitter of documents."""
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        encoding_name: str = "cl100k_base",
+    ) -> None:
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) must be smaller than the chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def split_documents(
+        self,
+        documents: Sequence[Document],
+    ) -> List[Document]:
+        """
+        Split documents into chunks of at most `chunk_size` tokens.
+
+        Args:
+            documents (Sequence[Document]): The documents.
+
+        Returns:
+            List[Document]: The chunks, in document order.
+        """
+        chunks: List[Document] = []
+        all_token_ids = self.encoding.encode_ordinary_batch([document.page_content for document in documents])
+        for document, token_ids in zip(documents, all_token_ids):
+            if len(token_ids) <= self.chunk_size:
+                if token_ids:
+                    chunks.append(Document(page_content=document.page_content, metadata=dict(document.metadata)))
+                continue
+            start = 0
+            while True:
+                end = min(start + self.chunk_size, len(token_ids))
+                chunks.append(
+                    Document(
+                        page_content=self.encoding.decode(token_ids[start:end]),
+                        metadata=dict(document.metadata),
+                    )
+                )
+                if end == len(token_ids):
+                    break
+                start += self.chunk_size - self.chunk_overlap
+        return chunks
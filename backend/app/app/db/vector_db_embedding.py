@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Embedding stage of the ingestion pipeline.
+
+Texts are embedded in batches of up to the provider limit of inputs per request, several batches run concurrently
+and a rate limiter spaces the requests to the provider quota. Batches are yielded in input order as they complete,
+so the vectors can be written to the vector store while the next batches are embedded, with at most
+`max_concurrency` batches in memory.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Sequence, Tuple
+
+from langchain.schema.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces out requests evenly to stay under a number of requests per minute."""
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+    ) -> None:
+        self.interval = 60.0 / requests_per_minute
+        self._next_request = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(
+        self,
+    ) -> None:
+        """Wait for the next request slot."""
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+
+class BatchEmbedder:
+    """Embeds texts in concurrent, rate limited batches."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 16,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+    ) -> None:
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+
+    async def _aembed_batch(
+        self,
+        texts: List[str],
+    ) -> List[List[float]]:
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire()
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_batches(
+        self,
+        texts: Sequence[str],
+    ) -> AsyncIterator[Tuple[int, List[List[float]]]]:
+        """
+        Embed texts batch by batch.
+
+        Args:
+            texts (Sequence[str]): The texts to embed.
+
+        Yields:
+            Tuple[int, List[List[float]]]: The offset of the batch in `texts` and its vectors, in input order.
+        """
+        in_flight: Deque[Tuple[int, asyncio.Task]] = deque()
+        try:
+            for offset in range(0, len(texts), self.batch_size):
+                batch = list(texts[offset : offset + self.batch_size])
+                in_flight.append((offset, asyncio.create_task(self._aembed_batch(batch))))
+                if len(in_flight) >= self.max_concurrency:
+                    done_offset, task = in_flight.popleft()
+                    yield done_offset, await task
+            while in_flight:
+                done_offset, task = in_flight.popleft()
+                yield done_offset, await task
+        finally:
+            for _, task in in_flight:
+                task.cancel()
+
+    async def aembed_documents(
+        self,
+        texts: Sequence[str],
+    ) -> List[List[float]]:
+        """Embed texts, in input order."""
+        vectors: List[List[float]] = []
+        async for _, batch_vectors in self.aembed_batches(texts):
+            vectors.extend(batch_vectors)
+        return vectors
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+ANN indexes of the PGVector collections.
+
+All collections share `langchain_pg_embedding`, whose `embedding` column has no fixed dimension. Each collection gets
+a partial HNSW or IVFFlat index on `embedding::vector(<dimensions>)` restricted to its `collection_id`, so a search
+only walks the vectors of its collection. Searches must use the same expression and an inlined collection id for
+the planner to pick the index (`similarity_search_sql`).
+
+Index maintenance around a load (`VectorIndexManager`):
+
+- a load adding at least `rebuild_fraction` of the rows (or the first load) drops the index beforehand and builds
+  it afterwards, which is much faster than updating it row by row, and builds HNSW graphs of better quality;
+- an IVFFlat index is rebuilt after such a load as well, its lists are computed from the rows at build time;
+- the table is analyzed after each load.
+
+Recall and latency at query time are tuned with `hnsw.ef_search` and `ivfflat.probes` (see `PGVectorAsyncStore`).
+
+Each collection also gets a partial GIN full-text index on `to_tsvector(<config>, document)`, used by the keyword
+side of the hybrid retrieval (`keyword_search_sql`), maintained the same way.
+"""
+import logging
+import math
+import re
+import uuid
+from typing import Any, List, Optional
+
+from app.schemas.ingestion_schema import VectorIndexConfig, VectorIndexTypeEnum
+
+logger = logging.getLogger(__name__)
+
+
+def index_name_prefix(collection_id: str) -> str:
+    return f"ix_langchain_pg_embedding_{uuid.UUID(str(collection_id)).hex}_"
+
+
+def full_text_index_name(collection_id: str, text_search_config: str) -> str:
+    return f"ix_langchain_pg_embedding_fts_{uuid.UUID(str(collection_id)).hex}_{text_search_config}"
+
+
+def _validate_text_search_config(text_search_config: str) -> str:
+    if not re.fullmatch(r"\w+", text_search_config):
+        raise ValueError(f"Invalid text search configuration {text_search_config}")
+    return text_search_config
+
+
+def embedding_expression(dimensions: int) -> str:
+    return f"(embedding::vector({int(dimensions)}))"
+
+
+def ivfflat_lists(nb_rows: int) -> int:
+    """Number of lists recommended by pgvector: rows / 1000 up to 1M rows, sqrt(rows) above."""
+    if nb_rows <= 1_000_000:
+        return max(nb_rows // 1000, 1)
+    return int(math.sqrt(nb_rows))
+
+
+def create_index_sql(
+    collection_id: str,
+    dimensions: int,
+    config: VectorIndexConfig,
+    nb_rows: int,
+) -> str:
+    """Statement creating the partial ANN index of a collection (cosine distance)."""
+    collection_uuid = uuid.UUID(str(collection_id))
+    if config.index_type == VectorIndexTypeEnum.HNSW:
+        method = "hnsw"
+        parameters = f"m = {int(config.hnsw_m)}, ef_construction = {int(config.hnsw_ef_construction)}"
+    elif config.index_type == VectorIndexTypeEnum.IVFFlat:
+        method = "ivfflat"
+        parameters = f"lists = {int(config.ivfflat_lists or ivfflat_lists(nb_rows))}"
+    else:
+        raise ValueError("No index to create")
+    return (
+        f"CREATE INDEX IF NOT EXISTS {index_name_prefix(collection_id)}{method} ON langchain_pg_embedding "
+        f"USING {method} ({embedding_expression(dimensions)} vector_cosine_ops) WITH ({parameters}) "
+        f"WHERE collection_id = '{collection_uuid}'"
+    )
+
+
+def similarity_search_sql(
+    collection_id: str,
+    dimensions: int,
+) -> str:
+    """Cosine similarity search of a collection, matching its partial index (query embedding in `:embedding`)."""
+    collection_uuid = uuid.UUID(str(collection_id))
+    expression = embedding_expression(dimensions)
+    return f"""
+    SELECT document, cmetadata, {expression} <=> CAST(CAST(:embedding AS text) AS vector({int(dimensions)})) AS distance
+    FROM langchain_pg_embedding
+    WHERE collection_id = '{collection_uuid}'
+    ORDER BY distance
+    LIMIT :k
+    """
+
+
+def create_full_text_index_sql(
+    collection_id: str,
+    text_search_config: str,
+) -> str:
+    """Statement creating the partial full-text index of a collection."""
+    collection_uuid = uuid.UUID(str(collection_id))
+    text_search_config = _validate_text_search_config(text_search_config)
+    return (
+        f"CREATE INDEX IF NOT EXISTS {full_text_index_name(collection_id, text_search_config)} "
+        f"ON langchain_pg_embedding USING gin (to_tsvector('{text_search_config}', document)) "
+        f"WHERE collection_id = '{collection_uuid}'"
+    )
+
+
+def keyword_search_sql(
+    collection_id: str,
+    text_search_config: str,
+) -> str:
+    """
+    Full-text search of a collection, matching its full-text index (query text in `:query`).
+
+    The words of the query are OR-ed (`plainto_tsquery` AND-s them, which rarely matches a whole question) and the
+    chunks are ranked by cover density, normalized by their length.
+    """
+    collection_uuid = uuid.UUID(str(collection_id))
+    text_search_config = _validate_text_search_config(text_search_config)
+    document_vector = f"to_tsvector('{text_search_config}', document)"
+    return f"""
+    SELECT document, cmetadata, ts_rank_cd({document_vector}, query, 1) AS rank
+    FROM langchain_pg_embedding,
+        CAST(replace(CAST(plainto_tsquery('{text_search_config}', :query) AS text), ' & ', ' | ') AS tsquery) AS query
+    WHERE collection_id = '{collection_uuid}' AND {document_vector} @@ query
+    ORDER BY rank DESC
+    LIMIT :k
+    """
+
+
+class VectorIndexManager:
+    """Maintains the ANN index of a collection on the psycopg2 connection of the ingestion pipeline."""
+
+    def __init__(
+        self,
+        connection: Any,
+        collection_id: str,
+        config: VectorIndexConfig,
+    ) -> None:
+        self.connection = connection
+        self.collection_id = str(collection_id)
+        self.config = config
+
+    def _fetch_one(self, statement: str, params: tuple = ()) -> Any:
+        with self.connection.cursor() as cursor:
+            cursor.execute(statement, params)
+            row = cursor.fetchone()
+        return row[0] if row is not None else None
+
+    def count_rows(
+        self,
+    ) -> int:
+        return self._fetch_one(
+            "SELECT count(*) FROM langchain_pg_embedding WHERE collection_id = %s", (self.collection_id,)
+        )
+
+    def dimensions(
+        self,
+    ) -> Optional[int]:
+        return self._fetch_one(
+            "SELECT vector_dims(embedding) FROM langchain_pg_embedding WHERE collection_id = %s LIMIT 1",
+            (self.collection_id,),
+        )
+
+    def existing_indexes(
+        self,
+    ) -> List[str]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'langchain_pg_embedding' AND indexname LIKE %s",
+                (index_name_prefix(self.collection_id) + "%",),
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def drop_indexes(
+        self,
+        full_text: bool = False,
+    ) -> None:
+        """Drop the ANN indexes of the collection, and its full-text index with `full_text`."""
+        index_names = self.existing_indexes()
+        if full_text:
+            index_names.append(full_text_index_name(self.collection_id, self.config.text_search_config))
+        with self.connection.cursor() as cursor:
+            for index_name in index_names:
+                logger.info(f"Dropping index {index_name}")
+                cursor.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+        self.connection.commit()
+
+    def create_full_text_index(
+        self,
+    ) -> None:
+        statement = create_full_text_index_sql(self.collection_id, self.config.text_search_config)
+        logger.info(f"Building full-text index: {statement}")
+        with self.connection.cursor() as cursor:
+            if self.config.maintenance_work_mem:
+                cursor.execute("SET maintenance_work_mem = %s", (self.config.maintenance_work_mem,))
+            cursor.execute(statement)
+        self.connection.commit()
+
+    def create_index(
+        self,
+    ) -> None:
+        dimensions = self.dimensions()
+        if dimensions is None or self.config.index_type == VectorIndexTypeEnum.NoIndex:
+            return
+        statement = create_index_sql(self.collection_id, dimensions, self.config, self.count_rows())
+        logger.info(f"Building vector index: {statement}")
+        with self.connection.cursor() as cursor:
+            if self.config.maintenance_work_mem:
+                cursor.execute("SET maintenance_work_mem = %s", (self.config.maintenance_work_mem,))
+            cursor.execute(statement)
+        self.connection.commit()
+
+    def before_load(
+        self,
+        load_fraction: float,
+    ) -> None:
+        """Drop the indexes before a bulk load, `load_fraction` is the expected fraction of the rows to load."""
+        if load_fraction >= self.config.rebuild_fraction or self.count_rows() == 0:
+            self.drop_indexes(full_text=True)
+
+    def after_load(
+        self,
+        nb_rows_written: int,
+    ) -> None:
+        """Rebuild or create the ANN index of the configured type and the full-text index after a load."""
+        with self.connection.cursor() as cursor:
+            cursor.execute("ANALYZE langchain_pg_embedding")
+        self.connection.commit()
+
+        expected = f"{index_name_prefix(self.collection_id)}{self.config.index_type.value}"
+        existing = self.existing_indexes()
+        outdated = [index_name for index_name in existing if index_name != expected]
+        rebuild = (
+            self.config.index_type == VectorIndexTypeEnum.IVFFlat
+            and expected in existing
+            and nb_rows_written >= self.config.rebuild_fraction * max(self.count_rows(), 1)
+        )
+        if outdated or rebuild:
+            self.drop_indexes()
+        self.create_index()
+        self.create_full_text_index()
@@ -1,24 +1,128 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import csv
+import json
 import logging
 import os
-from typing import Any, List
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import psycopg2
 from dotenv import load_dotenv
 from langchain.document_loaders.base import BaseLoader
 from langchain.embeddings import CacheBackedEmbeddings
 from langchain.schema import Document
-from langchain.text_splitter import TokenTextSplitter
 from langchain.vectorstores.pgvector import PGVector
 
 from app.core.config import settings
+from app.db.ingestion_manifest import IngestionManifestStore, plan_ingestion
+from app.db.vector_db_chunking import DocumentChunker
+from app.db.vector_db_embedding import BatchEmbedder
+from app.db.vector_db_index import VectorIndexManager
+from app.db.vector_db_writer import PGVectorCopyWriter
 from app.schemas.ingestion_schema import LOADER_DICT, IndexingConfig
 from app.services.chat_agent.helpers.embedding_models import get_embedding_model
 from app.utils.config_loader import get_ingestion_configs
 
 logger = logging.getLogger(__name__)
 
+SUPPORTED_EXTENSIONS = (".pdf", ".md", ".txt", ".csv")
+
+
+@dataclass
+class IngestionStats:
+    """Progress and throughput of an ingestion run."""
+
+    nb_files: int = 0
+    nb_files_parsed: int = 0
+    nb_pages: int = 0
+    nb_chunks: int = 0
+    failed_sources: List[str] = field(default_factory=list)
+    """Files that failed to parse or produced no chunk."""
+    start: float = field(default_factory=time.perf_counter)
+
+    def __str__(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (
+            f"{self.nb_files_parsed}/{self.nb_files} files ({len(self.failed_sources)} failed), {self.nb_pages} pages ({self.nb_pages / elapsed:.1f} "
+            f"pages/s), {self.nb_chunks} chunks written ({self.nb_chunks / elapsed:.1f} chunks/s) in {elapsed:.1f}s"
+        )
+
+
+def load_file(
+    file_path: str,
+    pipeline_config: IndexingConfig,
+) -> List[Document]:
+    """
+    Using specified PDF miner to convert a PDF document into raw text documents (one per page).
+    Also supports loading .md, .txt (plain text) and .csv (one document per row) files.
+    The documents are chunked afterwards by the chunking stage of the pipeline.
+
+    Module level function so that files can be parsed in a process pool.
+
+    Fallback: PyPDF
+    """
+    file_name = os.path.basename(file_path)
+    file_extension = os.path.splitext(file_name)[1].lower()
+    documents: List[Document] = []
+
+    # Load PDF files
+    if file_extension == ".pdf":
+        logger.info(f"Loading {file_name} into vectorstore")
+        try:
+            loader: Any = LOADER_DICT[pipeline_config.pdf_parser.name](file_path)  # type: ignore
+            file_docs = loader.load()
+            for file_doc in file_docs:
+                file_doc.metadata.setdefault("type", "pdf")
+            documents.extend(file_docs)
+            logger.info(f"{file_name} loaded successfully")
+        except Exception as e:
+            logger.error(
+                f"Could not extract text from PDF {file_name} with {pipeline_config.pdf_parser}: {repr(e)}"  # noqa: E501
+            )
+
+    # Load Markdown or Plain Text files
+    elif file_extension in (".md", ".txt"):
+        file_type = "markdown" if file_extension == ".md" else "plain text"
+        logger.info(f"Loading data from {file_name} as Document ({file_type})...")
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                file_content = f.read()
+
+            documents.append(
+                Document(
+                    page_content=file_content,
+                    metadata={"source": file_path, "type": file_type},
+                )
+            )
+        except Exception as e:
+            logger.error(f"Could not load {file_type} file {file_name}: {repr(e)}")
+
+    # Load CSV files
+    elif file_extension == ".csv":
+        logger.info(f"Loading data from {file_name} as CSV Document...")
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                csv_reader = csv.DictReader(f)
+                for row in csv_reader:
+                    text = row["text"]
+                    metadata = {key: value for key, value in row.items() if key != "text"}
+                    metadata["source"] = file_path
+                    metadata["type"] = "csv"
+
+                    documents.append(
+                        Document(
+                            page_content=text,
+                            metadata=metadata,
+                        )
+                    )
+        except Exception as e:
+            logger.error(f"Could not load CSV file {file_name}: {repr(e)}")
+
+    return documents
+
 
 class PDFExtractionPipeline:
     """Pipeline for extracting text from PDFs and load them into a vectorstore."""
@@ -34,6 +138,12 @@ class PDFExtractionPipeline:
         self.pipeline_config = pipeline_config
         self.pdf_loader = LOADER_DICT[pipeline_config.pdf_parser.name]
         self.embedding = get_embedding_model(pipeline_config.embedding_model)
+        self.batch_embedder = BatchEmbedder(
+            self.embedding,
+            batch_size=pipeline_config.embedding_batch_size,
+            max_concurrency=pipeline_config.embedding_max_concurrency,
+            requests_per_minute=pipeline_config.embedding_requests_per_minute,
+        )
         self.connection_str = PGVector.connection_string_from_db_params(
             driver="psycopg2",
             host=settings.DATABASE_HOST,
@@ -70,118 +180,70 @@ class PDFExtractionPipeline:
             return self._load_documents(folder_path=folder_path, collection_name=collection_name)
         raise ValueError("folder_path must be provided if load_index is False")
 
-    def _file_already_loaded(self, file_path: str, collection_name: str) -> bool:
-        """Check if file is already loaded based on its path using direct SQL query."""
-        try:
-            query = """
-            SELECT EXISTS(
-                SELECT 1
-                FROM langchain_pg_embedding e
-                JOIN langchain_pg_collection c on c.uuid = e.collection_id
-                WHERE c.name = %s AND e.cmetadata->>'source' = %s
-            );
-            """
-            self.db_cursor.execute(query, (collection_name, file_path))
-            return self.db_cursor.fetchone()[0]
-        except Exception as e:
-            logger.error("Error checking if file is already loaded.")
-            logger.error(repr(e))
-            return False
-
-    def _load_docs(
+    def _list_files(
         self,
         dir_path: str,
-        collection_name: str,
-    ) -> List[Document]:
+    ) -> List[str]:
+        """List the supported files of a folder and its subfolders."""
+        return [
+            os.path.join(root, file_name)
+            for root, _, files in os.walk(dir_path)
+            for file_name in files
+            if os.path.splitext(file_name)[1].lower() in SUPPORTED_EXTENSIONS
+        ]
+
+    def _chunking_config(
+        self,
+    ) -> str:
+        """Settings that change the chunks of a file, a file is re-ingested when they change."""
+        return json.dumps(
+            {
+                "chunk_size": self.pipeline_config.tokenizer_chunk_size,
+                "chunk_overlap": self.pipeline_config.tokenizer_chunk_overlap,
+                "encoding": self.pipeline_config.tokenizer_encoding,
+            },
+            sort_keys=True,
+        )
+
+    async def _aiter_file_documents(
+        self,
+        file_paths: List[str],
+    ) -> AsyncIterator[Tuple[str, List[Document]]]:
         """
-        Using specified PDF miner to convert PDF documents into raw text chunks.
-        Also supports loading .txt (plain text) files and loads files from subfolders.
-        Only loads files not already in the database.
+        Parse files in a worker pool and yield each file with its documents as soon as it is parsed.
 
-        Fallback: PyPDF
+        With `parse_workers` > 1 the files are parsed in a process pool (PDF parsing is CPU bound), otherwise in one
+        worker thread. At most `parse_max_in_flight` files are submitted at a time, so parsed documents do not pile
+        up in memory when the embedding stage is slower than the parsing.
         """
-        documents = []
-        for root, _, files in os.walk(dir_path):
-            for file_name in files:
-                file_extension = os.path.splitext(file_name)[1].lower()
-                file_path = os.path.join(root, file_name)
-
-                if not self._file_already_loaded(file_path, collection_name):
-                    # Load PDF files
-                    if file_extension == ".pdf":
-                        logger.info(f"Loading {file_name} into vectorstore")
-                        try:
-                            loader: Any = self.pdf_loader(file_path)  # type: ignore
-                            file_docs = loader.load()
-                            documents.extend(file_docs)
-                            logger.info(f"{file_name} loaded successfully")
-                        except Exception as e:
-                            logger.error(
-                                f"Could not extract text from PDF {file_name} with {self.pipeline_config.pdf_parser}: {repr(e)}"  # noqa: E501
-                            )
-
-                    # Load Markdown or Plain Text files
-                    elif file_extension in (".md", ".txt"):
-                        file_type = "markdown" if file_extension == ".md" else "plain text"
-                        logger.info(f"Loading data from {file_name} as Document ({file_type})...")
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                file_content = f.read()
-
-                            file_doc = Document(
-                                page_content=file_content,
-                                metadata={"source": file_path, "type": file_type},
-                            )
-
-                            text_splitter = TokenTextSplitter(
-                                chunk_size=self.pipeline_config.tokenizer_chunk_size,
-                                chunk_overlap=self.pipeline_config.tokenizer_chunk_overlap,
-                            )
-                            file_docs = text_splitter.split_documents([file_doc])
-
-                            documents.extend(file_docs)
-                            if len(file_docs) > 1:
-                                logger.info(
-                                    f"Split {file_name} into {len(file_docs)} documents due to chunk size: ({self.pipeline_config.tokenizer_chunk_size})"  # noqa: E501
-                                )
-                        except Exception as e:
-                            logger.error(f"Could not load {file_type} file {file_name}: {repr(e)}")
-
-                    # Load CSV files
-                    elif file_extension == ".csv":
-                        logger.info(f"Loading data from {file_name} as CSV Document...")
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                csv_reader = csv.DictReader(f)
-                                for row in csv_reader:
-                                    text = row["text"]
-                                    metadata = {key: value for key, value in row.items() if key != "text"}
-                                    metadata["source"] = file_path
-                                    metadata["type"] = "csv"
-
-                                    file_doc = Document(
-                                        page_content=text,
-                                        metadata=metadata,
-                                    )
-
-                                    text_splitter = TokenTextSplitter(
-                                        chunk_size=self.pipeline_config.tokenizer_chunk_size,
-                                        chunk_overlap=self.pipeline_config.tokenizer_chunk_overlap,
-                                    )
-                                    file_docs = text_splitter.split_documents([file_doc])
-
-                                    documents.extend(file_docs)
-                                    if len(file_docs) > 1:
-                                        logger.info(
-                                            f"Split {file_name} into {len(file_docs)} documents due to chunk size: ({self.pipeline_config.tokenizer_chunk_size})"  # noqa: E501
-                                        )
-                        except Exception as e:
-                            logger.error(f"Could not load CSV file {file_name}: {repr(e)}")
-
-                else:
-                    logger.info(f"File {file_name} already loaded, skipping.")
-
-        return documents
+        nb_workers = self.pipeline_config.parse_workers
+        max_in_flight = self.pipeline_config.parse_max_in_flight or 2 * nb_workers
+        executor: Executor = (
+            ProcessPoolExecutor(max_workers=nb_workers) if nb_workers > 1 else ThreadPoolExecutor(max_workers=1)
+        )
+        loop = asyncio.get_running_loop()
+        in_flight: Dict[asyncio.Future, str] = {}
+        try:
+            for file_path in file_paths:
+                in_flight[loop.run_in_executor(executor, load_file, file_path, self.pipeline_config)] = file_path
+                if len(in_flight) >= max_in_flight:
+                    done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    while done:
+                        future = done.pop()
+                        yield in_flight.pop(future), future.result()
+            while in_flight:
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                while done:
+                    future = done.pop()
+                    yield in_flight.pop(future), future.result()
+        finally:
+            for future in in_flight:
+                if not future.done():
+                    future.cancel()
+                elif not future.cancelled():
+                    # parsed files not yielded after an error, their own errors are superseded by it
+                    future.exception()
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def _load_documents(
         self,
@@ -189,27 +251,102 @@ class PDFExtractionPipeline:
         collection_name: str,
     ) -> PGVector:
         """Load documents into vectorstore."""
-        text_documents = self._load_docs(folder_path, collection_name)
-        text_splitter = TokenTextSplitter(
-            chunk_size=self.pipeline_config.tokenizer_chunk_size,
-            chunk_overlap=self.pipeline_config.tokenizer_chunk_overlap,
-        )
-        texts = text_splitter.split_documents(text_documents)
-
-        # Add metadata for separate filtering
-        for text in texts:
-            text.metadata["type"] = "Text"
-
-        docs = [*texts]
-
-        logger.info(f"Loading {len(texts)} text-documents into vectorstore")
-        return PGVector.from_documents(
-            embedding=self.embedding,
-            documents=docs,
+        # creates the tables and the collection if needed
+        db = PGVector(
+            embedding_function=self.embedding,
             collection_name=collection_name,
             connection_string=self.connection_str,
             pre_delete_collection=False,
         )
+        self.db_cursor.execute("SELECT uuid FROM langchain_pg_collection WHERE name = %s", (collection_name,))
+        collection_id = self.db_cursor.fetchone()[0]
+
+        manifest_store = IngestionManifestStore(self.db_connection)
+        manifest_store.create_table_if_not_exists()
+        plan = plan_ingestion(
+            manifest_store.load(collection_name),
+            self._list_files(folder_path),
+            parser=self.pipeline_config.pdf_parser.name,
+            chunking_config=self._chunking_config(),
+        )
+        logger.info(f"Ingestion plan: {plan}")
+        manifest_store.delete_chunks(collection_id, plan.stale_sources)
+        manifest_store.move_chunks(collection_id, [(source, entry.source) for source, entry in plan.moved])
+
+        file_paths = [entry.source for entry in plan.to_ingest]
+        nb_files = len(file_paths) + len(plan.moved) + len(plan.touched) + plan.nb_unchanged
+        index_manager = VectorIndexManager(self.db_connection, collection_id, self.pipeline_config.vector_index)
+        index_manager.before_load(load_fraction=len(file_paths) / max(nb_files, 1))
+        stats = asyncio.run(self._aingest(file_paths, PGVectorCopyWriter(self.db_connection, collection_id)))
+        index_manager.after_load(nb_rows_written=stats.nb_chunks)
+        manifest_store.save(collection_name, plan.without_failed(set(stats.failed_sources)))
+        logger.info(f"Ingestion done: {stats}")
+        return db
+
+    async def _aingest(
+        self,
+        file_paths: List[str],
+        writer: PGVectorCopyWriter,
+    ) -> IngestionStats:
+        """
+        Parse, split, embed and write files as a stream.
+
+        The chunks of the parsed files are grouped by `vector_write_batch_size` and handed over to the embedding
+        stage through a bounded queue, so that parsing, embedding and writing overlap. An error of the parsing or
+        chunking stage stops the ingestion and is raised.
+        """
+        stats = IngestionStats(nb_files=len(file_paths))
+        write_batch_size = self.pipeline_config.vector_write_batch_size
+        chunker = DocumentChunker(
+            chunk_size=self.pipeline_config.tokenizer_chunk_size,
+            chunk_overlap=self.pipeline_config.tokenizer_chunk_overlap,
+            encoding_name=self.pipeline_config.tokenizer_encoding,
+        )
+        queue: asyncio.Queue[Optional[List[Document]]] = asyncio.Queue(maxsize=2)
+
+        async def produce() -> None:
+            chunks: List[Document] = []
+            try:
+                async for file_path, file_documents in self._aiter_file_documents(file_paths):
+                    texts = chunker.split_documents(file_documents)
+                    if not texts:
+                        logger.warning(f"No chunk extracted from {file_path}, it is retried on the next run")
+                        stats.failed_sources.append(file_path)
+                    stats.nb_files_parsed += 1
+                    stats.nb_pages += len(file_documents)
+                    chunks.extend(texts)
+                    while len(chunks) >= write_batch_size:
+                        await queue.put(chunks[:write_batch_size])
+                        chunks = chunks[write_batch_size:]
+                if chunks:
+                    await queue.put(chunks)
+            except BaseException:
+                # e.g. a crashed parser process (BrokenProcessPool): the pending batches are dropped so that the
+                # consumer wakes up on None, then awaits the producer which raises the error
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                raise
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (chunks := await queue.get()) is not None:
+                stats.nb_chunks += await self._aembed_and_write(chunks, writer)
+                logger.info(f"Ingestion progress: {stats}")
+            await producer
+        finally:
+            producer.cancel()
+        return stats
+
+    async def _aembed_and_write(
+        self,
+        documents: List[Document],
+        writer: PGVectorCopyWriter,
+    ) -> int:
+        """Embed documents in concurrent batches and COPY them to the vectorstore."""
+        vectors = await self.batch_embedder.aembed_documents([d.page_content for d in documents])
+        return await asyncio.to_thread(writer.write, documents, vectors)
 
 
 def get_pdf_pipeline() -> PDFExtractionPipeline:
@@ -223,7 +360,7 @@ def get_pdf_pipeline() -> PDFExtractionPipeline:
 def run_pdf_ingestion_pipeline(load_index: bool = True) -> None:
     get_pdf_pipeline().run(
         settings.PDF_TOOL_DATA_PATH,
-        collection_name="pdf_indexing_1",
+        collection_name=settings.PDF_TOOL_COLLECTION_NAME,
         load_index=load_index,
     )
 
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Async read access to a PGVector collection.
+
+`PGVector` checks and creates the extension, tables and collection each time it is constructed, and its similarity
+search runs synchronously. The PDF tool instead holds one `PGVectorAsyncRetriever` for the lifetime of the process:
+the store keeps an asyncpg connection pool (created on first use and disposed with the other database resources),
+resolves the collection id and embedding dimensions once, and always runs the same statements, which asyncpg
+prepares once per pooled connection and reuses.
+
+The retriever combines the vector search with a Postgres full-text search of the collection (hybrid retrieval),
+fused with reciprocal rank fusion: exact names and rare words that embeddings blur are still found.
+
+The statement matches the partial ANN index of the collection (see `app.db.vector_db_index`). `ef_search` (HNSW)
+and `probes` (IVFFlat) trade recall for latency, they are set on each new pooled connection.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.sql.elements import TextClause
+
+from app.db.vector_db_index import keyword_search_sql, similarity_search_sql
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_STATEMENT = text(
+    """
+    SELECT c.uuid, (
+        SELECT vector_dims(e.embedding) FROM langchain_pg_embedding e WHERE e.collection_id = c.uuid LIMIT 1
+    ) AS dimensions
+    FROM langchain_pg_collection c
+    WHERE c.name = :collection_name
+    """
+)
+
+
+def session_settings_sql(
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> List[str]:
+    """Statements setting the ANN search parameters of a connection."""
+    statements = []
+    if ef_search is not None:
+        statements.append(f"SET hnsw.ef_search = {int(ef_search)}")
+    if probes is not None:
+        statements.append(f"SET ivfflat.probes = {int(probes)}")
+    return statements
+
+
+class PGVectorAsyncStore:
+    """Long-lived async handle on a PGVector collection."""
+
+    def __init__(
+        self,
+        database_uri: str,
+        collection_name: str,
+        engine_args: Optional[Dict[str, Any]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        text_search_config: str = "english",
+    ) -> None:
+        self.collection_name = collection_name
+        self.text_search_config = text_search_config
+        self.engine: AsyncEngine = create_async_engine(database_uri, **(engine_args or {}))
+        self._session_settings = session_settings_sql(ef_search=ef_search, probes=probes)
+        if self._session_settings:
+            event.listen(self.engine.sync_engine, "connect", self._configure_connection)
+        self._statements: Optional[Tuple[TextClause, TextClause]] = None
+
+    def _configure_connection(
+        self,
+        dbapi_connection: Any,
+        _connection_record: Any,
+    ) -> None:
+        cursor = dbapi_connection.cursor()
+        for statement in self._session_settings:
+            cursor.execute(statement)
+        cursor.close()
+
+    async def _aget_statements(
+        self,
+    ) -> Optional[Tuple[TextClause, TextClause]]:
+        """Similarity and keyword search statements of the collection, None while the collection is empty."""
+        if self._statements is None:
+            async with self.engine.connect() as connection:
+                row = (
+                    await connection.execute(COLLECTION_STATEMENT, {"collection_name": self.collection_name})
+                ).first()
+            if row is None:
+                raise ValueError(f"Collection {self.collection_name} not found, run the ingestion pipeline first")
+            if row.dimensions is None:
+                return None
+            self._statements = (
+                text(similarity_search_sql(str(row.uuid), row.dimensions)),
+                text(keyword_search_sql(str(row.uuid), self.text_search_config)),
+            )
+        return self._statements
+
+    async def asimilarity_search_with_score_by_vector(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Search the documents closest to an embedding.
+
+        Args:
+            embedding (Sequence[float]): The query embedding.
+            k (int): The number of documents to return.
+
+        Returns:
+            List[Tuple[Document, float]]: The documents and their cosine distance to the embedding, closest first.
+        """
+        statements = await self._aget_statements()
+        if statements is None:
+            return []
+        async with self.engine.connect() as connection:
+            rows = (
+                await connection.execute(
+                    statements[0],
+                    {
+                        "embedding": "[" + ",".join(map(str, embedding)) + "]",
+                        "k": k,
+                    },
+                )
+            ).all()
+        return [(to_document(row.document, row.cmetadata), row.distance) for row in rows]
+
+    async def akeyword_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Search the documents matching the words of a query with the full-text index.
+
+        Args:
+            query (str): The query text.
+            k (int): The number of documents to return.
+
+        Returns:
+            List[Tuple[Document, float]]: The documents and their full-text rank, best first.
+        """
+        statements = await self._aget_statements()
+        if statements is None:
+            return []
+        async with self.engine.connect() as connection:
+            rows = (await connection.execute(statements[1], {"query": query, "k": k})).all()
+        return [(to_document(row.document, row.cmetadata), row.rank) for row in rows]
+
+    async def aclose(
+        self,
+    ) -> None:
+        await self.engine.dispose()
+
+
+def to_document(page_content: Optional[str], metadata: Any) -> Document:
+    """Document of a row, asyncpg returns json columns as strings."""
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return Document(page_content=page_content or "", metadata=metadata or {})
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Document]],
+    k: int = 60,
+) -> List[Document]:
+    """
+    Fuse rankings of documents with reciprocal rank fusion.
+
+    A document scores the sum of 1 / (k + rank) over the rankings it appears in, documents are identified by their
+    content. Ties keep the order of the first ranking.
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.page_content] = scores.get(document.page_content, 0.0) + 1 / (k + rank)
+            documents.setdefault(document.page_content, document)
+    return [documents[key] for key in sorted(scores, key=scores.__getitem__, reverse=True)]
+
+
+class PGVectorAsyncRetriever:
+    """
+    Searches the documents of a PGVector collection closest to a query without blocking.
+
+    With `keyword_search`, the vector search (on the query embedding) and the full-text search run concurrently,
+    `fetch_k` candidates each, and their rankings are fused with reciprocal rank fusion.
+    """
+
+    def __init__(
+        self,
+        store: PGVectorAsyncStore,
+        embeddings: Embeddings,
+        k: int = 4,
+        fetch_k: Optional[int] = None,
+        keyword_search: bool = False,
+        rrf_k: int = 60,
+    ) -> None:
+        self.store = store
+        self.embeddings = embeddings
+        self.k = k
+        self.fetch_k = fetch_k or k
+        self.keyword_search = keyword_search
+        self.rrf_k = rrf_k
+
+    async def _avector_search(
+        self,
+        query: str,
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        documents_and_distances = await self.store.asimilarity_search_with_score_by_vector(embedding, k=self.fetch_k)
+        return [document for document, _ in documents_and_distances]
+
+    async def _akeyword_search(
+        self,
+        query: str,
+    ) -> List[Document]:
+        try:
+            documents_and_ranks = await self.store.akeyword_search_with_score(query, k=self.fetch_k)
+        except Exception as e:
+            logger.warning(f"Keyword search failed, using vector search only: {repr(e)}")
+            return []
+        return [document for document, _ in documents_and_ranks]
+
+    async def aget_relevant_documents(
+        self,
+        query: str,
+        keyword_query: Optional[str] = None,
+    ) -> List[Document]:
+        """
+        Get the documents relevant to a query.
+
+        Args:
+            query (str): The query, embedded for the vector search.
+            keyword_query (Optional[str]): The words to search in the full-text index, the query if not set.
+
+        Returns:
+            List[Document]: The `k` most relevant documents, best first.
+        """
+        if not self.keyword_search:
+            return (await self._avector_search(query))[: self.k]
+        rankings = await asyncio.gather(
+            self._avector_search(query),
+            self._akeyword_search(keyword_query or query),
+        )
+        return reciprocal_rank_fusion(rankings, k=self.rrf_k)[: self.k]
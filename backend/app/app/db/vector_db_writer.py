@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk writer of documents and vectors into the PGVector tables.
+
+Rows are streamed to `langchain_pg_embedding` with one `COPY ... FROM STDIN` per batch instead of one ORM insert per
+document, in the schema of the LangChain PGVector store so the store reads them as usual.
+"""
+import csv
+import io
+import json
+import logging
+import uuid
+from typing import Any, Optional, Sequence
+
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+COPY_EMBEDDINGS_STATEMENT = (
+    "COPY langchain_pg_embedding (uuid, collection_id, embedding, document, cmetadata, custom_id) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+
+def format_vector(vector: Sequence[float]) -> str:
+    """Text representation of a pgvector vector."""
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+class PGVectorCopyWriter:
+    """Writes the documents of a collection with COPY on a psycopg2 connection."""
+
+    def __init__(
+        self,
+        connection: Any,
+        collection_id: str,
+    ) -> None:
+        self.connection = connection
+        self.collection_id = collection_id
+
+    def to_csv(
+        self,
+        documents: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+        ids: Optional[Sequence[str]] = None,
+    ) -> io.StringIO:
+        """CSV rows of the documents, in the column order of COPY_EMBEDDINGS_STATEMENT."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for i, (document, vector) in enumerate(zip(documents, vectors)):
+            writer.writerow(
+                [
+                    uuid.uuid4(),
+                    self.collection_id,
+                    format_vector(vector),
+                    # Postgres text cannot hold NUL characters, which some PDF parsers extract
+                    document.page_content.replace("\x00", ""),
+                    json.dumps(document.metadata),
+                    ids[i] if ids is not None else str(uuid.uuid1()),
+                ]
+            )
+        buffer.seek(0)
+        return buffer
+
+    def write(
+        self,
+        documents: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+        ids: Optional[Sequence[str]] = None,
+    ) -> int:
+        """
+        Write documents and their vectors in one COPY and commit.
+
+        Args:
+            documents (Sequence[Document]): The documents.
+            vectors (Sequence[Sequence[float]]): The vectors of the documents.
+            ids (Optional[Sequence[str]]): Custom ids of the documents, generated if not given.
+
+        Returns:
+            int: The number of rows written.
+        """
+        if not documents:
+            return 0
+        buffer = self.to_csv(documents, vectors, ids)
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.copy_expert(COPY_EMBEDDINGS_STATEMENT, buffer)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        return len(documents)
@@ -4,8 +4,7 @@ from typing import Optional
 from langchain.agents import AgentExecutor
 
 from app.api.deps import get_redis_client
-from app.services.chat_agent.meta_agent import create_meta_agent
-from app.utils.config_loader import get_agent_config
+from app.services.chat_agent.agent_registry import get_meta_agent_registry
 from app.utils.fastapi_globals import g
 from app.utils.uuid7 import uuid7
 
@@ -23,6 +22,4 @@ async def set_global_tool_context() -> None:
 def get_meta_agent(
     api_key: Optional[str] = None,
 ) -> AgentExecutor:
-    agent_config = get_agent_config()
-    agent_config.api_key = api_key
-    return create_meta_agent(agent_config)
+    return get_meta_agent_registry().get_executor(api_key)
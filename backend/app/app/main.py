@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import gc
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Dict
@@ -13,18 +12,16 @@ from fastapi_cache.backends.redis import RedisBackend
 from fastapi_limiter import FastAPILimiter
 from fastapi_pagination import add_pagination
 from jose import jwt
-from langchain.cache import RedisCache
-from langchain.globals import set_llm_cache
 from pydantic import ValidationError
 from starlette.middleware.cors import CORSMiddleware
 
-from app.api.deps import get_redis_client, get_redis_client_sync
+from app.api.deps import get_redis_client
 from app.api.v1.api import api_router as api_router_v1
-from app.core.config import settings, yaml_configs
+from app.core.config import settings
 from app.core.fastapi import FastAPIWithInternalModels  # Assurez-vous d'importer ceci
 from app.core.prometheus import setup_prometheus_instrumentator
-from app.utils.config_loader import load_agent_config, load_ingestion_configs
-from app.utils.fastapi_globals import GlobalsMiddleware, g
+from app.core.resources import process_resources
+from app.utils.fastapi_globals import GlobalsMiddleware
 
 
 async def user_id_identifier(request: Request) -> str:
@@ -73,33 +70,23 @@ async def user_id_identifier(request: Request) -> str:
 @asynccontextmanager
 async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     """Start up and shutdown tasks."""
-    # startup
-    yaml_configs["agent_config"] = load_agent_config()
-    yaml_configs["ingestion_config"] = load_ingestion_configs()
-
-    redis_client = await get_redis_client()
-
-    if settings.ENABLE_LLM_CACHE:
-        set_llm_cache(RedisCache(redis_=get_redis_client_sync()))
-
-    FastAPICache.init(
-        RedisBackend(redis_client),
-        prefix="fastapi-cache",
-    )
-    await FastAPILimiter.init(
-        redis_client,
-        identifier=user_id_identifier,
-    )
-
-    logging.info("Start up FastAPI [Full dev mode]")
-    yield
-
-    # shutdown
-    await FastAPICache.clear()
-    await FastAPILimiter.close()
-    g.cleanup()
-    gc.collect()
-    yaml_configs.clear()
+    async with process_resources():
+        redis_client = await get_redis_client()
+
+        FastAPICache.init(
+            RedisBackend(redis_client),
+            prefix="fastapi-cache",
+        )
+        await FastAPILimiter.init(
+            redis_client,
+            identifier=user_id_identifier,
+        )
+
+        logging.info("Start up FastAPI [Full dev mode]")
+        yield
+
+        await FastAPICache.clear()
+        await FastAPILimiter.close()
 
 
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +21,7 @@ class AgentAndToolsConfig(BaseModel):
     fast_llm: LLMType
     fast_llm_token_limit: int
     max_token_length: int
+    tool_timeout: Optional[float] = None
 
 
 class AgentConfig(BaseModel):
@@ -37,13 +37,42 @@ LOADER_DICT: dict[str, type[BaseLoader]] = {
 }
 
 
+class VectorIndexTypeEnum(Enum):
+    HNSW = "hnsw"
+    IVFFlat = "ivfflat"
+    NoIndex = "none"
+
+
+class VectorIndexConfig(BaseModel):
+    """ANN index of a collection, a partial index on `langchain_pg_embedding` per collection."""
+
+    index_type: VectorIndexTypeEnum = VectorIndexTypeEnum.HNSW
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    ivfflat_lists: Optional[int] = None
+    """Number of IVFFlat lists, rows / 1000 (sqrt(rows) above 1M rows) if not set."""
+    rebuild_fraction: float = 0.2
+    """Build the index after the load, instead of updating it, when a load adds this fraction of the rows."""
+    maintenance_work_mem: Optional[str] = "512MB"
+    text_search_config: str = "english"
+    """Postgres text search configuration of the full-text index used by the hybrid retrieval."""
+
+
 class IndexingConfig(BaseModel):
     tokenizer_chunk_size: int = 3000
     tokenizer_chunk_overlap: int = 200
+    tokenizer_encoding: str = "cl100k_base"
     large_file_tokenizer_chunk_size: int = 4000
     large_file_tokenizer_chunk_overlap: int = 200
     pdf_parser: PDFParserEnum = PDFParserEnum.PyMuPDF
     embedding_model: Optional[str] = None
+    parse_workers: int = 1
+    parse_max_in_flight: Optional[int] = None
+    embedding_batch_size: int = 16
+    embedding_max_concurrency: int = 4
+    embedding_requests_per_minute: Optional[float] = None
+    vector_write_batch_size: int = 1000
+    vector_index: VectorIndexConfig = VectorIndexConfig()
 
 
 class IngestionPipelineConfigs(BaseModel):
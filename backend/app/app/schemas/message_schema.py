@@ -60,6 +60,15 @@ class IChatQuery(QueryBase):
     settings: Optional[UserSettings] = None
 
 
+class IAgentRun(BaseModel):
+    """An agent run waiting in the run queue, its chat without the API key (see `RunQueue.aenqueue`)."""
+
+    run_id: str
+    chat: IChatQuery
+    enqueued_at: datetime = Field(default_factory=datetime.now)
+    has_api_key: bool = False
+
+
 class IFeedback(QueryBase):
     conversation_id: UUID
     message_id: UUID
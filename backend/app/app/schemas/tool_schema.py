@@ -31,6 +31,9 @@ class ToolConfig(BaseModel):
     system_context_refinement: Optional[str]
     prompt_inputs: list[PromptInput]
     additional: Optional[Box] = None
+    timeout: Optional[float] = None
+    llm_cache: bool = False
+    llm_cache_similarity_threshold: Optional[float] = None
 
 
 class SqlToolConfig(ToolConfig):
@@ -38,6 +41,16 @@ class SqlToolConfig(ToolConfig):
     validate_empty_results: bool
     validate_with_llm: bool
     always_limit_query: bool
+    table_selection_top_k: int = 5
+    table_selection_min_similarity: float = 0.8
+
+
+class PdfToolConfig(ToolConfig):
+    retrieval_fetch_k: int = 20
+    retrieval_top_k: int = 8
+    retrieval_keyword_search: bool = True
+    context_max_tokens: int = 1500
+    passage_max_tokens: int = 150
 
 
 class ToolsLibrary(BaseModel):
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from typing import Any, List
+from typing import Any, List, Optional
 
 from pydantic import BaseModel
 
@@ -12,6 +12,7 @@ class TableInfo(BaseModel):
     schema_name: str
     table_name: str
     structure: str
+    fingerprint: Optional[str] = None
 
     @property
     def name(
@@ -35,3 +36,5 @@ class ExecutionResult(QueryBase):
     ]
     affected_rows: int | None = None
     error: str | None = None
+    truncated: bool = False
+    """True if the result has more rows than `SQL_TOOL_DB_MAX_ROWS`, only the first ones are returned."""
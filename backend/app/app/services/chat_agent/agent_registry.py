@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# pylint: disable=global-statement
+from __future__ import annotations
+
+import logging
+from typing import Callable, List, Optional
+
+from langchain.agents import AgentExecutor
+from langchain.base_language import BaseLanguageModel
+from langchain.chains.llm import LLMChain
+from langchain.prompts.base import BasePromptTemplate
+from langchain.tools import BaseTool
+
+from app.core.config import settings
+from app.schemas.agent_schema import AgentConfig
+from app.schemas.tool_schema import LLMType
+from app.services.chat_agent.helpers.embedding_models import get_embedding_model
+from app.services.chat_agent.helpers.llm import get_llm
+from app.services.chat_agent.helpers.routing_cache import RoutingCache
+from app.services.chat_agent.meta_agent import create_agent_executor
+from app.services.chat_agent.router_agent.SimpleRouterAgent import SimpleRouterAgent
+from app.services.chat_agent.tools.tools import get_tools
+from app.utils.config_loader import get_agent_config
+
+logger = logging.getLogger(__name__)
+
+
+class MetaAgentRegistry:
+    """
+    Process-level registry of everything a meta agent run can share.
+
+    Tools (with their LLM clients and DB connections), the router prompt and the default router LLM are built
+    once. `get_executor` then hands out a cheap AgentExecutor per request, which only carries per-request state:
+    the router LLM for the request API key and a fresh SimpleRouterAgent (so `action_plan` starts empty).
+    Callbacks are passed per run, when the executor is called. The routing cache is shared by all router agents,
+    it is dropped with the registry when the agent config changes.
+    """
+
+    agent_config: AgentConfig
+    tools: List[BaseTool]
+    router_prompt: BasePromptTemplate
+    default_llm: BaseLanguageModel
+    routing_cache: Optional[RoutingCache]
+
+    def __init__(
+        self,
+        agent_config: AgentConfig,
+        get_llm_hook: Callable[[LLMType, Optional[str]], BaseLanguageModel] = get_llm,
+    ) -> None:
+        self.agent_config = agent_config
+        self.get_llm_hook = get_llm_hook
+        self.tools = get_tools(tools=agent_config.tools)
+        self.router_prompt = SimpleRouterAgent.create_prompt(
+            prompt_message=agent_config.prompt_message,
+            system_context=agent_config.system_context,
+            action_plans=agent_config.action_plans,
+        )
+        self.default_llm = get_llm_hook(
+            agent_config.common.llm,
+            settings.OPENAI_API_KEY,
+        )
+        self.routing_cache = self._create_routing_cache()
+        logger.info(f"Meta agent registry initialized with tools: {[tool.name for tool in self.tools]}")
+
+    @staticmethod
+    def _create_routing_cache() -> Optional[RoutingCache]:
+        if not settings.ROUTING_CACHE_ENABLED:
+            return None
+        embeddings = None
+        if settings.ROUTING_CACHE_SEMANTIC_ENABLED:
+            try:
+                embeddings = get_embedding_model(None)
+            except Exception as e:
+                logger.warning(f"Semantic routing cache disabled, no embedding model: {repr(e)}")
+        return RoutingCache(
+            max_size=settings.ROUTING_CACHE_MAX_SIZE,
+            ttl=settings.ROUTING_CACHE_TTL,
+            embeddings=embeddings,
+            similarity_threshold=settings.ROUTING_CACHE_SIMILARITY_THRESHOLD,
+        )
+
+    def get_router_llm(
+        self,
+        api_key: Optional[str] = None,
+    ) -> BaseLanguageModel:
+        """Get the router LLM, only building a new client if the request brings its own API key."""
+        if api_key is None or api_key == "" or api_key == settings.OPENAI_API_KEY:
+            return self.default_llm
+        return self.get_llm_hook(
+            self.agent_config.common.llm,
+            api_key,
+        )
+
+    def get_executor(
+        self,
+        api_key: Optional[str] = None,
+    ) -> AgentExecutor:
+        """
+        Get a per-request meta agent executor.
+
+        Args:
+            api_key (Optional[str]): The API key of the request, defaults to the server API key.
+
+        Returns:
+            AgentExecutor: An executor with a fresh router agent and the shared tools.
+        """
+        simple_router_agent = SimpleRouterAgent(
+            tools=self.tools,
+            llm_chain=LLMChain(
+                llm=self.get_router_llm(api_key),
+                prompt=self.router_prompt,
+            ),
+            action_plans=self.agent_config.action_plans,
+            routing_cache=self.routing_cache,
+        )
+        return create_agent_executor(simple_router_agent, self.tools, self.agent_config)
+
+
+_meta_agent_registry: Optional[MetaAgentRegistry] = None
+
+
+def init_meta_agent_registry(
+    agent_config: Optional[AgentConfig] = None,
+) -> MetaAgentRegistry:
+    """Build the process-level meta agent registry (called from the FastAPI lifespan)."""
+    global _meta_agent_registry
+    _meta_agent_registry = MetaAgentRegistry(agent_config or get_agent_config())
+    return _meta_agent_registry
+
+
+def get_meta_agent_registry() -> MetaAgentRegistry:
+    """Get the meta agent registry, building it lazily outside of the FastAPI lifespan (e.g. scripts)."""
+    if _meta_agent_registry is None:
+        return init_meta_agent_registry()
+    return _meta_agent_registry
+
+
+def clear_meta_agent_registry() -> None:
+    """Drop the meta agent registry, e.g. on shutdown or after a config reload."""
+    global _meta_agent_registry
+    _meta_agent_registry = None
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+BM25 keyword scoring helpers, shared by the schema index of the SQL tool and the passage reranker of the PDF tool.
+
+Both score a query against a small set of documents, built per index (tables) or per question (passages), and keep
+their own term frequencies. Table definitions are split on SQL identifiers, passages on the words of any script.
+"""
+import math
+import re
+from typing import List
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+IDENTIFIER_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+# letters and digits of any script, "_" is a word character of \w but a separator in text
+TEXT_WORD = re.compile(r"[^\W_]+")
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize_identifiers(text: str) -> List[str]:
+    """Split text and identifiers (snake_case, camelCase) into lowercase stemmed words (ASCII only)."""
+    return [_stem(word.lower()) for word in IDENTIFIER_WORD.findall(text)]
+
+
+def tokenize_text(text: str) -> List[str]:
+    """Split text into lowercase stemmed words, keeping non-ASCII letters ("Beyoncé" -> "beyoncé")."""
+    return [_stem(word) for word in TEXT_WORD.findall(text.lower())]
+
+
+def bm25_idf(
+    nb_documents: int,
+    document_frequency: int,
+) -> float:
+    """IDF of a token found in `document_frequency` of `nb_documents` documents."""
+    return math.log(1 + (nb_documents - document_frequency + 0.5) / (document_frequency + 0.5))
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental conversation memory.
+
+The chat history sent to the agent is the longest suffix of the conversation that fits into the token limit (the
+same window ConversationTokenBufferMemory ends up with). Instead of rebuilding that window from all messages on
+every turn, the window is cached per conversation in Redis: the number of messages seen, a hash chain over them,
+and the token counts of the messages inside the window. A new turn only tokenizes the messages appended since the
+last turn and slides the window forward, so it costs O(new messages) instead of O(n²).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from typing import List, Optional, Sequence
+from uuid import UUID
+
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+from pydantic import BaseModel
+from redis.asyncio import Redis
+
+from app.api.deps import get_redis_client
+from app.core.config import settings
+from app.services.chat_agent.helpers.llm import get_token_lengths
+
+logger = logging.getLogger(__name__)
+
+# role and message separators added by the chat completion format (see ChatOpenAI.get_num_tokens_from_messages)
+TOKENS_PER_MESSAGE = 4
+
+
+class ConversationMemoryState(BaseModel):
+    """Cached memory window of a conversation."""
+
+    nb_messages: int
+    chain_hash: str
+    max_token_limit: int
+    window_start: int
+    window_token_counts: List[int]
+
+
+def to_buffer_messages(
+    chat_messages: Sequence[BaseMessage],
+) -> List[BaseMessage]:
+    """
+    Convert chat messages into the human / AI pairs stored in the memory.
+
+    A human message followed by an AI message is kept as a pair, any other message is stored as a human
+    message with an empty AI answer.
+    """
+    buffer: List[BaseMessage] = []
+    i = 0
+    while i < len(chat_messages):
+        if isinstance(chat_messages[i], HumanMessage):
+            if i + 1 < len(chat_messages) and isinstance(chat_messages[i + 1], AIMessage):
+                buffer.append(HumanMessage(content=chat_messages[i].content))
+                buffer.append(AIMessage(content=chat_messages[i + 1].content))
+                i += 1
+        else:
+            buffer.append(HumanMessage(content=chat_messages[i].content))
+            buffer.append(AIMessage(content=""))
+        i += 1
+    return buffer
+
+
+def _chain_hash(previous: str, message: BaseMessage) -> str:
+    return hashlib.blake2b(
+        f"{previous}\0{message.type}\0{message.content}".encode("utf-8"),
+        digest_size=16,
+    ).hexdigest()
+
+
+class ConversationMemoryStore:
+    """Conversation memory windows cached in Redis, keyed by conversation id."""
+
+    def __init__(
+        self,
+        max_token_limit: int,
+        ttl: int = settings.CONVERSATION_MEMORY_TTL,
+        namespace: str = "conversation_memory",
+        redis_client: Optional[Redis] = None,
+    ) -> None:
+        self.max_token_limit = max_token_limit
+        self.ttl = ttl
+        self.namespace = namespace
+        self._redis_client = redis_client
+
+    async def _get_redis_client(self) -> Redis:
+        return self._redis_client if self._redis_client is not None else await get_redis_client()
+
+    def _key(self, conversation_id: UUID | str) -> str:
+        return f"{self.namespace}:{conversation_id}"
+
+    async def _load(self, conversation_id: UUID | str) -> Optional[ConversationMemoryState]:
+        redis_client = await self._get_redis_client()
+        try:
+            raw_state = await redis_client.get(self._key(conversation_id))
+            return ConversationMemoryState(**json.loads(raw_state)) if raw_state else None
+        except Exception as e:
+            logger.warning(f"Could not load conversation memory of {conversation_id}: {repr(e)}")
+            return None
+
+    async def _save(self, conversation_id: UUID | str, state: ConversationMemoryState) -> None:
+        redis_client = await self._get_redis_client()
+        try:
+            await redis_client.set(self._key(conversation_id), state.model_dump_json(), ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not save conversation memory of {conversation_id}: {repr(e)}")
+
+    def _cached_prefix_matches(
+        self,
+        state: Optional[ConversationMemoryState],
+        chain_hashes: List[str],
+    ) -> bool:
+        return (
+            state is not None
+            and state.max_token_limit == self.max_token_limit
+            and 0 < state.nb_messages <= len(chain_hashes)
+            and chain_hashes[state.nb_messages - 1] == state.chain_hash
+        )
+
+    async def aget_chat_history(
+        self,
+        conversation_id: UUID | str,
+        chat_messages: Sequence[BaseMessage],
+    ) -> List[BaseMessage]:
+        """
+        Get the chat history window of a conversation, updating the cached window with the new messages.
+
+        Args:
+            conversation_id (UUID | str): The conversation id.
+            chat_messages (Sequence[BaseMessage]): All previous messages of the conversation.
+
+        Returns:
+            List[BaseMessage]: The most recent messages fitting into the token limit.
+        """
+        messages = to_buffer_messages(chat_messages)
+        chain_hashes: List[str] = []
+        previous = ""
+        for message in messages:
+            previous = _chain_hash(previous, message)
+            chain_hashes.append(previous)
+
+        state = await self._load(conversation_id)
+        if self._cached_prefix_matches(state, chain_hashes):
+            assert state is not None
+            window_start = state.window_start
+            window_token_counts = state.window_token_counts
+            new_messages = messages[state.nb_messages :]
+        else:
+            window_start = 0
+            window_token_counts = []
+            new_messages = messages
+
+        window_token_counts = window_token_counts + [
+            length + TOKENS_PER_MESSAGE
+            for length in get_token_lengths([m.content if isinstance(m.content, str) else "" for m in new_messages])
+        ]
+        window_tokens = sum(window_token_counts)
+        while window_token_counts and window_tokens > self.max_token_limit:
+            window_tokens -= window_token_counts.pop(0)
+            window_start += 1
+
+        if messages:
+            await self._save(
+                conversation_id,
+                ConversationMemoryState(
+                    nb_messages=len(messages),
+                    chain_hash=chain_hashes[-1],
+                    max_token_limit=self.max_token_limit,
+                    window_start=window_start,
+                    window_token_counts=window_token_counts,
+                ),
+            )
+        return messages[window_start:]
+
+    async def aclear(self, conversation_id: UUID | str) -> None:
+        """Drop the cached window of a conversation."""
+        redis_client = await self._get_redis_client()
+        await redis_client.delete(self._key(conversation_id))
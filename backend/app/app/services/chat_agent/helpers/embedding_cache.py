@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Two tier cache of text embeddings.
+
+- memory: a bounded per-process LRU of float32 arrays, repeated queries never leave the process;
+- Redis: embeddings packed as raw float32 bytes (6 KB for ada-002 instead of ~32 KB of JSON floats), shared by the
+  processes. Batches are read with one MGET and written with one pipeline, instead of one round trip per text.
+  The async methods go through the shared async Redis pool (read without decoding), the sync ones through a
+  synchronous client.
+
+Redis errors are logged and treated as misses, the embeddings are then computed by the model.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.schema.embeddings import Embeddings
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.client import NEVER_DECODE
+
+from app.core.prometheus import embedding_cache_requests_counter
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """In-process LRU of float32 embeddings in front of an optional Redis cache of packed float32 bytes."""
+
+    def __init__(
+        self,
+        namespace: str,
+        redis_client: Optional[Redis] = None,
+        get_async_redis_client: Optional[Callable[[], Awaitable[AsyncRedis]]] = None,
+        max_size: int = 4096,
+        ttl: Optional[int] = None,
+    ) -> None:
+        self.namespace = namespace
+        self.redis_client = redis_client
+        self.get_async_redis_client = get_async_redis_client
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        text: str,
+    ) -> str:
+        return f"{self.namespace}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+    def _get_memory(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+            return vector
+
+    def _set_memory(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def mget_memory(
+        self,
+        texts: Sequence[str],
+    ) -> List[Optional[np.ndarray]]:
+        """Look up embeddings in the in-process tier."""
+        vectors = [self._get_memory(self.key(text)) for text in texts]
+        nb_hits = sum(vector is not None for vector in vectors)
+        embedding_cache_requests_counter.labels(tier="memory", result="hit").inc(nb_hits)
+        embedding_cache_requests_counter.labels(tier="memory", result="miss").inc(len(texts) - nb_hits)
+        return vectors
+
+    def _load_redis_values(
+        self,
+        keys: List[str],
+        values: Sequence[Optional[bytes]],
+    ) -> List[Optional[np.ndarray]]:
+        vectors: List[Optional[np.ndarray]] = []
+        for key, value in zip(keys, values):
+            vector = np.frombuffer(value, dtype=np.float32) if value else None
+            if vector is not None:
+                self._set_memory(key, vector)
+            vectors.append(vector)
+        nb_hits = sum(vector is not None for vector in vectors)
+        embedding_cache_requests_counter.labels(tier="redis", result="hit").inc(nb_hits)
+        embedding_cache_requests_counter.labels(tier="redis", result="miss").inc(len(keys) - nb_hits)
+        return vectors
+
+    def mget_redis(
+        self,
+        texts: Sequence[str],
+    ) -> List[Optional[np.ndarray]]:
+        """Look up embeddings in Redis with one MGET, hits are promoted to the in-process tier."""
+        if self.redis_client is None or not texts:
+            return [None] * len(texts)
+        keys = [self.key(text) for text in texts]
+        try:
+            values = self.redis_client.mget(keys)
+        except Exception as e:
+            logger.warning(f"Could not read embeddings from Redis: {repr(e)}")
+            return [None] * len(texts)
+        return self._load_redis_values(keys, values)
+
+    async def amget_redis(
+        self,
+        texts: Sequence[str],
+    ) -> List[Optional[np.ndarray]]:
+        """Same as `mget_redis` on the async Redis client."""
+        if self.get_async_redis_client is None or not texts:
+            return [None] * len(texts)
+        keys = [self.key(text) for text in texts]
+        try:
+            redis_client = await self.get_async_redis_client()
+            values = await redis_client.execute_command("MGET", *keys, **{NEVER_DECODE: True})
+        except Exception as e:
+            logger.warning(f"Could not read embeddings from Redis: {repr(e)}")
+            return [None] * len(texts)
+        return self._load_redis_values(keys, values)
+
+    def mset(
+        self,
+        texts: Sequence[str],
+        vectors: Sequence[np.ndarray],
+    ) -> None:
+        """Store embeddings in both tiers, Redis writes go through one pipeline."""
+        keys = [self.key(text) for text in texts]
+        for key, vector in zip(keys, vectors):
+            self._set_memory(key, vector)
+        if self.redis_client is None or not keys:
+            return
+        try:
+            with self.redis_client.pipeline(transaction=False) as pipeline:
+                for key, vector in zip(keys, vectors):
+                    pipeline.set(key, vector.tobytes(), ex=self.ttl)
+                pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not write embeddings to Redis: {repr(e)}")
+
+    async def amset(
+        self,
+        texts: Sequence[str],
+        vectors: Sequence[np.ndarray],
+    ) -> None:
+        """Same as `mset` on the async Redis client."""
+        keys = [self.key(text) for text in texts]
+        for key, vector in zip(keys, vectors):
+            self._set_memory(key, vector)
+        if self.get_async_redis_client is None or not keys:
+            return
+        try:
+            redis_client = await self.get_async_redis_client()
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                for key, vector in zip(keys, vectors):
+                    pipeline.set(key, vector.tobytes(), ex=self.ttl)
+                await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Could not write embeddings to Redis: {repr(e)}")
+
+    def clear(
+        self,
+    ) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def _to_float32(vectors: Sequence[Sequence[float]]) -> List[np.ndarray]:
+    return [np.asarray(vector, dtype=np.float32) for vector in vectors]
+
+
+class CacheBackedEmbeddingsExtended(CacheBackedEmbeddings):
+    """Embeddings of documents and queries cached in an `EmbeddingCache` (queries and documents share the cache)."""
+
+    def __init__(
+        self,
+        underlying_embeddings: Embeddings,
+        cache: EmbeddingCache,
+    ) -> None:
+        super().__init__(underlying_embeddings, document_embedding_store=None)  # type: ignore
+        self.cache = cache
+
+    def _get_cached(
+        self,
+        texts: List[str],
+    ) -> List[Optional[np.ndarray]]:
+        vectors = self.cache.mget_memory(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for i, vector in zip(missing, self.cache.mget_redis([texts[i] for i in missing])):
+            vectors[i] = vector
+        return vectors
+
+    async def _aget_cached(
+        self,
+        texts: List[str],
+    ) -> List[Optional[np.ndarray]]:
+        vectors = self.cache.mget_memory(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for i, vector in zip(missing, await self.cache.amget_redis([texts[i] for i in missing])):
+            vectors[i] = vector
+        return vectors
+
+    def embed_documents(
+        self,
+        texts: List[str],
+    ) -> List[List[float]]:
+        vectors = self._get_cached(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            missing_vectors = _to_float32(self.underlying_embeddings.embed_documents(missing_texts))
+            self.cache.mset(missing_texts, missing_vectors)
+            for i, vector in zip(missing, missing_vectors):
+                vectors[i] = vector
+        return [vector.tolist() for vector in vectors]  # type: ignore
+
+    def embed_query(
+        self,
+        text: str,
+    ) -> List[float]:
+        vector = self._get_cached([text])[0]
+        if vector is None:
+            vector = _to_float32([self.underlying_embeddings.embed_query(text)])[0]
+            self.cache.mset([text], [vector])
+        return vector.tolist()
+
+    async def aembed_documents(
+        self,
+        texts: List[str],
+    ) -> List[List[float]]:
+        """Same as `embed_documents`, with the async Redis client and the model called async."""
+        vectors = await self._aget_cached(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            missing_vectors = _to_float32(await self.underlying_embeddings.aembed_documents(missing_texts))
+            await self.cache.amset(missing_texts, missing_vectors)
+            for i, vector in zip(missing, missing_vectors):
+                vectors[i] = vector
+        return [vector.tolist() for vector in vectors]  # type: ignore
+
+    async def aembed_query(
+        self,
+        text: str,
+    ) -> List[float]:
+        vector = (await self._aget_cached([text]))[0]
+        if vector is None:
+            vector = _to_float32([await self.underlying_embeddings.aembed_query(text)])[0]
+            await self.cache.amset([text], [vector])
+        return vector.tolist()
@@ -3,46 +3,26 @@
 # TODO: Change langchain param names to match the new langchain version
 
 import logging
-from typing import List, Optional, Union
+from functools import lru_cache
+from typing import Optional
 
 from langchain.embeddings import CacheBackedEmbeddings
 from langchain_openai.embeddings import OpenAIEmbeddings
 
-from app.api.deps import get_redis_store
+from app.api.deps import get_embedding_cache_redis_client, get_redis_client
 from app.core.config import settings
+from app.services.chat_agent.helpers.embedding_cache import CacheBackedEmbeddingsExtended, EmbeddingCache
 
 logger = logging.getLogger(__name__)
 
 
-class CacheBackedEmbeddingsExtended(CacheBackedEmbeddings):
-    def embed_query(self, text: str) -> List[float]:
-        """
-        Embed query text.
-
-        Extended to support caching
-
-        Args:
-            text: The text to embed.
-
-        Returns:
-            The embedding for the given text.
-        """
-        vectors: List[Union[List[float], None]] = self.document_embedding_store.mget([text])
-        text_embeddings = vectors[0]
-
-        if text_embeddings is None:
-            text_embeddings = self.underlying_embeddings.embed_query(text)
-            self.document_embedding_store.mset(list(zip([text], [text_embeddings])))
-
-        return text_embeddings
-
-
+@lru_cache(maxsize=None)
 def get_embedding_model(emb_model: Optional[str]) -> CacheBackedEmbeddings:
     """
-    Get the embedding model from the embedding model type.
+    Get the (memoized) embedding model from the embedding model type.
 
     If "OPENAI_API_BASE" is set, it will load Azure GPT models, otherwise it will load
-    OpenAI GPT models.
+    OpenAI GPT models. One cached model is shared per type, so is its in-process embedding cache.
     """
     if emb_model is None:
         emb_model = "text-embedding-ada-002"
@@ -57,7 +37,7 @@ def get_embedding_model(emb_model: Optional[str]) -> CacheBackedEmbeddings:
                     openai_api_base=settings.OPENAI_API_BASE,
                     openai_api_type="azure",
                     openai_api_key=settings.OPENAI_API_KEY,
-                    chunk_size=1,  # Maximum number of texts to embed in each batch
+                    chunk_size=16,  # Maximum number of texts to embed in each batch (Azure limit)
                 )
             else:
                 underlying_embeddings = OpenAIEmbeddings()
@@ -65,8 +45,12 @@ def get_embedding_model(emb_model: Optional[str]) -> CacheBackedEmbeddings:
             logger.warning(f"embedding model {emb_model} not found, using default emb_model")
             underlying_embeddings = OpenAIEmbeddings()
 
-    store = get_redis_store()
-    embedder = CacheBackedEmbeddingsExtended.from_bytes_store(
-        underlying_embeddings, store, namespace=underlying_embeddings.model
+    cache = EmbeddingCache(
+        namespace=f"embedding_caches:float32:{underlying_embeddings.model}",
+        redis_client=get_embedding_cache_redis_client(),
+        get_async_redis_client=get_redis_client,
+        max_size=settings.EMBEDDING_CACHE_MAX_SIZE,
+        ttl=settings.EMBEDDING_CACHE_TTL,
     )
+    embedder = CacheBackedEmbeddingsExtended(underlying_embeddings, cache)
     return embedder
@@ -2,8 +2,12 @@
 # mypy: disable-error-code="call-arg"
 # TODO: Change langchain param names to match the new langchain version
 
+import hashlib
 import logging
-from typing import Optional
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
 
 import tiktoken
 from langchain.base_language import BaseLanguageModel
@@ -15,14 +19,73 @@ from app.schemas.tool_schema import LLMType
 logger = logging.getLogger(__name__)
 
 
+TOKEN_LENGTH_CACHE_SIZE = 16384
+
+_token_length_cache: OrderedDict[Tuple[str, bytes], int] = OrderedDict()
+_token_length_cache_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4") -> tiktoken.Encoding:
+    """Get the (memoized) tiktoken encoder of a model."""
+    return tiktoken.encoding_for_model(model)
+
+
+def _token_length_cache_key(string: str, model: str) -> Tuple[str, bytes]:
+    return model, hashlib.blake2b(string.encode("utf-8"), digest_size=16).digest()
+
+
+def _cache_token_length(key: Tuple[str, bytes], length: int) -> None:
+    with _token_length_cache_lock:
+        _token_length_cache[key] = length
+        _token_length_cache.move_to_end(key)
+        while len(_token_length_cache) > TOKEN_LENGTH_CACHE_SIZE:
+            _token_length_cache.popitem(last=False)
+
+
+def _cached_token_length(key: Tuple[str, bytes]) -> Optional[int]:
+    with _token_length_cache_lock:
+        length = _token_length_cache.get(key)
+        if length is not None:
+            _token_length_cache.move_to_end(key)
+        return length
+
+
 def get_token_length(
     string: str,
     model: str = "gpt-4",
 ) -> int:
-    """Get the token length of a string."""
-    enc = tiktoken.encoding_for_model(model)
-    encoded = enc.encode(string)
-    return len(encoded)
+    """Get the token length of a string.
+
+    Counts are cached in an LRU keyed by the content hash, so repeated strings (e.g. chat history messages) are
+    only tokenized once.
+    """
+    key = _token_length_cache_key(string, model)
+    length = _cached_token_length(key)
+    if length is None:
+        length = len(get_encoding(model).encode(string))
+        _cache_token_length(key, length)
+    return length
+
+
+def get_token_lengths(
+    strings: Sequence[str],
+    model: str = "gpt-4",
+    num_threads: int = 8,
+) -> List[int]:
+    """Get the token lengths of many strings at once.
+
+    Cached counts are reused, the remaining strings are tokenized in one batch across threads.
+    """
+    keys = [_token_length_cache_key(string, model) for string in strings]
+    lengths = [_cached_token_length(key) for key in keys]
+    missing = [i for i, length in enumerate(lengths) if length is None]
+    if missing:
+        encoded = get_encoding(model).encode_batch([strings[i] for i in missing], num_threads=num_threads)
+        for i, tokens in zip(missing, encoded):
+            lengths[i] = len(tokens)
+            _cache_token_length(keys[i], len(tokens))
+    return lengths  # type: ignore
 
 
 def get_llm(
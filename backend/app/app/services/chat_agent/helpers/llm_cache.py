@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+LLM response cache of the tools.
+
+Responses are cached in Redis with the async client, per cache name (the tool name), with a TTL and a cap on the
+number of entries per cache (the oldest entries are evicted, tracked in a sorted set). Two tiers:
+
+- exact: the LLM parameters and the whole prompt, shared by the processes;
+- semantic (opt-in per tool with `llm_cache_similarity_threshold`): same LLM parameters and same prompt except the
+  last message, whose embedding is compared with the embeddings of the prompts this process cached in that scope.
+  The embeddings are indexed per process (as in `RoutingCache`), the responses are read from Redis.
+
+The router decisions are cached by the `RoutingCache` of the router agent, not here.
+
+A cache hit emits the callbacks of an LLM run without tokens, the stream handler then replays the cached response
+as tokens (see `AsyncIteratorCallbackHandler.on_llm_end`), so cached answers stream like generated ones.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from langchain.callbacks.manager import AsyncCallbackManager, Callbacks
+from langchain.chat_models.base import BaseChatModel
+from langchain.llms.base import BaseLLM
+from langchain.load.dump import dumpd
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, LLMResult
+from langchain.schema.embeddings import Embeddings
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.prometheus import llm_cache_requests_counter
+
+logger = logging.getLogger(__name__)
+
+EMBEDDED_TEXT_MAX_LENGTH = 20000
+
+CacheableLLM = Union[BaseChatModel, BaseLLM]
+
+
+@dataclass
+class SemanticEntry:
+    scope: str
+    embedding: np.ndarray
+
+
+def get_llm_string(
+    llm: CacheableLLM,
+) -> str:
+    """Model and parameters of an LLM, part of the cache key."""
+    if isinstance(llm, BaseChatModel):
+        return llm._get_llm_string()  # pylint: disable=protected-access
+    return str(sorted(llm._identifying_params.items()))  # pylint: disable=protected-access
+
+
+def _hash_messages(llm_string: str, messages: Sequence[BaseMessage]) -> str:
+    digest = hashlib.blake2b(llm_string.encode("utf-8"), digest_size=16)
+    for message in messages:
+        digest.update(f"\0{message.type}\0{message.content}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Exact cache of LLM responses in Redis, with a semantic tier indexed in process."""
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = None,
+        ttl: int = 60 * 60 * 24,
+        max_entries: int = 10000,
+        max_response_bytes: int = 64 * 1024,
+        embeddings: Optional[Embeddings] = None,
+        semantic_max_entries: int = 256,
+        namespace: str = "llm_cache",
+    ) -> None:
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_response_bytes = max_response_bytes
+        self.embeddings = embeddings
+        self.semantic_max_entries = semantic_max_entries
+        self.namespace = namespace
+        # per cache name, the embeddings of the last cached prompts by cache key, oldest first
+        self._semantic_index: Dict[str, OrderedDict[str, SemanticEntry]] = {}
+
+    async def _aget_redis(
+        self,
+    ) -> Redis:
+        if self.redis_client is None:
+            from app.api.deps import get_redis_client  # pylint: disable=import-outside-toplevel
+
+            return await get_redis_client()
+        return self.redis_client
+
+    def _keys(self, cache_name: str, llm_string: str, messages: Sequence[BaseMessage]) -> tuple[str, str]:
+        prefix = f"{self.namespace}:{cache_name}"
+        return f"{prefix}:{_hash_messages(llm_string, messages)}", f"{prefix}:index"
+
+    @staticmethod
+    def _semantic_scope(llm_string: str, messages: Sequence[BaseMessage]) -> str:
+        return _hash_messages(llm_string, messages[:-1])
+
+    async def _aembed(self, messages: Sequence[BaseMessage]) -> Optional[np.ndarray]:
+        content = messages[-1].content if messages else ""
+        if self.embeddings is None or not isinstance(content, str) or not content:
+            return None
+        try:
+            embedding = np.asarray(
+                await self.embeddings.aembed_query(content[:EMBEDDED_TEXT_MAX_LENGTH]), dtype=np.float32
+            )
+        except Exception as e:
+            logger.warning(f"Could not embed prompt for the LLM cache: {repr(e)}")
+            return None
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else None
+
+    async def alookup(
+        self,
+        cache_name: str,
+        llm_string: str,
+        messages: Sequence[BaseMessage],
+        similarity_threshold: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Look up the cached response of a prompt.
+
+        Args:
+            cache_name (str): The tool name, or `router`.
+            llm_string (str): The model and parameters of the LLM (`get_llm_string`).
+            messages (Sequence[BaseMessage]): The prompt.
+            similarity_threshold (Optional[float]): The minimum cosine similarity of the last message for the
+                semantic tier, None to only match exact prompts.
+
+        Returns:
+            Optional[str]: The cached response, None on a miss.
+        """
+        key, _ = self._keys(cache_name, llm_string, messages)
+        try:
+            redis_client = await self._aget_redis()
+            response = await redis_client.get(key)
+            llm_cache_requests_counter.labels(
+                cache=cache_name, tier="exact", result="miss" if response is None else "hit"
+            ).inc()
+            if response is not None or similarity_threshold is None:
+                return response
+
+            response = await self._alookup_semantic(
+                redis_client, cache_name, self._semantic_scope(llm_string, messages), messages, similarity_threshold
+            )
+            llm_cache_requests_counter.labels(
+                cache=cache_name, tier="semantic", result="miss" if response is None else "hit"
+            ).inc()
+            return response
+        except Exception as e:
+            logger.warning(f"Could not read the LLM cache: {repr(e)}")
+            return None
+
+    async def _alookup_semantic(
+        self,
+        redis_client: Redis,
+        cache_name: str,
+        scope: str,
+        messages: Sequence[BaseMessage],
+        similarity_threshold: float,
+    ) -> Optional[str]:
+        index = self._semantic_index.get(cache_name)
+        if not index or not any(entry.scope == scope for entry in index.values()):
+            return None
+        embedding = await self._aembed(messages)
+        if embedding is None:
+            return None
+        keys: List[str] = []
+        embeddings: List[np.ndarray] = []
+        for key, entry in index.items():
+            if entry.scope == scope:
+                keys.append(key)
+                embeddings.append(entry.embedding)
+        similarities = np.stack(embeddings) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < similarity_threshold:
+            return None
+        response = await redis_client.get(keys[best])
+        if response is None:
+            # expired or evicted in Redis
+            index.pop(keys[best], None)
+        return response
+
+    async def aupdate(
+        self,
+        cache_name: str,
+        llm_string: str,
+        messages: Sequence[BaseMessage],
+        response: str,
+        semantic: bool = False,
+    ) -> None:
+        """Cache the response of a prompt, and index the prompt in the semantic tier with `semantic`."""
+        if len(response.encode("utf-8")) > self.max_response_bytes:
+            return
+        key, index_key = self._keys(cache_name, llm_string, messages)
+        embedding = await self._aembed(messages) if semantic else None
+        now = time.time()
+        try:
+            redis_client = await self._aget_redis()
+            async with redis_client.pipeline(transaction=False) as pipeline:
+                pipeline.set(key, response, ex=self.ttl)
+                pipeline.zadd(index_key, {key: now})
+                pipeline.zremrangebyscore(index_key, "-inf", now - self.ttl)
+                pipeline.expire(index_key, self.ttl)
+                pipeline.zcard(index_key)
+                results = await pipeline.execute()
+
+            nb_entries = results[4]
+            if nb_entries > self.max_entries:
+                evicted = await redis_client.zpopmin(index_key, nb_entries - self.max_entries)
+                await redis_client.delete(*[member for member, _ in evicted])
+        except Exception as e:
+            logger.warning(f"Could not write the LLM cache: {repr(e)}")
+            return
+
+        if embedding is not None:
+            index = self._semantic_index.setdefault(cache_name, OrderedDict())
+            index[key] = SemanticEntry(scope=self._semantic_scope(llm_string, messages), embedding=embedding)
+            index.move_to_end(key)
+            while len(index) > self.semantic_max_entries:
+                index.popitem(last=False)
+
+
+async def areplay_cached_response(
+    llm: CacheableLLM,
+    messages: Sequence[BaseMessage],
+    response: str,
+    callbacks: Callbacks = None,
+) -> None:
+    """Emit the callbacks of an LLM run for a cached response, the stream handler replays it as tokens."""
+    callback_manager = AsyncCallbackManager.configure(callbacks, llm.callbacks, llm.verbose)
+    run_managers = await callback_manager.on_chat_model_start(dumpd(llm), [list(messages)])
+    for run_manager in run_managers:
+        await run_manager.on_llm_end(
+            LLMResult(generations=[[ChatGeneration(message=AIMessage(content=response))]], llm_output={"cached": True})
+        )
+
+
+_llm_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_response_cache() -> Optional[LLMResponseCache]:
+    """Get the process-wide LLM response cache, None if disabled (`ENABLE_LLM_CACHE`)."""
+    global _llm_response_cache  # pylint: disable=global-statement
+    if not settings.ENABLE_LLM_CACHE:
+        return None
+    if _llm_response_cache is None:
+        embeddings: Any = None
+        try:
+            from app.services.chat_agent.helpers.embedding_models import (  # pylint: disable=import-outside-toplevel
+                get_embedding_model,
+            )
+
+            embeddings = get_embedding_model(None)
+        except Exception as e:
+            logger.warning(f"Semantic LLM cache disabled, no embedding model: {repr(e)}")
+        _llm_response_cache = LLMResponseCache(
+            ttl=settings.LLM_CACHE_TTL,
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            max_response_bytes=settings.LLM_CACHE_MAX_RESPONSE_BYTES,
+            embeddings=embeddings,
+            semantic_max_entries=settings.LLM_CACHE_SEMANTIC_MAX_ENTRIES,
+        )
+    return _llm_response_cache
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Routing cache of the router agent.
+
+The router LLM call only picks an action plan, and many questions map to the same plan. Decisions are cached per
+process in two tiers, both scoped to the chat history window the router sees:
+
+- exact: the normalized question (case and whitespace insensitive)
+- semantic: the most similar cached question, if its cosine similarity is above a threshold
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain.schema import BaseMessage
+from langchain.schema.embeddings import Embeddings
+
+from app.core.prometheus import routing_cache_requests_counter
+
+logger = logging.getLogger(__name__)
+
+RECENT_EMBEDDINGS_SIZE = 64
+
+
+@dataclass
+class RoutingCacheEntry:
+    plan: str
+    history_hash: str
+    embedding: Optional[np.ndarray]
+    expires_at: float
+
+
+def normalize_question(
+    question: str,
+) -> str:
+    return " ".join(question.lower().split())
+
+
+def hash_chat_history(
+    chat_history: Sequence[BaseMessage],
+) -> str:
+    history_hash = hashlib.blake2b(digest_size=16)
+    for message in chat_history:
+        history_hash.update(f"{message.type}\0{message.content}\0".encode("utf-8"))
+    return history_hash.hexdigest()
+
+
+class RoutingCache:
+    """LRU cache of router decisions with a TTL, with an exact and an optional semantic tier."""
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 60 * 60,
+        embeddings: Optional[Embeddings] = None,
+        similarity_threshold: float = 0.97,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[str, RoutingCacheEntry] = OrderedDict()
+        # embeddings of the last looked up questions, reused when the decision of a miss is stored
+        self._recent_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    @staticmethod
+    def _key(normalized_question: str, history_hash: str) -> str:
+        return f"{history_hash}:{normalized_question}"
+
+    async def _aembed(self, normalized_question: str) -> Optional[np.ndarray]:
+        if self.embeddings is None:
+            return None
+        if normalized_question in self._recent_embeddings:
+            return self._recent_embeddings[normalized_question]
+        try:
+            embedding = np.asarray(await self.embeddings.aembed_query(normalized_question), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed question for the routing cache: {repr(e)}")
+            return None
+        norm = np.linalg.norm(embedding)
+        if norm == 0:
+            return None
+        self._recent_embeddings[normalized_question] = embedding / norm
+        while len(self._recent_embeddings) > RECENT_EMBEDDINGS_SIZE:
+            self._recent_embeddings.popitem(last=False)
+        return self._recent_embeddings[normalized_question]
+
+    def _evict_expired(self, now: float) -> None:
+        for key in [key for key, entry in self._entries.items() if entry.expires_at <= now]:
+            del self._entries[key]
+
+    def _get_semantic(self, embedding: np.ndarray, history_hash: str) -> Optional[str]:
+        keys: List[str] = []
+        embeddings: List[np.ndarray] = []
+        for key, entry in self._entries.items():
+            if entry.history_hash == history_hash and entry.embedding is not None:
+                keys.append(key)
+                embeddings.append(entry.embedding)
+        if not keys:
+            return None
+        similarities = np.stack(embeddings) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]].plan
+
+    async def aget(
+        self,
+        question: str,
+        chat_history: Sequence[BaseMessage],
+    ) -> Optional[str]:
+        """
+        Get the cached action plan for a question.
+
+        Args:
+            question (str): The question of the user.
+            chat_history (Sequence[BaseMessage]): The chat history window the router sees.
+
+        Returns:
+            Optional[str]: The cached action plan key, None on a miss.
+        """
+        self._evict_expired(time.monotonic())
+        normalized_question = normalize_question(question)
+        history_hash = hash_chat_history(chat_history)
+
+        key = self._key(normalized_question, history_hash)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            routing_cache_requests_counter.labels(tier="exact", result="hit").inc()
+            return self._entries[key].plan
+        routing_cache_requests_counter.labels(tier="exact", result="miss").inc()
+
+        if self.embeddings is None:
+            return None
+        embedding = await self._aembed(normalized_question)
+        plan = self._get_semantic(embedding, history_hash) if embedding is not None else None
+        routing_cache_requests_counter.labels(tier="semantic", result="miss" if plan is None else "hit").inc()
+        return plan
+
+    async def aset(
+        self,
+        question: str,
+        chat_history: Sequence[BaseMessage],
+        plan: str,
+    ) -> None:
+        """Cache the action plan selected for a question."""
+        normalized_question = normalize_question(question)
+        history_hash = hash_chat_history(chat_history)
+        key = self._key(normalized_question, history_hash)
+        self._entries[key] = RoutingCacheEntry(
+            plan=plan,
+            history_hash=history_hash,
+            embedding=await self._aembed(normalized_question),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(
+        self,
+    ) -> None:
+        self._entries.clear()
+        self._recent_embeddings.clear()
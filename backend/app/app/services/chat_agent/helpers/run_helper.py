@@ -1,17 +1,134 @@
 # -*- coding: utf-8 -*-
-from typing import Optional
+"""
+Run cancellation.
+
+Every worker keeps the runs it executes in a local registry, each with a cancellation token holding the asyncio
+tasks of the run. Checking whether a local run is still running is an in-memory lookup. Cancelling a run deletes
+its Redis status key and publishes the run id on a Redis pub/sub channel; the worker owning the run receives it
+and cancels the run's tasks, which aborts in-flight LLM streaming and tool coroutines immediately.
+"""
+import asyncio
+import logging
+from typing import Any, Coroutine, Dict, Optional, Set
 
 from app.api.deps import get_redis_client
 from app.utils.fastapi_globals import g
 
+logger = logging.getLogger(__name__)
+
+RUN_CANCEL_CHANNEL = "agent_run_cancel"
+
+
+class RunCancellationToken:
+    """Cancellation token of a single agent run."""
+
+    run_id: str
+    tasks: Set[asyncio.Task]
+
+    def __init__(
+        self,
+        run_id: str,
+    ) -> None:
+        self.run_id = run_id
+        self.tasks = set()
+        self._cancelled = False
+
+    @property
+    def cancelled(
+        self,
+    ) -> bool:
+        return self._cancelled
+
+    def attach(
+        self,
+        task: asyncio.Task,
+    ) -> None:
+        """Attach a task to the run, it is cancelled together with the run."""
+        if self._cancelled:
+            task.cancel()
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def cancel(
+        self,
+    ) -> None:
+        """Cancel all tasks of the run."""
+        self._cancelled = True
+        for task in list(self.tasks):
+            task.cancel()
+
+
+_local_runs: Dict[str, RunCancellationToken] = {}
+
+
+def get_run_token(run_id: Optional[str] = None) -> Optional[RunCancellationToken]:
+    """Get the cancellation token of a run executed by this worker, if any."""
+    run_id = run_id or g.query_context["run_id"]
+    return _local_runs.get(run_id)
+
+
+def start_run(
+    run_id: str,
+    coroutine: Coroutine[Any, Any, Any],
+) -> asyncio.Task:
+    """
+    Run a coroutine as a cancellable agent run of this worker.
+
+    The task is tracked in the local run registry (which also keeps a reference to it) until it finishes.
+    """
+    token = _local_runs.setdefault(run_id, RunCancellationToken(run_id))
+    task = asyncio.create_task(coroutine)
+    token.attach(task)
+
+    def _unregister(_task: asyncio.Task) -> None:
+        if not token.tasks and _local_runs.get(run_id) is token:
+            del _local_runs[run_id]
+
+    task.add_done_callback(_unregister)
+    return task
+
+
+def cancel_local_run(run_id: str) -> bool:
+    """Cancel a run if it is executed by this worker."""
+    token = _local_runs.get(run_id)
+    if token is None:
+        return False
+    logger.info(f"Cancelling run {run_id}")
+    token.cancel()
+    return True
+
 
 async def is_running(run_id: Optional[str] = None) -> bool:
-    redis_client = await get_redis_client()
+    """Check if a run is running, without a Redis round trip for runs executed by this worker."""
     run_id = run_id or g.query_context["run_id"]
+    token = _local_runs.get(run_id)
+    if token is not None:
+        return not token.cancelled
+    redis_client = await get_redis_client()
     is_running_bool = await redis_client.get(run_id)
     return is_running_bool is not None
 
 
 async def stop_run(run_id: str) -> None:
+    """Stop a run on whichever worker executes it."""
     redis_client = await get_redis_client()
     await redis_client.delete(run_id)
+    cancel_local_run(run_id)
+    await redis_client.publish(RUN_CANCEL_CHANNEL, run_id)
+
+
+async def listen_for_run_cancellations(reconnect_delay: float = 1.0) -> None:
+    """Cancel local runs on messages of the run cancellation channel (started in the FastAPI lifespan)."""
+    while True:
+        try:
+            redis_client = await get_redis_client()
+            async with redis_client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(RUN_CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message is not None and message["type"] == "message":
+                        cancel_local_run(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Run cancellation listener disconnected: {repr(e)}")
+            await asyncio.sleep(reconnect_delay)
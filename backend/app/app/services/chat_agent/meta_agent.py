@@ -1,75 +1,44 @@
 # -*- coding: utf-8 -*-
 from typing import Callable, List, Optional
+from uuid import UUID
 
-from langchain.agents import AgentExecutor
+from langchain.agents import AgentExecutor, BaseMultiActionAgent
 from langchain.base_language import BaseLanguageModel
-from langchain.memory import ChatMessageHistory, ConversationTokenBufferMemory
-from langchain.schema import AIMessage, HumanMessage
+from langchain.memory import ConversationTokenBufferMemory
+from langchain.schema import AIMessage, BaseMessage, HumanMessage
+from langchain.tools import BaseTool
 
 from app.core.config import settings
 from app.schemas.agent_schema import AgentConfig
 from app.schemas.tool_schema import LLMType
+from app.services.chat_agent.helpers.conversation_memory import ConversationMemoryStore
 from app.services.chat_agent.helpers.llm import get_llm
+from app.services.chat_agent.parallel_executor import ParallelAgentExecutor
 from app.services.chat_agent.router_agent.SimpleRouterAgent import SimpleRouterAgent
 from app.services.chat_agent.tools.tools import get_tools
 from app.utils.config_loader import get_agent_config
 
 
-def get_conv_token_buffer_memory(
+async def get_conversation_chat_history(
+    conversation_id: UUID | str,
     chat_messages: List[AIMessage | HumanMessage],
-    api_key: str,
-) -> ConversationTokenBufferMemory:
+) -> List[BaseMessage]:
     """
-    Get a ConversationTokenBufferMemory from a list of chat messages.
+    Get the chat history of a conversation that fits into the agent token limit.
 
-    This function takes a list of chat messages and returns a ConversationTokenBufferMemory object.
-    It first gets the agent configuration and the language model, and then creates a ConversationTokenBufferMemory
-    object. It then iterates over the chat messages, saving the context of the conversation to the memory.
+    The pruned window is cached per conversation, so only the messages added since the previous turn are
+    tokenized.
 
     Args:
+        conversation_id (UUID | str): The conversation id.
         chat_messages (List[Union[AIMessage, HumanMessage]]): The list of chat messages.
-        api_key (str): The API key.
 
     Returns:
-        ConversationTokenBufferMemory: The ConversationTokenBufferMemory object.
+        List[BaseMessage]: The chat history.
     """
     agent_config = get_agent_config()
-    llm = get_llm(
-        agent_config.common.llm,
-        api_key=api_key,
-    )
-    chat_history = ChatMessageHistory()
-    memory = ConversationTokenBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        max_token_limit=agent_config.common.max_token_length,
-        llm=llm,
-        chat_memory=chat_history,
-    )
-
-    i = 0
-    while i < len(chat_messages):
-        if isinstance(
-            chat_messages[i],
-            HumanMessage,
-        ):
-            if isinstance(
-                chat_messages[i + 1],
-                AIMessage,
-            ):
-                memory.save_context(
-                    inputs={"input": chat_messages[i].content},
-                    outputs={"output": chat_messages[i + 1].content},  # type: ignore
-                )
-                i += 1
-        else:
-            memory.save_context(
-                inputs={"input": chat_messages[i].content},
-                outputs={"output": ""},
-            )
-        i += 1
-
-    return memory
+    memory_store = ConversationMemoryStore(max_token_limit=agent_config.common.max_token_length)
+    return await memory_store.aget_chat_history(conversation_id, chat_messages)
 
 
 def create_meta_agent(
@@ -106,9 +75,38 @@ def create_meta_agent(
         system_context=agent_config.system_context,
         action_plans=agent_config.action_plans,
     )
-    return AgentExecutor.from_agent_and_tools(
-        agent=simple_router_agent,
+    return create_agent_executor(simple_router_agent, tools, agent_config)
+
+
+def create_agent_executor(
+    agent: BaseMultiActionAgent,
+    tools: List[BaseTool],
+    agent_config: Optional[AgentConfig] = None,
+) -> AgentExecutor:
+    """
+    Wrap a router agent and its tools into an AgentExecutor.
+
+    The tools of an action plan step run concurrently (see ParallelAgentExecutor), with the tool timeouts of the
+    agent config.
+
+    Args:
+        agent (BaseMultiActionAgent): The router agent.
+        tools (List[BaseTool]): The tools the agent can call.
+        agent_config (Optional[AgentConfig]): The agent config, defaults to the loaded agent config.
+
+    Returns:
+        AgentExecutor: The AgentExecutor object.
+    """
+    agent_config = agent_config or get_agent_config()
+    return ParallelAgentExecutor.from_agent_and_tools(
+        agent=agent,
         tools=tools,
+        default_tool_timeout=agent_config.common.tool_timeout,
+        tool_timeouts={
+            name: tool_config.timeout
+            for name, tool_config in agent_config.tools_library.library.items()
+            if tool_config.timeout is not None
+        },
         verbose=True,
         max_iterations=15,
         max_execution_time=300,
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel tool execution for action plan steps.
+
+All tools of an action plan step run concurrently, so a step takes as long as its slowest tool. To keep the stream
+readable, the events of a tool only reach the AsyncIteratorCallbackHandler once all previous tools of the step are
+done: they are buffered in the meantime and replayed in order, so the stream looks as if the tools ran one after
+another. A tool that fails or exceeds its timeout does not fail the step, its observation is the error and the
+other tools keep their results.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from langchain.agents import AgentExecutor
+from langchain.agents.agent import ExceptionTool
+from langchain.agents.tools import InvalidTool
+from langchain.callbacks.manager import AsyncCallbackManager, AsyncCallbackManagerForChainRun
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+from langchain.tools import BaseTool
+from langchain_core.agents import AgentStep
+
+from app.schemas.streaming_schema import StreamingDataTypeEnum
+from app.utils.streaming.callbacks.buffered import BufferedCallbackHandler, buffer_stream_handlers
+
+logger = logging.getLogger(__name__)
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor running the tools of a step concurrently, with per-tool timeouts and partial failures."""
+
+    default_tool_timeout: Optional[float] = None
+    """Timeout in seconds of a tool call, None for no timeout."""
+    tool_timeouts: Dict[str, float] = {}
+    """Timeouts in seconds overriding the default timeout, by tool name."""
+
+    def get_tool_timeout(
+        self,
+        tool_name: str,
+    ) -> Optional[float]:
+        return self.tool_timeouts.get(tool_name, self.default_tool_timeout)
+
+    async def _aperform_agent_action(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        agent_action: AgentAction,
+        run_manager: Optional[AsyncCallbackManagerForChainRun],
+        callbacks: Optional[AsyncCallbackManager],
+    ) -> str:
+        if run_manager:
+            await run_manager.on_agent_action(agent_action, verbose=self.verbose, color="green")
+        tool_run_kwargs = self.agent.tool_run_logging_kwargs()
+        if agent_action.tool not in name_to_tool_map:
+            return await InvalidTool().arun(
+                {
+                    "requested_tool_name": agent_action.tool,
+                    "available_tool_names": list(name_to_tool_map.keys()),
+                },
+                verbose=self.verbose,
+                color=None,
+                callbacks=callbacks,
+                **tool_run_kwargs,
+            )
+
+        tool = name_to_tool_map[agent_action.tool]
+        if tool.return_direct:
+            tool_run_kwargs["llm_prefix"] = ""
+        return await asyncio.wait_for(
+            tool.arun(
+                agent_action.tool_input,
+                verbose=self.verbose,
+                color=color_mapping[agent_action.tool],
+                callbacks=callbacks,
+                **tool_run_kwargs,
+            ),
+            timeout=self.get_tool_timeout(agent_action.tool),
+        )
+
+    async def _ahandle_tool_failure(
+        self,
+        agent_action: AgentAction,
+        error: Exception,
+        run_manager: Optional[AsyncCallbackManagerForChainRun],
+    ) -> str:
+        """Turn the failure of a tool into its observation, the other tools of the step are not affected."""
+        if isinstance(error, asyncio.TimeoutError):
+            observation = f"{agent_action.tool} timed out after {self.get_tool_timeout(agent_action.tool)} seconds"
+        else:
+            observation = f"{agent_action.tool} failed: {repr(error)}"
+        logger.warning(observation)
+        if run_manager:
+            await run_manager.on_text(
+                "error",
+                data_type=StreamingDataTypeEnum.ACTION,
+                tool=agent_action.tool,
+                step=1,
+                error=observation,
+            )
+        return observation
+
+    async def _aperform_agent_actions(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        actions: List[AgentAction],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> List[AgentStep]:
+        """
+        Run the actions of a step concurrently.
+
+        Args:
+            name_to_tool_map (Dict[str, BaseTool]): The tools by name.
+            color_mapping (Dict[str, str]): The colors of the tools for verbose output.
+            actions (List[AgentAction]): The actions of the step.
+            run_manager (Optional[AsyncCallbackManagerForChainRun]): The run manager of the executor.
+
+        Returns:
+            List[AgentStep]: The steps, in the order of the actions.
+        """
+        callbacks = [run_manager.get_child() if run_manager else None for _ in actions]
+        buffers: List[List[BufferedCallbackHandler]] = [
+            buffer_stream_handlers(child) if i > 0 and child is not None else [] for i, child in enumerate(callbacks)
+        ]
+        tasks = [
+            asyncio.create_task(
+                self._aperform_agent_action(name_to_tool_map, color_mapping, action, run_manager, child)
+            )
+            for action, child in zip(actions, callbacks)
+        ]
+        steps: List[AgentStep] = []
+        try:
+            for action, task, task_buffers in zip(actions, tasks, buffers):
+                for buffer in task_buffers:
+                    await buffer.flush()
+                try:
+                    observation = await task
+                except Exception as e:
+                    observation = await self._ahandle_tool_failure(action, e, run_manager)
+                steps.append(AgentStep(action=action, observation=observation))
+        finally:
+            # on cancellation of the run, no tool of the step keeps running
+            for task in tasks:
+                task.cancel()
+        return steps
+
+    async def _ahandle_parsing_error(
+        self,
+        error: OutputParserException,
+        run_manager: Optional[AsyncCallbackManagerForChainRun],
+    ) -> AgentStep:
+        """The `_Exception` step of an output parsing error, as `AgentExecutor` builds it (`handle_parsing_errors`)."""
+        if self.handle_parsing_errors is False:
+            raise ValueError(
+                "An output parsing error occurred. "
+                "In order to pass this error back to the agent and have it try "
+                "again, pass `handle_parsing_errors=True` to the AgentExecutor. "
+                f"This is the error: {str(error)}"
+            ) from error
+        text = str(error)
+        if isinstance(self.handle_parsing_errors, bool):
+            if error.send_to_llm:
+                observation = str(error.observation)
+                text = str(error.llm_output)
+            else:
+                observation = "Invalid or incomplete response"
+        elif isinstance(self.handle_parsing_errors, str):
+            observation = self.handle_parsing_errors
+        elif callable(self.handle_parsing_errors):
+            observation = self.handle_parsing_errors(error)
+        else:
+            raise ValueError("Got unexpected type of `handle_parsing_errors`") from error
+        action = AgentAction("_Exception", observation, text)
+        observation = await ExceptionTool().arun(
+            action.tool_input,
+            verbose=self.verbose,
+            color=None,
+            callbacks=run_manager.get_child() if run_manager else None,
+            **self.agent.tool_run_logging_kwargs(),
+        )
+        return AgentStep(action=action, observation=observation)
+
+    async def _aiter_next_step(
+        self,
+        name_to_tool_map: Dict[str, BaseTool],
+        color_mapping: Dict[str, str],
+        inputs: Dict[str, str],
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> AsyncIterator[Union[AgentFinish, AgentAction, AgentStep]]:
+        try:
+            output = await self.agent.aplan(
+                self._prepare_intermediate_steps(intermediate_steps),
+                callbacks=run_manager.get_child() if run_manager else None,
+                **inputs,
+            )
+        except OutputParserException as e:
+            # parsing errors (not raised by router agents) become an observation, without planning again
+            yield await self._ahandle_parsing_error(e, run_manager)
+            return
+
+        if isinstance(output, AgentFinish):
+            yield output
+            return
+
+        actions = [output] if isinstance(output, AgentAction) else output
+        for action in actions:
+            yield action
+        for step in await self._aperform_agent_actions(name_to_tool_map, color_mapping, actions, run_manager):
+            yield step
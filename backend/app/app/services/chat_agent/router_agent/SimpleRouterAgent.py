@@ -21,6 +21,7 @@ from langchain.tools import BaseTool
 
 from app.schemas.agent_schema import ActionPlan, ActionPlans
 from app.schemas.tool_schema import ToolInputSchema, UserSettings
+from app.services.chat_agent.helpers.routing_cache import RoutingCache
 from app.services.chat_agent.helpers.run_helper import is_running
 from app.utils.exceptions.common_exceptions import AgentCancelledException
 
@@ -35,6 +36,10 @@ class SimpleRouterAgent(BaseMultiActionAgent):
 
     action_plans: ActionPlans = ActionPlans(action_plans={})
     action_plan: Optional[ActionPlan] = None
+    routing_cache: Optional[RoutingCache] = None
+
+    class Config:
+        arbitrary_types_allowed = True
 
     @property
     def input_keys(
@@ -85,7 +90,7 @@ class SimpleRouterAgent(BaseMultiActionAgent):
         Given input, decides what to do.
 
         This function takes a list of intermediate steps and user inputs, and decides what action to take next.
-        It first tries to select an action plan.
+        It first tries to select an action plan, from the routing cache if the question is known.
         If an action plan is selected, it follows the action plan and returns the next actions.
         If all actions in the action plan are completed, it returns an AgentFinish object.
 
@@ -101,6 +106,13 @@ class SimpleRouterAgent(BaseMultiActionAgent):
         if not await is_running():
             raise AgentCancelledException("The agent is cancelled.")
 
+        # Router agent reuses the decision for a known question
+        if self.action_plan is None and self.routing_cache is not None:
+            cached_output = await self.routing_cache.aget(kwargs["input"], kwargs.get("chat_history", []))
+            if cached_output in self.action_plans.action_plans:
+                self.action_plan = ActionPlan(**self.action_plans.action_plans[cached_output].dict())
+                logger.info(f"Action plan selected from routing cache: {cached_output}, {str(self.action_plan)}")
+
         # Router agent makes initial template
         retries = 0
         while self.action_plan is None:
@@ -109,6 +121,8 @@ class SimpleRouterAgent(BaseMultiActionAgent):
                 action_plan = ActionPlan(**self.action_plans.action_plans[full_output].dict())
                 self.action_plan = action_plan
                 logger.info(f"Action plan selected: {full_output}, {str(action_plan)}")
+                if self.routing_cache is not None:
+                    await self.routing_cache.aset(kwargs["input"], kwargs.get("chat_history", []), full_output)
             except openai.AuthenticationError as e:
                 retries += 1
                 if retries > 3:
@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+Durable queue of agent runs.
+
+With `RUN_QUEUE_ENABLED`, the API does not run agents: `/agent` enqueues the run in a Redis stream and streams its
+events from the run event stream (see `RunEventStream`). Agent workers (`app/agent_worker.py`) read the runs as
+a consumer group, run up to `RUN_WORKER_CONCURRENCY` of them at a time and publish their events, so API pods and
+agent workers scale independently.
+
+A run stays pending in the consumer group until its worker acknowledges it. Workers keep their pending runs
+alive with a heartbeat; the runs of a worker that died are claimed by another worker once they have been idle for
+`RUN_QUEUE_CLAIM_IDLE_TIME` seconds, at most `RUN_QUEUE_MAX_DELIVERIES` times. A claimed run is only started again
+if the previous attempt published no event, otherwise it ends with an error message: its readers already received
+part of the answer.
+
+The API key of a run is not stored in the stream: it is kept in a separate key (`agent_run_api_key:<run_id>`) that
+expires after `RUN_QUEUE_API_KEY_TTL` seconds and is deleted when the run is acknowledged.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain.agents import AgentExecutor
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.schemas.message_schema import IAgentRun, IChatQuery
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum
+from app.services.chat_agent.agent_registry import get_meta_agent_registry
+from app.services.chat_agent.helpers.run_helper import is_running, start_run
+from app.services.chat_agent.meta_agent import get_conversation_chat_history
+from app.utils.fastapi_globals import g
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.helpers import handle_exceptions
+from app.utils.streaming.run_events import RunEventStream, apublish_run_events
+
+logger = logging.getLogger(__name__)
+
+RUN_QUEUE_GROUP = "agent_workers"
+RUN_FIELD = "run"
+RUN_API_KEY_PREFIX = "agent_run_api_key"
+
+
+async def astart_agent_run(
+    chat: IChatQuery,
+    meta_agent: AgentExecutor,
+    run_id: str,
+) -> Tuple[AsyncIteratorCallbackHandler, asyncio.Task]:
+    """
+    Start an agent run on this worker, as a cancellable run (see `start_run`).
+
+    Loads the chat history window (cached per conversation) and sets up the stream handler of the run.
+
+    Args:
+        chat (IChatQuery): The chat query containing the messages and other details.
+        meta_agent (AgentExecutor): The meta agent executor of the run.
+        run_id (str): The run id.
+
+    Returns:
+        Tuple[AsyncIteratorCallbackHandler, asyncio.Task]: The stream handler and the task of the run.
+    """
+    chat_messages = [m.to_langchain() for m in chat.messages]
+    chat_history = await get_conversation_chat_history(
+        chat.conversation_id,
+        chat_messages[:-1],  # type: ignore
+    )
+    stream_handler = AsyncIteratorCallbackHandler()
+    chat_content = chat_messages[-1].content if chat_messages[-1] is not None else ""
+    task = start_run(
+        run_id,
+        handle_exceptions(
+            meta_agent.arun(
+                input=chat_content,
+                chat_history=chat_history,
+                callbacks=[stream_handler],
+                user_settings=chat.settings,
+                tags=[
+                    "agent_chat",
+                    f"user_email={chat.user_email}",
+                    f"conversation_id={chat.conversation_id}",
+                    f"message_id={chat.new_message_id}",
+                    f"timestamp={datetime.now()}",
+                    f"version={chat.settings.version if chat.settings is not None else 'N/A'}",
+                ],
+            ),
+            stream_handler,
+        ),
+    )
+    return stream_handler, task
+
+
+class QueuedRun(NamedTuple):
+    entry_id: str
+    run: IAgentRun
+    nb_deliveries: int = 1
+
+
+class RunQueue:
+    """Agent runs in a Redis stream, read by the agent workers as a consumer group."""
+
+    def __init__(
+        self,
+        redis_client: Optional[Redis] = None,
+        stream: Optional[str] = None,
+        group: str = RUN_QUEUE_GROUP,
+    ) -> None:
+        self.redis_client = redis_client
+        self.stream = stream or settings.RUN_QUEUE_STREAM
+        self.group = group
+
+    async def _aget_redis(
+        self,
+    ) -> Redis:
+        if self.redis_client is None:
+            from app.api.deps import get_redis_client  # pylint: disable=import-outside-toplevel
+
+            self.redis_client = await get_redis_client()
+        return self.redis_client
+
+    def _parse(self, entries: List[Tuple[str, Dict[str, str]]]) -> List[QueuedRun]:
+        return [QueuedRun(entry_id, IAgentRun.model_validate_json(fields[RUN_FIELD])) for entry_id, fields in entries]
+
+    @staticmethod
+    def _api_key_key(run_id: str) -> str:
+        return f"{RUN_API_KEY_PREFIX}:{run_id}"
+
+    async def aenqueue(
+        self,
+        run: IAgentRun,
+    ) -> str:
+        """Enqueue a run, returns its entry id. The API key of the chat is stored apart, with an expiry."""
+        api_key = run.chat.api_key
+        queued_run = run.model_copy(
+            update={"chat": run.chat.model_copy(update={"api_key": None}), "has_api_key": bool(api_key)}
+        )
+        redis_client = await self._aget_redis()
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            if api_key:
+                pipeline.set(self._api_key_key(run.run_id), api_key, ex=settings.RUN_QUEUE_API_KEY_TTL)
+            pipeline.xadd(self.stream, {RUN_FIELD: queued_run.model_dump_json()})
+            *_, entry_id = await pipeline.execute()
+        return entry_id
+
+    async def aget_api_key(
+        self,
+        run: IAgentRun,
+    ) -> Optional[str]:
+        """Get the API key of a run, None if it has none or if it expired."""
+        if not run.has_api_key:
+            return None
+        redis_client = await self._aget_redis()
+        return await redis_client.get(self._api_key_key(run.run_id))
+
+    async def aensure_group(
+        self,
+    ) -> None:
+        """Create the stream and the consumer group of the workers if needed."""
+        redis_client = await self._aget_redis()
+        try:
+            await redis_client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def aread(
+        self,
+        consumer: str,
+        count: int,
+        block: float,
+    ) -> List[QueuedRun]:
+        """Read up to `count` new runs, waiting up to `block` seconds."""
+        redis_client = await self._aget_redis()
+        response = await redis_client.xreadgroup(
+            self.group, consumer, {self.stream: ">"}, count=count, block=int(block * 1000)
+        )
+        return self._parse(response[0][1]) if response else []
+
+    async def aclaim_stale(
+        self,
+        consumer: str,
+        count: int,
+        min_idle_time: float,
+    ) -> List[QueuedRun]:
+        """Claim up to `count` runs left pending by workers without heartbeat for `min_idle_time` seconds."""
+        redis_client = await self._aget_redis()
+        response = await redis_client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=int(min_idle_time * 1000), start_id="0-0", count=count
+        )
+        deleted_ids = [entry_id for entry_id, fields in response[1] if not fields]  # deleted from the stream
+        if deleted_ids:
+            await redis_client.xack(self.stream, self.group, *deleted_ids)
+        runs = self._parse([entry for entry in response[1] if entry[1]])
+        claimed = []
+        for run in runs:
+            pending = await redis_client.xpending_range(
+                self.stream, self.group, min=run.entry_id, max=run.entry_id, count=1
+            )
+            claimed.append(run._replace(nb_deliveries=pending[0]["times_delivered"] if pending else 1))
+        return claimed
+
+    async def aheartbeat(
+        self,
+        consumer: str,
+        entry_ids: List[str],
+    ) -> None:
+        """Reset the idle time of runs in progress, so that they are not claimed by other workers."""
+        if not entry_ids:
+            return
+        redis_client = await self._aget_redis()
+        await redis_client.xclaim(
+            self.stream, self.group, consumer, min_idle_time=0, message_ids=entry_ids, justid=True
+        )
+
+    async def aack(
+        self,
+        queued_run: QueuedRun,
+    ) -> None:
+        """Acknowledge a finished run and remove it from the stream, with its API key."""
+        redis_client = await self._aget_redis()
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.xack(self.stream, self.group, queued_run.entry_id)
+            pipeline.xdel(self.stream, queued_run.entry_id)
+            if queued_run.run.has_api_key:
+                pipeline.delete(self._api_key_key(queued_run.run.run_id))
+            await pipeline.execute()
+
+
+def _get_executor(api_key: Optional[str]) -> AgentExecutor:
+    return get_meta_agent_registry().get_executor(api_key)
+
+
+class AgentRunWorker:
+    """Runs the queued agent runs, at most `concurrency` at a time, and publishes their events."""
+
+    def __init__(
+        self,
+        queue: RunQueue,
+        consumer: str,
+        concurrency: Optional[int] = None,
+        get_executor: Callable[[Optional[str]], AgentExecutor] = _get_executor,
+        block: float = 5.0,
+        claim_idle_time: Optional[float] = None,
+        heartbeat_interval: Optional[float] = None,
+        max_deliveries: Optional[int] = None,
+    ) -> None:
+        self.queue = queue
+        self.consumer = consumer
+        self.concurrency = concurrency or settings.RUN_WORKER_CONCURRENCY
+        self.get_executor = get_executor
+        self.block = block
+        self.claim_idle_time = claim_idle_time or settings.RUN_QUEUE_CLAIM_IDLE_TIME
+        self.heartbeat_interval = heartbeat_interval or settings.RUN_QUEUE_HEARTBEAT_INTERVAL
+        self.max_deliveries = max_deliveries or settings.RUN_QUEUE_MAX_DELIVERIES
+        self.running: Dict[str, asyncio.Task] = {}
+
+    async def astep(
+        self,
+    ) -> None:
+        """Start as many runs as there are free slots (stale runs first), or wait for a run to finish."""
+        nb_free = self.concurrency - len(self.running)
+        if nb_free <= 0:
+            await asyncio.wait(list(self.running.values()), return_when=asyncio.FIRST_COMPLETED)
+            return
+        runs = await self.queue.aclaim_stale(self.consumer, nb_free, self.claim_idle_time)
+        if len(runs) < nb_free:
+            runs += await self.queue.aread(self.consumer, nb_free - len(runs), self.block)
+        for run in runs:
+            task = asyncio.create_task(self._aexecute(run))
+            self.running[run.entry_id] = task
+            task.add_done_callback(functools.partial(self._forget, run.entry_id))
+
+    def _forget(
+        self,
+        entry_id: str,
+        _task: asyncio.Task,
+    ) -> None:
+        self.running.pop(entry_id, None)
+
+    async def _aexecute(
+        self,
+        queued_run: QueuedRun,
+    ) -> None:
+        run = queued_run.run
+        events = RunEventStream(run.run_id)
+        g.tool_context = {}
+        g.query_context = {
+            "run_id": run.run_id,
+        }
+        try:
+            api_key = await self.queue.aget_api_key(run)
+            if queued_run.nb_deliveries > self.max_deliveries:
+                reason: Optional[str] = "failed too many times"
+            elif queued_run.nb_deliveries > 1 and await events.ahas_events():
+                # running it again would append a second answer to the partial answer of the previous attempt
+                reason = "was interrupted"
+            elif not await is_running(run.run_id):
+                reason = "was cancelled"
+            elif run.has_api_key and api_key is None:
+                reason = "waited too long in the queue"  # the API key expired, do not fall back to the server key
+            else:
+                reason = None
+            if reason is not None:
+                logger.warning(f"Run {run.run_id} {reason}, not started")
+                await events.apublish(StreamingData(data=f"The run {reason}.", data_type=StreamingDataTypeEnum.LLM))
+                await events.aclose()
+            else:
+                logger.info(f"Run {run.run_id} started (delivery {queued_run.nb_deliveries})")
+                meta_agent = self.get_executor(api_key)
+                stream_handler, task = await astart_agent_run(
+                    run.chat.model_copy(update={"api_key": api_key}), meta_agent, run.run_id
+                )
+                await asyncio.gather(apublish_run_events(stream_handler, events), task)
+        except Exception as e:
+            # left pending, the run is claimed again after `claim_idle_time`
+            logger.exception(f"Run {run.run_id} failed: {repr(e)}")
+            return
+        await self.queue.aack(queued_run)
+
+    async def _aheartbeat_forever(
+        self,
+    ) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.queue.aheartbeat(self.consumer, list(self.running))
+            except Exception as e:
+                logger.warning(f"Run queue heartbeat failed: {repr(e)}")
+
+    async def arun_forever(
+        self,
+        shutdown_timeout: Optional[float] = None,
+    ) -> None:
+        """Process runs until cancelled, then let the runs in progress finish for up to `shutdown_timeout` seconds."""
+        await self.queue.aensure_group()
+        heartbeat = asyncio.create_task(self._aheartbeat_forever())
+        logger.info(f"Agent worker {self.consumer} started, concurrency {self.concurrency}")
+        try:
+            while True:
+                try:
+                    await self.astep()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Could not read the run queue: {repr(e)}")
+                    await asyncio.sleep(self.block)
+        finally:
+            if self.running:
+                logger.info(f"Waiting for {len(self.running)} runs to finish")
+                await asyncio.wait(
+                    list(self.running.values()),
+                    timeout=shutdown_timeout if shutdown_timeout is not None else settings.RUN_WORKER_SHUTDOWN_TIMEOUT,
+                )
+            heartbeat.cancel()
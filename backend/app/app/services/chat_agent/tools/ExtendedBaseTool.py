@@ -7,12 +7,14 @@ from typing import Any, List, Optional
 from box import Box
 from langchain.base_language import BaseLanguageModel
 from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain.chat_models.base import BaseChatModel
 from langchain.schema import BaseMessage
 from langchain.tools import BaseTool
 
 from app.schemas.agent_schema import AgentAndToolsConfig
 from app.schemas.tool_schema import ToolConfig
 from app.services.chat_agent.helpers.llm import get_llm, get_token_length
+from app.services.chat_agent.helpers.llm_cache import areplay_cached_response, get_llm_response_cache, get_llm_string
 
 
 class ExtendedBaseTool(BaseTool):
@@ -40,6 +42,11 @@ class ExtendedBaseTool(BaseTool):
 
     additional: Optional[Box] = None
 
+    llm_cache: bool = False
+    """Whether the responses of the tool LLM are cached (see `LLMResponseCache`), set from the tool config."""
+    llm_cache_similarity_threshold: Optional[float] = None
+    """Minimum similarity of a prompt to reuse the response of a similar cached prompt, None for exact matches."""
+
     @classmethod
     def from_config(
         cls,
@@ -110,7 +117,12 @@ class ExtendedBaseTool(BaseTool):
         discard_fast_llm: bool = False,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> str:
-        """Generate a response asynchronously with the preferential llm."""
+        """
+        Generate a response asynchronously with the preferential llm.
+
+        With `llm_cache`, the response is looked up in the LLM response cache first, a cached response is replayed
+        to the callbacks so that it streams like a generated one.
+        """
         if self.fast_llm_token_limit is None:
             raise ValueError("fast_llm_token_limit must be set in the config, current value `None`")
         llm = (
@@ -120,8 +132,23 @@ class ExtendedBaseTool(BaseTool):
             and not discard_fast_llm
             else self.llm
         )
-        llm_response = await llm.agenerate([messages], callbacks=run_manager.get_child() if run_manager else None)
-        return llm_response.generations[0][0].text
+        callbacks = run_manager.get_child() if run_manager else None
+        cache = get_llm_response_cache() if self.llm_cache else None
+        if cache is None or not isinstance(llm, BaseChatModel):
+            llm_response = await llm.agenerate([messages], callbacks=callbacks)
+            return llm_response.generations[0][0].text
+
+        llm_string = get_llm_string(llm)
+        cached_response = await cache.alookup(self.name, llm_string, messages, self.llm_cache_similarity_threshold)
+        if cached_response is not None:
+            await areplay_cached_response(llm, messages, cached_response, callbacks=callbacks)
+            return cached_response
+        llm_response = await llm.agenerate([messages], callbacks=callbacks)
+        response = llm_response.generations[0][0].text
+        await cache.aupdate(
+            self.name, llm_string, messages, response, semantic=self.llm_cache_similarity_threshold is not None
+        )
+        return response
 
     def _run(
         self,
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Passage reranking of the PDF tool.
+
+The retrieved chunks are up to `tokenizer_chunk_size` tokens each, while only a few sentences of each usually answer
+the question. The reranker splits the chunks into passages of a few sentences, scores them with BM25 against the
+question (IDF over the passages of the retrieved chunks), fuses that ranking with the rank of their chunk, and keeps
+the best passages up to a token budget. The kept passages are returned grouped by chunk, in their original order, so
+the QA prompt gets a fraction of the tokens with the same answering passages.
+"""
+import logging
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from app.services.chat_agent.helpers.bm25 import BM25_B, BM25_K1, bm25_idf, tokenize_text
+from app.services.chat_agent.helpers.llm import get_encoding, get_token_lengths
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+class PassageReranker:
+    """Selects the passages of retrieved documents most relevant to a question, within a token budget."""
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        passage_max_tokens: int = 150,
+        rrf_k: int = 60,
+        model: str = "gpt-4",
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.passage_max_tokens = passage_max_tokens
+        self.rrf_k = rrf_k
+        self.model = model
+
+    def split_passages(
+        self,
+        text: str,
+    ) -> List[Tuple[str, int]]:
+        """Split a text into passages of consecutive sentences of up to `passage_max_tokens`, with their length."""
+        sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+        passages: List[Tuple[str, int]] = []
+        current: List[str] = []
+        current_length = 0
+        for sentence, length in zip(sentences, get_token_lengths(sentences, model=self.model)):
+            if current and current_length + length > self.passage_max_tokens:
+                passages.append((" ".join(current), current_length))
+                current, current_length = [], 0
+            current.append(sentence)
+            current_length += length
+        if current:
+            passages.append((" ".join(current), current_length))
+        return passages
+
+    @staticmethod
+    def _bm25_scores(
+        query: str,
+        passages: Sequence[str],
+    ) -> List[float]:
+        query_tokens = set(tokenize_text(query))
+        term_frequencies = [Counter(tokenize_text(passage)) for passage in passages]
+        lengths = [sum(tf.values()) for tf in term_frequencies]
+        average_length = sum(lengths) / max(len(lengths), 1) or 1.0
+        document_frequencies = Counter(token for tf in term_frequencies for token in query_tokens if token in tf)
+        scores = []
+        for tf, length in zip(term_frequencies, lengths):
+            score = 0.0
+            for token, frequency in document_frequencies.items():
+                if token in tf:
+                    idf = bm25_idf(len(passages), frequency)
+                    score += (
+                        idf
+                        * tf[token]
+                        * (BM25_K1 + 1)
+                        / (tf[token] + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                    )
+            scores.append(score)
+        return scores
+
+    def rerank(
+        self,
+        query: str,
+        documents: Sequence[Document],
+    ) -> List[Document]:
+        """
+        Keep the passages of the documents most relevant to the query, within `max_tokens`.
+
+        Args:
+            query (str): The question.
+            documents (Sequence[Document]): The retrieved documents, best first.
+
+        Returns:
+            List[Document]: The documents with kept passages, reduced to these passages, in their original order.
+        """
+        passages = [
+            (document_rank, position, text, length)
+            for document_rank, document in enumerate(documents)
+            for position, (text, length) in enumerate(self.split_passages(document.page_content))
+        ]
+        if not passages:
+            return []
+        bm25_scores = self._bm25_scores(query, [text for _, _, text, _ in passages])
+        # passages without any word of the query are only ranked by their document
+        bm25_ranking = sorted((i for i in range(len(passages)) if bm25_scores[i] > 0), key=lambda i: -bm25_scores[i])
+        scores = {i: 1 / (self.rrf_k + document_rank + 1) for i, (document_rank, _, _, _) in enumerate(passages)}
+        for rank, i in enumerate(bm25_ranking, start=1):
+            scores[i] += 1 / (self.rrf_k + rank)
+
+        selected: Dict[int, List[Tuple[int, str]]] = {}
+        nb_tokens = 0
+        for i in sorted(scores, key=lambda i: -scores[i]):
+            document_rank, position, text, length = passages[i]
+            if nb_tokens + length > self.max_tokens:
+                if nb_tokens > 0:
+                    continue
+                # the best passage alone is over the budget
+                encoding = get_encoding(self.model)
+                text, length = encoding.decode(encoding.encode(text)[: self.max_tokens]), self.max_tokens
+            selected.setdefault(document_rank, []).append((position, text))
+            nb_tokens += length
+        logger.info(f"Kept {sum(map(len, selected.values()))}/{len(passages)} passages, {nb_tokens} tokens")
+        return [
+            Document(
+                page_content="\n".join(text for _, text in sorted(selected[document_rank])),
+                metadata=documents[document_rank].metadata,
+            )
+            for document_rank in sorted(selected)
+        ]
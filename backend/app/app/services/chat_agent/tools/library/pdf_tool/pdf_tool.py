@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+# mypy: disable-error-code="override"
 from __future__ import annotations
 
 import csv
@@ -11,29 +12,47 @@ from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, Callback
 from langchain.schema import HumanMessage, SystemMessage
 
 from app.core.config import settings
-from app.db.vector_db_pdf_ingestion import PDFExtractionPipeline, get_pdf_pipeline
+from app.db.session import db_resources
+from app.db.vector_db_retriever import PGVectorAsyncRetriever
 from app.schemas.agent_schema import AgentAndToolsConfig
 from app.schemas.streaming_schema import StreamingDataTypeEnum
-from app.schemas.tool_schema import ToolConfig, ToolInputSchema
+from app.schemas.tool_schema import PdfToolConfig, ToolInputSchema
 from app.schemas.tool_schemas.pdf_tool_schema import PdfAppendix
+from app.services.chat_agent.helpers.embedding_models import get_embedding_model
 from app.services.chat_agent.helpers.llm import get_llm
 from app.services.chat_agent.helpers.query_formatting import standard_query_format
 from app.services.chat_agent.tools.ExtendedBaseTool import ExtendedBaseTool
+from app.services.chat_agent.tools.library.pdf_tool.passage_reranker import PassageReranker
+from app.utils.config_loader import get_ingestion_configs
 
 logger = logging.getLogger(__name__)
 
 
+def get_pdf_retriever(
+    config: PdfToolConfig,
+) -> PGVectorAsyncRetriever:
+    """Hybrid retriever of the PDF tool collection, with the embedding model of the ingestion."""
+    return PGVectorAsyncRetriever(
+        db_resources.pdf_vector_store,
+        get_embedding_model(get_ingestion_configs().indexing_config.embedding_model),
+        k=config.retrieval_top_k,
+        fetch_k=config.retrieval_fetch_k,
+        keyword_search=config.retrieval_keyword_search,
+    )
+
+
 class PDFTool(ExtendedBaseTool):
     """PDF Tool."""
 
     name = "pdf_tool"
     appendix_title = "PDF Appendix"
-    pdf_pipeline: PDFExtractionPipeline
+    retriever: PGVectorAsyncRetriever
+    reranker: PassageReranker
 
     @classmethod
     def from_config(
         cls,
-        config: ToolConfig,
+        config: PdfToolConfig,
         common_config: AgentAndToolsConfig,
         **kwargs: Any,
     ) -> PDFTool:
@@ -88,7 +107,11 @@ class PDFTool(ExtendedBaseTool):
             )
             if config.system_context_refinement
             else None,
-            pdf_pipeline=get_pdf_pipeline(),
+            retriever=get_pdf_retriever(config),
+            reranker=PassageReranker(
+                max_tokens=config.context_max_tokens,
+                passage_max_tokens=config.passage_max_tokens,
+            ),
         )
 
     def _run(
@@ -146,17 +169,13 @@ class PDFTool(ExtendedBaseTool):
             args[0],
         )
         # Use standard query formatting
-        query = standard_query_format(ToolInputSchema.parse_raw(query))
+        tool_input = ToolInputSchema.parse_raw(query)
+        question = tool_input.latest_human_message
+        query = standard_query_format(tool_input)
         try:
-            logger.info("Filtering relevant documents")
-            db_pdf_docs = self.pdf_pipeline.run(load_index=True)
-
             logger.info("Filtering DB for relevant info...")
-            docs = db_pdf_docs.as_retriever(
-                search_kwargs={
-                    "k": 4,
-                }  # tbd search_kwargs
-            ).get_relevant_documents(query)
+            docs = await self.retriever.aget_relevant_documents(query, keyword_query=question)
+            docs = self.reranker.rerank(question, docs)
             retrieved_docs = "\n".join([doc.page_content for doc in docs])
 
             result = await self._aqa_pdf_chunks(
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Schema index of the SQL tool database.
+
+Selecting the tables for a question used to take one LLM call listing every table. The index is built once from
+the DatabaseInfo and retrieves candidate tables by keyword search (BM25 over table names, column names and
+comments) and vector search (embeddings of the table definitions), fused into one score. The SQL tool only falls
+back to the LLM table selection when the retrieval is not confident, i.e. no table name appears in the question
+and no table definition is similar enough to it.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from app.services.chat_agent.helpers.bm25 import BM25_B, BM25_K1, bm25_idf, tokenize_identifiers
+
+logger = logging.getLogger(__name__)
+
+TABLE_NAME_WEIGHT = 3
+
+
+class TableLike(Protocol):
+    structure: str
+
+    @property
+    def name(self) -> str:
+        ...
+
+
+def table_definition(table: TableLike) -> str:
+    """Table name, columns and comments of a table, without the sample rows."""
+    return f"{table.name}\n{table.structure.split('/*')[0].strip()}"
+
+
+class SchemaIndex:
+    """Keyword and vector index of the tables of a database."""
+
+    def __init__(
+        self,
+        tables: Sequence[TableLike],
+        embeddings: Optional[Embeddings] = None,
+        top_k: int = 5,
+        min_similarity: float = 0.8,
+    ) -> None:
+        self.tables = list(tables)
+        self.embeddings = embeddings
+        self.top_k = top_k
+        self.min_similarity = min_similarity
+        self.tables_by_name: Dict[str, int] = {table.name.upper(): i for i, table in enumerate(self.tables)}
+
+        self._name_tokens = [set(tokenize_identifiers(table.name.split(".")[-1])) for table in self.tables]
+        self._term_frequencies: List[Counter[str]] = []
+        for table, name_tokens in zip(self.tables, self._name_tokens):
+            term_frequencies = Counter(tokenize_identifiers(table_definition(table)))
+            for token in name_tokens:
+                term_frequencies[token] += TABLE_NAME_WEIGHT
+            self._term_frequencies.append(term_frequencies)
+        self._lengths = np.array([sum(tf.values()) for tf in self._term_frequencies], dtype=np.float32)
+        document_frequencies: Counter[str] = Counter()
+        for term_frequencies in self._term_frequencies:
+            document_frequencies.update(term_frequencies.keys())
+        nb_tables = len(self.tables)
+        self._idf = {token: bm25_idf(nb_tables, frequency) for token, frequency in document_frequencies.items()}
+
+        self._table_embeddings: Optional[np.ndarray] = None
+        self._embedding_lock = asyncio.Lock()
+
+    def get_tables(
+        self,
+        table_names: Sequence[str],
+    ) -> List[TableLike]:
+        """Get tables by their (case insensitive) `schema.table` names, in the order of the database."""
+        indices = {self.tables_by_name[name.upper()] for name in table_names if name.upper() in self.tables_by_name}
+        return [self.tables[i] for i in sorted(indices)]
+
+    def _keyword_scores(self, query_tokens: List[str]) -> np.ndarray:
+        scores = np.zeros(len(self.tables), dtype=np.float32)
+        if not self.tables:
+            return scores
+        average_length = float(self._lengths.mean()) or 1.0
+        for token in set(query_tokens):
+            idf = self._idf.get(token)
+            if idf is None:
+                continue
+            frequencies = np.array([tf.get(token, 0) for tf in self._term_frequencies], dtype=np.float32)
+            scores += (
+                idf
+                * frequencies
+                * (BM25_K1 + 1)
+                / (frequencies + BM25_K1 * (1 - BM25_B + BM25_B * self._lengths / average_length))
+            )
+        return scores
+
+    async def _aensure_table_embeddings(self) -> Optional[np.ndarray]:
+        if self.embeddings is None or not self.tables:
+            return None
+        async with self._embedding_lock:
+            if self._table_embeddings is None:
+                try:
+                    vectors = await self.embeddings.aembed_documents([table_definition(t) for t in self.tables])
+                except Exception as e:
+                    logger.warning(f"Could not embed table definitions, using keyword search only: {repr(e)}")
+                    self.embeddings = None
+                    return None
+                table_embeddings = np.asarray(vectors, dtype=np.float32)
+                norms = np.linalg.norm(table_embeddings, axis=1, keepdims=True)
+                self._table_embeddings = table_embeddings / np.where(norms == 0, 1, norms)
+        return self._table_embeddings
+
+    async def _avector_scores(self, query: str) -> Optional[np.ndarray]:
+        table_embeddings = await self._aensure_table_embeddings()
+        if table_embeddings is None or self.embeddings is None:
+            return None
+        try:
+            query_embedding = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed question for table selection: {repr(e)}")
+            return None
+        norm = np.linalg.norm(query_embedding)
+        return table_embeddings @ (query_embedding / norm) if norm > 0 else None
+
+    async def asearch(
+        self,
+        query: str,
+    ) -> Tuple[List[str], bool]:
+        """
+        Retrieve the candidate tables for a question.
+
+        Args:
+            query (str): The question.
+
+        Returns:
+            Tuple[List[str], bool]: The `schema.table` names of the candidate tables, best first, and whether the
+            retrieval is confident.
+        """
+        if not self.tables:
+            return [], False
+        query_tokens = tokenize_identifiers(query)
+        keyword_scores = self._keyword_scores(query_tokens)
+        vector_scores = await self._avector_scores(query)
+
+        fused_scores = keyword_scores / keyword_scores.max() if keyword_scores.max() > 0 else keyword_scores
+        if vector_scores is not None:
+            spread = vector_scores.max() - vector_scores.min()
+            normalized_vector_scores = (vector_scores - vector_scores.min()) / spread if spread > 0 else vector_scores
+            fused_scores = (fused_scores + normalized_vector_scores) / 2
+
+        ranking = [int(i) for i in np.argsort(-fused_scores, kind="stable")[: self.top_k]]
+        best_score = fused_scores[ranking[0]]
+        candidates = [self.tables[i].name for i in ranking if best_score > 0 and fused_scores[i] >= 0.5 * best_score]
+
+        query_token_set = set(query_tokens)
+        names_matched = any(self._name_tokens[i] & query_token_set for i in ranking)
+        similar = vector_scores is not None and float(vector_scores.max()) >= self.min_similarity
+        confident = bool(candidates) and (names_matched or similar)
+        logger.info(f"Schema index candidates: {candidates} (confident={confident})")
+        return candidates, confident
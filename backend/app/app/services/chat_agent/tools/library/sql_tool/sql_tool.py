@@ -10,13 +10,15 @@ from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, Callback
 from langchain.schema import HumanMessage, SystemMessage
 
 from app.core.config import settings
-from app.db.session import sql_tool_db
+from app.db.session import db_resources
 from app.schemas.agent_schema import AgentAndToolsConfig
 from app.schemas.streaming_schema import StreamingDataTypeEnum
 from app.schemas.tool_schema import SqlToolConfig, ToolInputSchema
+from app.services.chat_agent.helpers.embedding_models import get_embedding_model
 from app.services.chat_agent.helpers.llm import get_llm
 from app.services.chat_agent.helpers.query_formatting import standard_query_format
 from app.services.chat_agent.tools.ExtendedBaseTool import ExtendedBaseTool
+from app.services.chat_agent.tools.library.sql_tool.schema_index import SchemaIndex
 from app.utils.sql import is_sql_query_safe
 
 logger = logging.getLogger(__name__)
@@ -32,6 +34,7 @@ class SQLTool(ExtendedBaseTool):
     validate_empty_results: bool = False
     validate_with_llm: bool = False
     always_limit_query: bool = False
+    schema_index: Optional[SchemaIndex] = None
 
     @classmethod
     def from_config(
@@ -92,6 +95,28 @@ class SQLTool(ExtendedBaseTool):
             validate_empty_results=config.validate_empty_results,
             validate_with_llm=config.validate_with_llm,
             always_limit_query=config.always_limit_query,
+            schema_index=cls._build_schema_index(config),
+        )
+
+    @staticmethod
+    def _build_schema_index(
+        config: SqlToolConfig,
+    ) -> Optional[SchemaIndex]:
+        """Build the schema index of the database tables, table embeddings are computed on first use."""
+        sql_tool_db = db_resources.sql_tool_db
+        if sql_tool_db is None or sql_tool_db.db_info is None:
+            return None
+        embeddings = None
+        if settings.SQL_TOOL_SCHEMA_INDEX_EMBEDDINGS:
+            try:
+                embeddings = get_embedding_model(None)
+            except Exception as e:
+                logger.warning(f"Schema index without embeddings, no embedding model: {repr(e)}")
+        return SchemaIndex(
+            sql_tool_db.db_info.tables,
+            embeddings=embeddings,
+            top_k=config.table_selection_top_k,
+            min_similarity=config.table_selection_min_similarity,
         )
 
     @staticmethod
@@ -105,6 +130,7 @@ class SQLTool(ExtendedBaseTool):
                 logger.warning(msg)
             else:
                 raise ValueError(msg)
+        sql_tool_db = db_resources.sql_tool_db
         if sql_tool_db is None:
             msg = "Database is not initialized"
             if warning:
@@ -249,35 +275,36 @@ class SQLTool(ExtendedBaseTool):
                     [],
                     "The SQL query contains forbidden keywords (DML, DDL statements)",
                 )
+            sql_tool_db = db_resources.sql_tool_db
             if sql_tool_db is None:
                 raise ValueError("Database is not initialized")
-            results = sql_tool_db.run_no_str(query)
-            if results is None:
+            sample = await sql_tool_db.asample(query, nb_rows=self.nb_example_rows)
+            if sample is None:
                 validation: Tuple[bool, Any, Any] = (
                     False,
                     [],
-                    f"The SQL query did not return any results: {results}",
+                    f"The SQL query did not return any results: {sample}",
                 )
-            elif self.validate_empty_results and len(results) == 0:
+            elif self.validate_empty_results and sample.row_count == 0:
                 validation = (
                     False,
                     [],
                     "The SQL query executed but did not return any result rows.",
                 )
             else:
-                sample_rows_result = results[0 : self.nb_example_rows]
                 sample_rows = list(
                     map(
                         lambda ls: [f"{str(i)[:100]}..." if len(str(i)) > 100 else str(i) for i in ls],
-                        sample_rows_result,
+                        sample.rows,
                     )
                 )
                 sample_rows_str = ";".join([",".join(row) for row in sample_rows]).replace(
                     "\n",
                     "",
                 )
+                row_count_str = str(sample.row_count) if sample.row_count_exact else f"at least {sample.row_count}"
                 results_str = (
-                    f"total rows from SQL query: {len(results)}, first {self.nb_example_rows} rows: {sample_rows_str}"
+                    f"total rows from SQL query: {row_count_str}, first {self.nb_example_rows} rows: {sample_rows_str}"
                 )
                 if self.validate_with_llm:
                     validation_messages = [
@@ -364,7 +391,7 @@ class SQLTool(ExtendedBaseTool):
         query: str,
         run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
     ) -> List[str]:
-        """List the SQL tables."""
+        """List the SQL tables, from the schema index if it is confident, otherwise asking the LLM."""
         if run_manager is not None:
             await run_manager.on_text(
                 "list_tables_sql_db",
@@ -372,6 +399,10 @@ class SQLTool(ExtendedBaseTool):
                 tool=self.name,
                 step=1,
             )
+        if self.schema_index is not None:
+            candidate_tables, confident = await self.schema_index.asearch(query)
+            if confident:
+                return candidate_tables
         table_messages = [
             SystemMessage(content=self.system_context_selection if self.system_context_selection else ""),
             HumanMessage(content=self.prompt_selection.format(question=query) if self.prompt_selection else ""),
@@ -398,14 +429,9 @@ class SQLTool(ExtendedBaseTool):
                 tool=self.name,
                 step=1,
             )
-        filtered_tables_upper_case = [x.upper() for x in filtered_tables]
-        db_table_infos = sql_tool_db.db_info.tables if sql_tool_db and sql_tool_db.db_info is not None else []
+        db_table_infos = self.schema_index.get_tables(filtered_tables) if self.schema_index is not None else []
         table_schemas = "\n".join(
-            [
-                ("DB.TABLE name: " + s.name + ", Table structure: " + s.structure)
-                for s in db_table_infos
-                if s.name.upper() in filtered_tables_upper_case
-            ]
+            [("DB.TABLE name: " + s.name + ", Table structure: " + s.structure) for s in db_table_infos]
         )
         question_messages = [
             SystemMessage(content=self.system_context),
@@ -85,6 +85,11 @@ def get_tools(tools: List[str], load_nested: bool = True) -> List[BaseTool]:
         ) in all_tool_classes
         if name in agent_config.tools
     ]
+    for tool in all_tools:
+        # set here rather than in each `from_config`, many tools override it
+        tool_config = agent_config.tools_library.library[tool.name]
+        tool.llm_cache = tool_config.llm_cache
+        tool.llm_cache_similarity_threshold = tool_config.llm_cache_similarity_threshold
     tools_map = {tool.name: tool for tool in all_tools}
 
     if any(tool_name not in tools_map for tool_name in tools):
@@ -6,7 +6,7 @@ from typing import Any
 from app.core.config import settings, yaml_configs
 from app.schemas.agent_schema import ActionPlan, ActionPlans, AgentAndToolsConfig, AgentConfig
 from app.schemas.ingestion_schema import IngestionPipelineConfigs
-from app.schemas.tool_schema import PromptInput, SqlToolConfig, ToolConfig, ToolsLibrary
+from app.schemas.tool_schema import PdfToolConfig, PromptInput, SqlToolConfig, ToolConfig, ToolsLibrary
 from app.utils.config import Config
 
 logger = logging.getLogger(__name__)
@@ -24,6 +24,8 @@ def get_tool_config(
     match tool_name:
         case "sql_tool":
             return SqlToolConfig(**config_values)
+        case "pdf_tool":
+            return PdfToolConfig(**config_values)
         case _:
             return ToolConfig(**config_values)
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 import re
+from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
@@ -79,3 +80,44 @@ def is_sql_query_safe(sql_string: str) -> bool:
         return False
 
     return True
+
+
+SQL_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')
+    | (?P<identifier>"(?:[^"]|"")*")
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?(?!\w))
+    | (?P<word>\w+)
+    | (?P<symbol><>|!=|<=|>=|::|\|\||\S)
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+
+
+def _canonical_number(number: str) -> str:
+    if re.fullmatch(r"\d+", number):
+        return str(int(number))
+    canonical = format(Decimal(number).normalize(), "f")
+    # keep the literal a decimal, 1.0 and 1 do not have the same type
+    return canonical if "." in canonical else f"{canonical}.0"
+
+
+def normalize_sql(sql_string: str) -> str:
+    """
+    Normalize a SQL statement, so that equivalent statements have the same text.
+
+    Whitespace is collapsed, unquoted keywords and identifiers are lowercased and numeric literals are written in
+    a canonical form (e.g. 007 -> 7, 1.50 -> 1.5). String literals and quoted identifiers are kept as is.
+    """
+    tokens = []
+    for match in SQL_TOKEN_PATTERN.finditer(sql_string):
+        kind, token = match.lastgroup, match.group()
+        if kind == "number":
+            tokens.append(_canonical_number(token))
+        elif kind in ("word", "symbol"):
+            tokens.append(token.lower())
+        else:
+            tokens.append(token)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
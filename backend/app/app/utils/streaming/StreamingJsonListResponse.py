@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
-import json
 from typing import Any, AsyncIterable, Iterable, Mapping, Optional
 
+import orjson
 from fastapi.encoders import jsonable_encoder
 from starlette.background import BackgroundTask
 from starlette.responses import StreamingResponse
@@ -22,6 +22,16 @@ async def async_enumerate(
         idx += 1
 
 
+def encode_item(
+    item: Any,
+) -> bytes:
+    """
+    Serialize a pydantic model with orjson, which natively handles enums, UUIDs and datetimes. Other values (e.g.
+    pydantic v1 models in the metadata) fall back to `jsonable_encoder`.
+    """
+    return orjson.dumps(item.model_dump(), default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+
 class StreamingJsonListResponse(StreamingResponse):
     """
     Converts a pydantic model generator into a streaming HTTP Response that streams a
@@ -61,24 +71,20 @@ class StreamingJsonListResponse(StreamingResponse):
     @staticmethod
     async def _encoded_async_generator(
         async_generator: AsyncIterable,
-    ) -> AsyncIterable[str]:
+    ) -> AsyncIterable[bytes]:
         """Converts an asynchronous pydantic model generator into a streaming JSON
         list."""
         async for idx, item in async_enumerate(async_generator):
-            if idx > 0:
-                yield "\n"
-            yield json.dumps(jsonable_encoder(item.dict()))
+            yield b"\n" + encode_item(item) if idx > 0 else encode_item(item)
 
     @staticmethod
     async def _encoded_generator(
         generator: Iterable,
-    ) -> AsyncIterable[str]:
+    ) -> AsyncIterable[bytes]:
         """Converts a synchronous pydantic model generator into a streaming JSON
         list."""
         for (
             idx,
             item,
         ) in enumerate(generator):
-            if idx > 0:
-                yield "\n"
-            yield json.dumps(jsonable_encoder(item.dict()))
+            yield b"\n" + encode_item(item) if idx > 0 else encode_item(item)
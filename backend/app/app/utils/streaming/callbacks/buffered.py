@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import Any, List, Tuple
+
+from langchain.callbacks.base import AsyncCallbackHandler, BaseCallbackManager
+
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+
+BUFFERED_EVENTS = (
+    "on_llm_start",
+    "on_llm_new_token",
+    "on_llm_end",
+    "on_llm_error",
+    "on_chain_start",
+    "on_chain_end",
+    "on_chain_error",
+    "on_tool_start",
+    "on_tool_end",
+    "on_tool_error",
+    "on_text",
+    "on_retry",
+    "on_agent_action",
+    "on_agent_finish",
+    "on_retriever_start",
+    "on_retriever_end",
+    "on_retriever_error",
+)
+
+
+# pylint: disable=too-many-ancestors
+class BufferedCallbackHandler(AsyncCallbackHandler):
+    """
+    Callback handler that holds back the events of a wrapped handler until it is flushed.
+
+    Used to run tools concurrently while their events reach the stream in the same order as if the tools had
+    run one after another: the events of a tool are buffered until all previous tools are done, then replayed
+    and passed through live.
+    """
+
+    handler: AsyncCallbackHandler
+    events: List[Tuple[str, Tuple[Any, ...], dict[str, Any]]]
+    live: bool
+
+    def __init__(
+        self,
+        handler: AsyncCallbackHandler,
+    ) -> None:
+        self.handler = handler
+        self.events = []
+        self.live = False
+
+    async def flush(
+        self,
+    ) -> None:
+        """Replay the buffered events in order and pass all later events through."""
+        i = 0
+        while i < len(self.events):
+            name, args, kwargs = self.events[i]
+            await getattr(self.handler, name)(*args, **kwargs)
+            i += 1
+        self.events.clear()
+        self.live = True
+
+    async def on_chat_model_start(self, *args: Any, **kwargs: Any) -> Any:
+        """Not implemented, so that the callback manager falls back to `on_llm_start` like for the wrapped
+        AsyncIteratorCallbackHandler."""
+        raise NotImplementedError("BufferedCallbackHandler does not implement on_chat_model_start")
+
+
+def _buffered_event(name: str) -> Any:
+    async def _on_event(self: BufferedCallbackHandler, *args: Any, **kwargs: Any) -> Any:
+        if self.live:
+            return await getattr(self.handler, name)(*args, **kwargs)
+        self.events.append((name, args, kwargs))
+        return None
+
+    _on_event.__name__ = name
+    return _on_event
+
+
+for _event in BUFFERED_EVENTS:
+    setattr(BufferedCallbackHandler, _event, _buffered_event(_event))
+
+
+def buffer_stream_handlers(
+    callback_manager: BaseCallbackManager,
+) -> List[BufferedCallbackHandler]:
+    """Wrap the stream handlers of a callback manager into buffered handlers (in place)."""
+    buffers: dict[int, BufferedCallbackHandler] = {}
+
+    def _wrap(handler: Any) -> Any:
+        if not isinstance(handler, AsyncIteratorCallbackHandler):
+            return handler
+        return buffers.setdefault(id(handler), BufferedCallbackHandler(handler))
+
+    callback_manager.handlers = [_wrap(h) for h in callback_manager.handlers]
+    callback_manager.inheritable_handlers = [_wrap(h) for h in callback_manager.inheritable_handlers]
+    return list(buffers.values())
@@ -3,16 +3,17 @@ from __future__ import annotations
 
 import asyncio
 from datetime import datetime
-from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Union, cast
+from typing import Any, AsyncIterator, Dict, List, Optional
 from uuid import UUID
 
 from langchain.callbacks.base import AsyncCallbackHandler
-from langchain.globals import get_llm_cache
 from langchain.schema import AgentFinish, LLMResult
 from langchain.schema.messages import BaseMessage
 
+from app.core.config import settings
 from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum, StreamingSignalsEnum
 from app.utils.fastapi_globals import g
+from app.utils.streaming.stream_queue import StreamQueue
 
 
 # pylint: disable=too-many-ancestors
@@ -21,10 +22,10 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
     Callback handler that returns an async iterator.
 
     This handler queues streaming data from various callbacks and allows for
-    asynchronous iteration over received data.
+    asynchronous iteration over received data. LLM tokens are coalesced into frames (see `StreamQueue`).
     """
 
-    queue: asyncio.Queue[StreamingData]
+    queue: StreamQueue
     done: asyncio.Event
     run_id_cached: dict[str, bool] = {}
 
@@ -36,19 +37,21 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
 
     @property
     def llm_cache_enabled(self) -> bool:
-        """Determine if LLM caching is enabled."""
-        llm_cache = get_llm_cache()
-        return llm_cache is not None
+        """Determine if LLM caching is enabled, cached responses end without tokens and are replayed on LLM end."""
+        return settings.ENABLE_LLM_CACHE
 
     def __init__(
         self,
     ) -> None:
         """
-        queue (asyncio.Queue): A queue to hold streaming data until the agent is done.
+        queue (StreamQueue): A queue to hold streaming data until the agent is done.
 
         done (asyncio.Event): An event that signals the completion of data streaming.
         """
-        self.queue = asyncio.Queue()
+        self.queue = StreamQueue(
+            frame_interval=settings.STREAMING_FRAME_INTERVAL,
+            max_frame_size=settings.STREAMING_FRAME_MAX_SIZE,
+        )
         self.done = asyncio.Event()
         query_context = g.query_context or {}
         self.queue.put_nowait(
@@ -71,18 +74,17 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
         """
         Callback for when a new token is generated.
 
-        The token along with metadata is immediately queued for streaming
+        The token is appended to the current frame of the LLM run, the metadata (without the `chunk` of the
+        token) is only built for the first token of a frame.
         """
-        if self.llm_cache_enabled and self.run_id_cached[str(kwargs.get("run_id"))]:
-            self.run_id_cached[str(kwargs.get("run_id"))] = False
+        run_id = kwargs.get("run_id")
+        if self.llm_cache_enabled and self.run_id_cached.get(str(run_id)):
+            self.run_id_cached[str(run_id)] = False
 
-        query_context = g.query_context or {}
-        self.queue.put_nowait(
-            StreamingData(
-                data=token,
-                data_type=StreamingDataTypeEnum.LLM,
-                metadata={**kwargs, **query_context},
-            )
+        self.queue.put_token(
+            token,
+            run_id,
+            lambda: {**{k: v for k, v in kwargs.items() if k != "chunk"}, **(g.query_context or {})},
         )
 
     async def on_llm_end(
@@ -96,7 +98,7 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
         An 'llm_end' signal is queued along with metadata.
         """
         query_context = g.query_context or {}
-        if self.llm_cache_enabled and self.run_id_cached[str(kwargs.get("run_id"))]:
+        if self.run_id_cached.pop(str(kwargs.get("run_id")), False):
             for generation in response.generations:
                 for token in generation:
                     self.queue.put_nowait(
@@ -106,7 +108,6 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
                             metadata={**kwargs, **query_context},
                         )
                     )
-            del self.run_id_cached[str(kwargs.get("run_id"))]
 
         self.queue.put_nowait(
             StreamingData(
@@ -139,6 +140,7 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
         )
         await asyncio.sleep(1)
         self.done.set()
+        self.queue.close()
 
     async def on_tool_start(
         self,
@@ -237,47 +239,14 @@ class AsyncIteratorCallbackHandler(AsyncCallbackHandler):
         )
         await asyncio.sleep(0.1)
         self.done.set()
+        self.queue.close()
 
     async def aiter(
         self,
     ) -> AsyncIterator[StreamingData]:
-        """Allow streams to be stopped (e.g. on errors or cancelation) via done flag."""
-        while not self.queue.empty() or not self.done.is_set():
-            # Wait for the next token in the queue,
-            # but stop waiting if the done event is set
-            (
-                done,
-                other,
-            ) = await asyncio.wait(
-                [
-                    # NOTE: If you add other tasks here, update the code below,
-                    # which assumes each set has exactly one task each
-                    asyncio.ensure_future(self.queue.get()),
-                    asyncio.ensure_future(self.done.wait()),
-                ],
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            # Cancel the other task
-            while len(other) > 0:
-                other.pop().cancel()
-
-            while len(done) > 0:
-                # Extract the value of the first completed task
-                token_or_done = cast(
-                    Union[
-                        StreamingData,
-                        Literal[True],
-                    ],
-                    done.pop().result(),
-                )
-
-                # If the extracted value is the boolean True, the done event was set
-                if token_or_done is True:
-                    break
-
-                # Otherwise, the extracted value is a token, which we yield
-                yield token_or_done
+        """Iterate over the streaming data until the run is done (agent finish, errors or cancelation)."""
+        while (item := await self.queue.get()) is not None:
+            yield item
 
     async def on_chat_model_start(
         self,
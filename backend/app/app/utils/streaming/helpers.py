@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
-from typing import Any, AsyncGenerator, Awaitable
+from typing import Any, AsyncGenerator, Awaitable, Optional
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketDisconnect
 
 from app.schemas.streaming_schema import StreamingData
 from app.utils.exceptions.common_exceptions import AgentCancelledException
 from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.run_events import RunEventStream
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +57,67 @@ async def event_generator(
     stream_logger.info("\n")
 
 
+RUN_ID_HEADER = "X-Run-Id"
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # no proxy buffering (nginx)
+}
+SSE_HEARTBEAT = b": heartbeat\n\n"
+
+
+def accepts_event_stream(
+    accept: Optional[str],
+) -> bool:
+    """Whether the client asked for Server-Sent Events (`Accept: text/event-stream`)."""
+    return accept is not None and SSE_MEDIA_TYPE in accept
+
+
+async def sse_event_generator(
+    events: RunEventStream,
+    last_event_id: Optional[str] = None,
+) -> AsyncGenerator[bytes, Any]:
+    """
+    Generate Server-Sent Events from the events of a run, after `last_event_id`.
+
+    Each event carries its id, the data is the streaming data JSON of the newline-separated transport. Comments are
+    sent as heartbeats while no event arrives, so that proxies keep the connection open.
+    """
+    logger.info(f"Streaming events of run {events.run_id} after {last_event_id}...")
+    async for event in events.aread(last_event_id):
+        if event is None:
+            yield SSE_HEARTBEAT
+        else:
+            yield f"id: {event.id}\ndata: {event.data}\n\n".encode("utf-8")
+
+
+async def ndjson_event_generator(
+    events: RunEventStream,
+    last_event_id: Optional[str] = None,
+) -> AsyncGenerator[bytes, Any]:
+    """Generate the newline-separated JSON of `StreamingJsonListResponse` from the events of a run."""
+    first = True
+    async for event in events.aread(last_event_id):
+        if event is not None:
+            yield event.data.encode("utf-8") if first else b"\n" + event.data.encode("utf-8")
+            first = False
+
+
+async def websocket_send_events(
+    websocket: WebSocket,
+    events: RunEventStream,
+    last_event_id: Optional[str] = None,
+) -> None:
+    """Send the events of a run after `last_event_id` on an accepted WebSocket, as `{"id": ..., "event": ...}`."""
+    try:
+        async for event in events.aread(last_event_id):
+            if event is not None:
+                await websocket.send_text(f'{{"id":"{event.id}","event":{event.data}}}')
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket of run {events.run_id} disconnected")
+
+
 async def handle_exceptions(
     awaitable: Awaitable[Any],
     stream_handler: AsyncIteratorCallbackHandler,
@@ -65,6 +131,9 @@ async def handle_exceptions(
     except AgentCancelledException as e:
         logger.exception(repr(e))
         await stream_handler.on_llm_error(error=e)
+    except asyncio.CancelledError:
+        logger.info("Agent run cancelled")
+        await stream_handler.on_llm_error(error=AgentCancelledException("The agent is cancelled."))
     except Exception as e:
         logger.exception(e)
         await stream_handler.on_llm_error(error=e)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Replay buffer of the streaming data of agent runs.
+
+The streaming data of a run is published to a Redis stream (`agent_run_events:<run_id>`), bounded to
+`RUN_EVENTS_MAX_LEN` entries and expiring `RUN_EVENTS_TTL` seconds after the last event. The Redis entry ids are the
+event ids: they increase monotonically within a run, so a client that lost its connection resumes after the last
+event id it received (`Last-Event-ID`) without running the agent again. The publisher runs in the background,
+independently of the client connection, and ends the stream with an end marker once the run is done.
+
+The user who started the run is stored next to the stream (`agent_run_events:<run_id>:owner`, same expiry) when the
+run is started or enqueued, only that user can read the events. It also tells that a run exists before its first
+event, e.g. while it waits in the run queue. Readers wait for events with blocking reads on their own Redis pool (see
+`get_redis_blocking_client`), each reader holds a connection while it waits.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, NamedTuple, Optional, Set
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.schemas.streaming_schema import StreamingData
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.StreamingJsonListResponse import encode_item
+
+logger = logging.getLogger(__name__)
+
+RUN_EVENTS_KEY_PREFIX = "agent_run_events"
+END_FIELD = "end"
+DATA_FIELD = "data"
+
+
+class RunEvent(NamedTuple):
+    id: str
+    data: str
+    """The streaming data encoded as JSON."""
+
+
+class RunEventStream:
+    """Bounded Redis stream of the events of a run."""
+
+    def __init__(
+        self,
+        run_id: str,
+        redis_client: Optional[Redis] = None,
+        max_len: Optional[int] = None,
+        ttl: Optional[int] = None,
+        blocking_redis_client: Optional[Redis] = None,
+    ) -> None:
+        self.run_id = run_id
+        self.redis_client = redis_client
+        # a given client is also used for the blocking reads
+        self.blocking_redis_client = blocking_redis_client if blocking_redis_client is not None else redis_client
+        self.max_len = max_len if max_len is not None else settings.RUN_EVENTS_MAX_LEN
+        self.ttl = ttl if ttl is not None else settings.RUN_EVENTS_TTL
+
+    @property
+    def key(
+        self,
+    ) -> str:
+        return f"{RUN_EVENTS_KEY_PREFIX}:{self.run_id}"
+
+    @property
+    def owner_key(
+        self,
+    ) -> str:
+        return f"{self.key}:owner"
+
+    async def _aget_redis(
+        self,
+    ) -> Redis:
+        if self.redis_client is None:
+            from app.api.deps import get_redis_client  # pylint: disable=import-outside-toplevel
+
+            self.redis_client = await get_redis_client()
+        return self.redis_client
+
+    async def _aget_blocking_redis(
+        self,
+    ) -> Redis:
+        if self.blocking_redis_client is None:
+            from app.api.deps import get_redis_blocking_client  # pylint: disable=import-outside-toplevel
+
+            self.blocking_redis_client = await get_redis_blocking_client()
+        return self.blocking_redis_client
+
+    async def _aadd(self, fields: dict[str, str]) -> str:
+        redis_client = await self._aget_redis()
+        async with redis_client.pipeline(transaction=False) as pipeline:
+            pipeline.xadd(self.key, fields, maxlen=self.max_len, approximate=True)
+            pipeline.expire(self.key, self.ttl)
+            pipeline.expire(self.owner_key, self.ttl)
+            event_id, _, _ = await pipeline.execute()
+        return event_id
+
+    async def aset_owner(
+        self,
+        owner: Optional[str],
+    ) -> None:
+        """
+        Record the user who started the run (None without authentication), before its events are published.
+
+        Runs without owner are recorded with an empty owner, so that they exist before their first event.
+        """
+        redis_client = await self._aget_redis()
+        await redis_client.set(self.owner_key, owner or "", ex=self.ttl)
+
+    async def ais_owned_by(
+        self,
+        user: Optional[str],
+    ) -> bool:
+        """Whether the events can be read by the user, runs started without authentication have no owner."""
+        redis_client = await self._aget_redis()
+        return (await redis_client.get(self.owner_key) or None) == user
+
+    async def apublish(
+        self,
+        item: StreamingData,
+    ) -> str:
+        """Append the streaming data to the run events, returns its event id."""
+        return await self._aadd({DATA_FIELD: encode_item(item).decode("utf-8")})
+
+    async def aclose(
+        self,
+    ) -> None:
+        """Mark the end of the run, readers stop there."""
+        await self._aadd({END_FIELD: "1"})
+
+    async def aexists(
+        self,
+    ) -> bool:
+        """Whether the run exists: started or enqueued (see `aset_owner`), or with events."""
+        redis_client = await self._aget_redis()
+        return bool(await redis_client.exists(self.owner_key, self.key))
+
+    async def ahas_events(
+        self,
+    ) -> bool:
+        """Whether events were published for the run, e.g. by a worker that died before the end of the run."""
+        redis_client = await self._aget_redis()
+        return bool(await redis_client.exists(self.key))
+
+    async def aread(
+        self,
+        last_event_id: Optional[str] = None,
+        block: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+    ) -> AsyncIterator[Optional[RunEvent]]:
+        """
+        Read the events after `last_event_id` (from the start if None) until the end of the run.
+
+        Args:
+            last_event_id (Optional[str]): The id of the last event received by the client.
+            block (Optional[float]): Seconds to wait for new events before yielding None (a heartbeat).
+            idle_timeout (Optional[float]): Seconds without events after which the run is considered lost, from the
+                first event: a queued run has no events until a worker starts it, the reader then waits up to the
+                expiry of the events (`ttl`).
+
+        Yields:
+            Optional[RunEvent]: The events, None when no event arrived for `block` seconds.
+        """
+        block = block if block is not None else settings.RUN_EVENTS_HEARTBEAT_INTERVAL
+        idle_timeout = idle_timeout if idle_timeout is not None else settings.RUN_EVENTS_IDLE_TIMEOUT
+        redis_client = await self._aget_blocking_redis()
+        timeout = idle_timeout if last_event_id else self.ttl
+        last_event_id = last_event_id or "0"
+        last_event_time = time.monotonic()
+        while True:
+            response = await redis_client.xread({self.key: last_event_id}, count=100, block=int(block * 1000))
+            entries = response[0][1] if response else []
+            if not entries:
+                if time.monotonic() - last_event_time > timeout:
+                    logger.warning(f"No events of run {self.run_id} for {timeout}s, stop reading")
+                    return
+                yield None
+                continue
+            timeout = idle_timeout
+            last_event_time = time.monotonic()
+            for event_id, fields in entries:
+                if END_FIELD in fields:
+                    return
+                last_event_id = event_id
+                yield RunEvent(event_id, fields[DATA_FIELD])
+
+
+async def apublish_run_events(
+    stream_handler: AsyncIteratorCallbackHandler,
+    events: RunEventStream,
+) -> None:
+    """Publish the streaming data of a run until it is done, an event that cannot be published is dropped."""
+    async for item in stream_handler.aiter():
+        try:
+            await events.apublish(item)
+        except Exception as e:
+            logger.warning(f"Could not publish an event of run {events.run_id}: {repr(e)}")
+    try:
+        await events.aclose()
+    except Exception as e:
+        logger.error(f"Could not close the events of run {events.run_id}: {repr(e)}")
+
+
+_publishers: Set[asyncio.Task] = set()
+
+
+def start_run_event_publisher(
+    stream_handler: AsyncIteratorCallbackHandler,
+    events: RunEventStream,
+) -> asyncio.Task:
+    """
+    Publish the events of a run in the background.
+
+    The task is not attached to the run (see `start_run`): when the run is cancelled, the publisher still publishes
+    the cancellation error and the end of the run.
+    """
+    task = asyncio.create_task(apublish_run_events(stream_handler, events))
+    _publishers.add(task)
+    task.add_done_callback(_publishers.discard)
+    return task
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Queue of the streaming data of an agent run, with the tokens of an LLM run coalesced into frames.
+
+Consecutive tokens of the same LLM run are appended to one frame instead of being queued one by one, a frame is
+sent as a single `StreamingData` (the concatenated tokens, the metadata of its first token). The consumer holds
+back the last open frame for up to `frame_interval` seconds (or until it reaches `max_frame_size` characters), so
+a stream sends at most a few dozen LLM items per second whatever the token rate. Clients concatenate the data of
+consecutive LLM items, the wire format is unchanged.
+
+The queue has a single consumer, which waits on one future instead of racing a get and a done task per item.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
+
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum
+
+
+class TokenFrame:
+    """Consecutive tokens of an LLM run."""
+
+    __slots__ = ("run_id", "tokens", "size", "metadata", "created_at")
+
+    def __init__(
+        self,
+        run_id: Any,
+        token: str,
+        metadata: Dict[str, Any],
+        created_at: float,
+    ) -> None:
+        self.run_id = run_id
+        self.tokens: List[str] = [token]
+        self.size = len(token)
+        self.metadata = metadata
+        self.created_at = created_at
+
+    def append(
+        self,
+        token: str,
+    ) -> None:
+        self.tokens.append(token)
+        self.size += len(token)
+
+    def to_streaming_data(
+        self,
+    ) -> StreamingData:
+        return StreamingData(data="".join(self.tokens), data_type=StreamingDataTypeEnum.LLM, metadata=self.metadata)
+
+
+class StreamQueue:
+    """Single-consumer queue of streaming data coalescing LLM tokens into frames, closed at the end of the run."""
+
+    def __init__(
+        self,
+        frame_interval: float = 0.02,
+        max_frame_size: int = 512,
+    ) -> None:
+        self.frame_interval = frame_interval
+        self.max_frame_size = max_frame_size
+        self._items: Deque[Union[StreamingData, TokenFrame]] = deque()
+        self._waiter: Optional[asyncio.Future[None]] = None
+        self._closed = False
+
+    def _wake_up(
+        self,
+    ) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def put_nowait(
+        self,
+        item: StreamingData,
+    ) -> None:
+        self._items.append(item)
+        self._wake_up()
+
+    def put_token(
+        self,
+        token: str,
+        run_id: Any,
+        get_metadata: Callable[[], Dict[str, Any]],
+    ) -> None:
+        """Append a token to the open frame of its LLM run, or open a new frame (`get_metadata` is only called then)."""
+        last = self._items[-1] if self._items else None
+        if isinstance(last, TokenFrame) and last.run_id == run_id and last.size < self.max_frame_size:
+            last.append(token)
+            return
+        self._items.append(TokenFrame(run_id, token, get_metadata(), asyncio.get_running_loop().time()))
+        self._wake_up()
+
+    def close(
+        self,
+    ) -> None:
+        """No more data is expected, the consumer drains the queue and stops."""
+        self._closed = True
+        self._wake_up()
+
+    def qsize(
+        self,
+    ) -> int:
+        return len(self._items)
+
+    def empty(
+        self,
+    ) -> bool:
+        return not self._items
+
+    def get_nowait(
+        self,
+    ) -> StreamingData:
+        if not self._items:
+            raise asyncio.QueueEmpty()
+        item = self._items.popleft()
+        return item.to_streaming_data() if isinstance(item, TokenFrame) else item
+
+    async def get(
+        self,
+    ) -> Optional[StreamingData]:
+        """Get the next item, None once the queue is closed and drained."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._items:
+                head = self._items[0]
+                # the frame still receives tokens while it is the last item
+                if isinstance(head, TokenFrame) and len(self._items) == 1 and not self._closed:
+                    delay = head.created_at + self.frame_interval - loop.time()
+                    if delay > 0 and head.size < self.max_frame_size:
+                        await asyncio.sleep(delay)
+                        continue
+                return self.get_nowait()
+            if self._closed:
+                return None
+            self._waiter = loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
@@ -2,13 +2,20 @@
 import json
 import time
 from typing import Any
+from unittest.mock import AsyncMock, patch
 
 import pytest
+from fastapi import status
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 
+from app.api.deps import get_jwt
+from app.core.config import settings
+from app.main import app
 from app.schemas.message_schema import IChatMessage, IChatQuery, ICreatorRole
 from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum, StreamingSignalsEnum
 from app.utils import uuid7
+from tests.fake.redis import FakeRedis
 
 
 @pytest.fixture
@@ -82,3 +89,75 @@ async def test_chat(test_client: TestClient, chat_query: dict[str, Any]):  # pyl
         time.sleep(0.1)  # Wait a bit before reading the next line
 
     assert len(response_data) == 5
+
+
+def parse_sse(body: str) -> list[dict[str, str]]:
+    return [dict(line.split(": ", 1) for line in frame.split("\n")) for frame in body.strip().split("\n\n")]
+
+
+@pytest.fixture
+def fake_run_events_redis():
+    redis = FakeRedis()
+    with patch("app.api.deps.get_redis_client", new_callable=AsyncMock, return_value=redis), patch(
+        "app.api.deps.get_redis_blocking_client", new_callable=AsyncMock, return_value=redis
+    ):
+        yield redis
+
+
+def test_chat_event_stream_resumes_after_last_event_id(
+    test_client: TestClient, chat_query: dict[str, Any], fake_run_events_redis: FakeRedis
+):  # pylint: disable=redefined-outer-name,unused-argument
+    response = test_client.post("api/v1/chat/agent", json=chat_query, headers={"Accept": "text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    data = [json.loads(event["data"]) for event in events]
+    assert data[0]["data"] == StreamingSignalsEnum.START.value
+    assert data[-1]["data"] == StreamingSignalsEnum.END.value
+    ids = [tuple(map(int, event["id"].split("-"))) for event in events]
+    assert ids == sorted(set(ids))
+
+    run_id = data[0]["metadata"]["run_id"]
+    resumed = test_client.get(f"api/v1/chat/run/{run_id}/events", headers={"Last-Event-ID": events[1]["id"]})
+    assert parse_sse(resumed.text) == events[2:]
+
+    with test_client.websocket_connect(f"api/v1/chat/run/{run_id}/ws?last_event_id={events[1]['id']}") as ws:
+        assert [ws.receive_json() for _ in events[2:]] == [
+            {"id": event["id"], "event": json.loads(event["data"])} for event in events[2:]
+        ]
+
+    assert test_client.get("api/v1/chat/run/unknown/events").status_code == 404
+
+
+def test_run_events_are_only_readable_by_the_run_owner(
+    test_client: TestClient, chat_query: dict[str, Any], fake_run_events_redis: FakeRedis
+):  # pylint: disable=redefined-outer-name
+    app.dependency_overrides[get_jwt] = lambda: {"sub": "alice"}
+    response = test_client.post("api/v1/chat/agent", json=chat_query, headers={"Accept": "text/event-stream"})
+    run_id = response.headers["X-Run-Id"]
+    assert fake_run_events_redis.store[f"agent_run_events:{run_id}:owner"] == "alice"
+    assert test_client.get(f"api/v1/chat/run/{run_id}/events").status_code == 200
+
+    app.dependency_overrides[get_jwt] = lambda: {"sub": "bob"}
+    assert test_client.get(f"api/v1/chat/run/{run_id}/events").status_code == 403
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with test_client.websocket_connect(f"api/v1/chat/run/{run_id}/ws"):
+            pass
+    assert disconnect.value.code == status.WS_1008_POLICY_VIOLATION
+
+
+def test_queued_runs_can_be_reconnected_before_their_first_event(
+    test_client: TestClient, chat_query: dict[str, Any], fake_run_events_redis: FakeRedis
+):  # pylint: disable=redefined-outer-name,unused-argument
+    # no agent worker: the readers stop waiting for the first event after the (zero) expiry of the events
+    with patch.object(settings, "RUN_QUEUE_ENABLED", True), patch.object(settings, "RUN_EVENTS_TTL", 0), patch.object(
+        settings, "RUN_EVENTS_HEARTBEAT_INTERVAL", 0.01
+    ):
+        response = test_client.post("api/v1/chat/agent", json=chat_query, headers={"Accept": "text/event-stream"})
+        run_id = response.headers["X-Run-Id"]
+        assert f"agent_run_events:{run_id}" not in fake_run_events_redis.store
+
+        assert test_client.get(f"api/v1/chat/run/{run_id}/events").status_code == 200
+        with test_client.websocket_connect(f"api/v1/chat/run/{run_id}/ws") as websocket:
+            with pytest.raises(WebSocketDisconnect) as disconnect:
+                websocket.receive_text()
+        assert disconnect.value.code == status.WS_1000_NORMAL_CLOSURE
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException, status
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_jwt
+from app.main import app
+
+
+def test_invalidating_the_sql_cache_requires_authentication(test_client: TestClient):
+    def reject() -> None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    with patch("app.api.v1.endpoints.sql.publish_invalidation", new_callable=AsyncMock) as publish_invalidation:
+        app.dependency_overrides[get_jwt] = reject
+        assert test_client.post("api/v1/sql/cache/invalidate").status_code == status.HTTP_401_UNAUTHORIZED
+        publish_invalidation.assert_not_awaited()
+
+        app.dependency_overrides[get_jwt] = lambda: {}
+        assert test_client.post("api/v1/sql/cache/invalidate").status_code == status.HTTP_200_OK
+        publish_invalidation.assert_awaited_once_with(None)
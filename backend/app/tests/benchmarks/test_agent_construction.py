@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Per-request construction cost of the meta agent: full build vs. process-level registry."""
+import pytest
+from langchain.base_language import BaseLanguageModel
+
+from app.schemas.agent_schema import AgentConfig
+from app.services.chat_agent.agent_registry import MetaAgentRegistry
+from app.services.chat_agent.meta_agent import create_meta_agent
+from tests.benchmarks.utils import bench
+
+
+@pytest.mark.benchmark
+def test_agent_construction(agent_config: AgentConfig, llm: BaseLanguageModel):
+    def get_llm_hook(type, key):  # pylint: disable=unused-argument,redefined-builtin
+        return llm
+
+    before = bench(
+        "create_meta_agent (per request)",
+        lambda: create_meta_agent(agent_config=agent_config, get_llm_hook=get_llm_hook),
+    )
+    registry = MetaAgentRegistry(agent_config, get_llm_hook=get_llm_hook)
+    after = bench("MetaAgentRegistry.get_executor", registry.get_executor)
+    print(f"speedup: {before / after:.1f}x")
+    assert after < before
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Chunking of a large CSV corpus: splitter per row plus a second split of every document vs. one chunking pass."""
+import random
+from typing import List
+
+import pytest
+from langchain.schema import Document
+from langchain.text_splitter import TokenTextSplitter
+
+from app.db.vector_db_chunking import DocumentChunker
+from tests.benchmarks.utils import bench
+
+NB_ROWS = 5000
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
+
+
+def csv_rows() -> List[Document]:
+    random.seed(0)
+    words = "invoice customer revenue quarter product region growth margin forecast report".split()
+    return [
+        Document(
+            page_content=" ".join(random.choices(words, k=random.choice([20, 60, 200, 3000]))),
+            metadata={"source": "corpus.csv", "type": "csv", "row": str(i)},
+        )
+        for i in range(NB_ROWS)
+    ]
+
+
+def split_twice(rows: List[Document]) -> List[Document]:
+    """Former pipeline: a new splitter per row when loading, then a second split of all documents."""
+    documents = []
+    for row in rows:
+        splitter = TokenTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, encoding_name="cl100k_base")
+        documents.extend(splitter.split_documents([row]))
+    splitter = TokenTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, encoding_name="cl100k_base")
+    return splitter.split_documents(documents)
+
+
+@pytest.mark.benchmark
+def test_chunking_large_csv():
+    rows = csv_rows()
+    chunker = DocumentChunker(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    assert len(chunker.split_documents(rows)) == len(split_twice(rows))
+
+    before = bench(f"split per row + second split ({NB_ROWS} rows)", lambda: split_twice(rows), iterations=3, warmup=1)
+    after = bench(f"DocumentChunker ({NB_ROWS} rows)", lambda: chunker.split_documents(rows), iterations=3, warmup=1)
+    print(f"speedup: {before / after:.1f}x")
+    assert after < before
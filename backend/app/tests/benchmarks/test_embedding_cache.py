@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Embedding cache: JSON floats in a byte store (one lookup per text) vs. the two tier float32 cache."""
+import json
+
+import numpy as np
+import pytest
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import InMemoryByteStore
+
+from app.services.chat_agent.helpers.embedding_cache import CacheBackedEmbeddingsExtended, EmbeddingCache
+from tests.benchmarks.utils import bench
+from tests.fake.embeddings import FakeEmbeddingProvider
+from tests.fake.redis import FakeSyncRedis
+
+DIMENSIONS = 1536
+NB_TEXTS = 64
+
+
+@pytest.mark.benchmark
+def test_embedding_cache_payload_and_hits():
+    vector = FakeEmbeddingProvider(size=DIMENSIONS)._embed("text")
+    json_size = len(json.dumps(vector).encode())
+    float32_size = len(np.asarray(vector, dtype=np.float32).tobytes())
+    print(
+        f"\npayload per vector: json={json_size} bytes float32={float32_size} bytes ({json_size / float32_size:.1f}x)"
+    )
+
+    texts = [f"chunk {i}" for i in range(NB_TEXTS)]
+    json_store = CacheBackedEmbeddings.from_bytes_store(FakeEmbeddingProvider(size=DIMENSIONS), InMemoryByteStore())
+    json_store.embed_documents(texts)
+    two_tier_redis = CacheBackedEmbeddingsExtended(
+        FakeEmbeddingProvider(size=DIMENSIONS), EmbeddingCache(namespace="bench", redis_client=FakeSyncRedis())
+    )
+    two_tier_redis.embed_documents(texts)
+    redis_only = CacheBackedEmbeddingsExtended(
+        FakeEmbeddingProvider(size=DIMENSIONS),
+        EmbeddingCache(namespace="bench", redis_client=two_tier_redis.cache.redis_client, max_size=0),
+    )
+
+    json_mean = bench(f"json byte store, {NB_TEXTS} hits", lambda: json_store.embed_documents(texts))
+    redis_mean = bench(f"float32 redis tier, {NB_TEXTS} hits", lambda: redis_only.embed_documents(texts))
+    memory_mean = bench(f"float32 memory tier, {NB_TEXTS} hits", lambda: two_tier_redis.embed_documents(texts))
+    assert float32_size * 4 <= json_size
+    assert memory_mean < json_mean
+    assert redis_mean < json_mean
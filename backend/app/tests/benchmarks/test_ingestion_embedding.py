@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Ingestion embedding throughput: one request per chunk vs. concurrent batches, with an offline fake provider."""
+import time
+
+import pytest
+
+from app.db.vector_db_embedding import BatchEmbedder
+from tests.benchmarks.utils import run
+from tests.fake.embeddings import FakeEmbeddingProvider
+
+NB_CHUNKS = 2000
+
+
+def throughput(embedder: BatchEmbedder, name: str) -> float:
+    texts = [f"chunk {i} " * 50 for i in range(NB_CHUNKS)]
+    start = time.perf_counter()
+    vectors = run(embedder.aembed_documents(texts))
+    chunks_per_second = len(vectors) / (time.perf_counter() - start)
+    print(f"\n{name:<48} {chunks_per_second:9.1f} chunks/s")
+    return chunks_per_second
+
+
+@pytest.mark.benchmark
+def test_ingestion_embedding_throughput():
+    # ~ latency profile of a hosted embedding API: fixed cost per request plus a small cost per input
+    def provider() -> FakeEmbeddingProvider:
+        return FakeEmbeddingProvider(size=1536, request_latency=0.02, text_latency=0.0005, max_batch_size=16)
+
+    one_per_request = throughput(
+        BatchEmbedder(provider(), batch_size=1, max_concurrency=1),
+        "one chunk per request (chunk_size=1)",
+    )
+    batched = throughput(
+        BatchEmbedder(provider(), batch_size=16, max_concurrency=8),
+        "batches of 16, 8 concurrent requests",
+    )
+    print(f"speedup: {batched / one_per_request:.1f}x")
+    assert batched > 10 * one_per_request
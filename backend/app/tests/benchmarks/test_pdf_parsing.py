@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""Ingestion throughput (pages/s, chunks/s): files parsed in one worker thread vs. a process pool."""
+import asyncio
+import os
+from pathlib import Path
+
+import fitz
+import pytest
+
+from app.db.vector_db_pdf_ingestion import IngestionStats
+from app.schemas.ingestion_schema import IndexingConfig
+from tests.fake.pdf_pipeline import FakeVectorWriter, OfflinePDFExtractionPipeline
+
+NB_FILES = 24
+NB_PAGES = 20
+
+
+def make_corpus(path: Path) -> None:
+    text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 30
+    for i in range(NB_FILES):
+        document = fitz.open()
+        for _ in range(NB_PAGES):
+            document.new_page().insert_textbox(fitz.Rect(36, 36, 560, 800), text, fontsize=9)
+        document.save(path / f"document_{i}.pdf")
+
+
+def ingest(path: Path, parse_workers: int) -> IngestionStats:
+    pipeline = OfflinePDFExtractionPipeline(
+        IndexingConfig(tokenizer_chunk_size=200, tokenizer_chunk_overlap=20, parse_workers=parse_workers)
+    )
+    stats = asyncio.run(pipeline._aingest(pipeline._list_files(str(path)), FakeVectorWriter()))
+    print(f"\nparse_workers={parse_workers:<3} {stats}")
+    return stats
+
+
+@pytest.mark.benchmark
+def test_parallel_pdf_parsing(tmp_path: Path):
+    make_corpus(tmp_path)
+    serial = ingest(tmp_path, parse_workers=1)
+    parallel = ingest(tmp_path, parse_workers=max(os.cpu_count() or 1, 2))
+    assert serial.nb_pages == parallel.nb_pages == NB_FILES * NB_PAGES
+    assert serial.nb_chunks == parallel.nb_chunks
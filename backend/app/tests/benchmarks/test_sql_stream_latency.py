@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Load test: latency of a token stream on the same worker while long SQL queries run."""
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import pytest
+
+from app.db.SQLDatabaseExtended import SQLDatabaseExtended
+from tests.benchmarks.utils import report, run
+
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 1500000) SELECT count(*) FROM n"
+TOKEN_INTERVAL = 0.02
+
+
+async def measure_stream_latency(query: Callable[[], Awaitable[object]], nb_queries: int = 4) -> List[float]:
+    """Emit a token every 20ms while the queries run, return how late each token was."""
+    lateness: List[float] = []
+    queries_done = asyncio.Event()
+
+    async def stream():
+        while not queries_done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TOKEN_INTERVAL)
+            lateness.append(time.perf_counter() - start - TOKEN_INTERVAL)
+
+    async def queries():
+        await asyncio.gather(*[query() for _ in range(nb_queries)])
+        queries_done.set()
+
+    await asyncio.gather(stream(), queries())
+    return lateness
+
+
+@pytest.mark.benchmark
+def test_stream_latency_during_long_sql(tmp_path: Path):
+    path = tmp_path / "bench.db"
+    sqlite3.connect(path).close()
+    database = SQLDatabaseExtended.from_uri(f"sqlite:///{path}", async_engine_args={})
+
+    async def blocking_query():
+        return database.run_no_str(SLOW_QUERY)
+
+    async def async_query():
+        return await database.arun_no_str(SLOW_QUERY)
+
+    blocking = report("stream token lateness, sync SQL in event loop", run(measure_stream_latency(blocking_query)))
+    non_blocking = report("stream token lateness, async SQL", run(measure_stream_latency(async_query)))
+    assert non_blocking < blocking
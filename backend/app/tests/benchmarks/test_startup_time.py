@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Startup cost: import time of `app.main` with the SQL tool database enabled vs. disabled."""
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from tests.benchmarks.utils import report
+
+IMPORT_APP = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+
+def import_times(env: Dict[str, str], iterations: int = 5) -> List[float]:
+    """Import `app.main` in fresh interpreters, return the import times."""
+    return [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", IMPORT_APP],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.split()[-1]
+        )
+        for _ in range(iterations)
+    ]
+
+
+@pytest.mark.benchmark
+def test_import_time_does_not_depend_on_sql_tool_db(tmp_path: Path):
+    path = tmp_path / "bench.db"
+    with sqlite3.connect(path) as connection:
+        for i in range(200):
+            connection.execute(f"CREATE TABLE table_{i} (id INTEGER PRIMARY KEY, name TEXT, value REAL)")
+    sql_tool_env = {
+        **os.environ,
+        "SQL_TOOL_DB_ENABLED": "true",
+        "SQL_TOOL_DB_URI": f"sqlite:///{path}",
+        "SQL_TOOL_DB_SCHEMAS": '["main"]',
+        "SQL_TOOL_DB_INFO_PATH": str(tmp_path / "db_info.json"),
+    }
+
+    disabled = report("import app.main, SQL tool disabled", import_times(dict(os.environ)))
+    enabled = report("import app.main, SQL tool enabled (200 tables)", import_times(sql_tool_env))
+    # the database is only introspected when the app starts
+    assert not (tmp_path / "db_info.json").exists()
+    assert enabled < disabled * 1.5
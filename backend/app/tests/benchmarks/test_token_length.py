@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Token counting over growing chat histories: tiktoken per call vs. memoized encoder, LRU and batch API."""
+from pathlib import Path
+from typing import List
+
+import pytest
+import tiktoken
+
+from app.services.chat_agent.helpers.llm import get_token_length, get_token_lengths
+from tests.benchmarks.utils import bench
+
+TUTORIAL_DATA = Path(__file__).parents[2] / "app" / "tool_constants" / "tutorial_data"
+
+
+def _chat_history(nb_messages: int = 40) -> List[str]:
+    """Paragraphs of the tutorial markdown files, used as alternating human / AI messages."""
+    paragraphs = [
+        paragraph.strip()
+        for path in sorted(TUTORIAL_DATA.glob("*.md"))
+        for paragraph in path.read_text(encoding="utf-8").split("\n\n")
+        if len(paragraph.strip()) > 40
+    ]
+    return [paragraphs[i % len(paragraphs)] for i in range(nb_messages)]
+
+
+def _count_turns_uncached(history: List[str]) -> int:
+    # baseline: the encoder is resolved on every call and the whole history is re-counted every turn
+    total = 0
+    for turn in range(1, len(history) + 1):
+        total += sum(len(tiktoken.encoding_for_model("gpt-4").encode(m)) for m in history[:turn])
+    return total
+
+
+def _count_turns_cached(history: List[str]) -> int:
+    total = 0
+    for turn in range(1, len(history) + 1):
+        total += sum(get_token_length(m) for m in history[:turn])
+    return total
+
+
+def _count_turns_batched(history: List[str]) -> int:
+    total = 0
+    for turn in range(1, len(history) + 1):
+        total += sum(get_token_lengths(history[:turn]))
+    return total
+
+
+@pytest.mark.benchmark
+def test_token_length():
+    history = _chat_history()
+    assert _count_turns_uncached(history) == _count_turns_cached(history) == _count_turns_batched(history)
+
+    before = bench("tiktoken.encoding_for_model + encode", lambda: _count_turns_uncached(history), iterations=10)
+    cached = bench("get_token_length (memoized + LRU)", lambda: _count_turns_cached(history), iterations=10)
+    batched = bench("get_token_lengths (batch + LRU)", lambda: _count_turns_batched(history), iterations=10)
+    print(f"speedup: {before / cached:.1f}x (single), {before / batched:.1f}x (batch)")
+    assert cached < before
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Load test: CPU time of concurrent token streams, one item per token vs. tokens coalesced into frames."""
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, List
+from uuid import uuid4
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.StreamingJsonListResponse import encode_item
+from tests.benchmarks.utils import run
+
+NB_STREAMS = 200
+NB_TOKENS = 200
+TOKEN_INTERVAL = 0.002
+
+
+class PerTokenHandler:
+    """The previous pipeline: a pydantic item per token, an asyncio.wait per item and json.dumps."""
+
+    def __init__(self) -> None:
+        self.queue: asyncio.Queue[StreamingData] = asyncio.Queue()
+        self.done = asyncio.Event()
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.queue.put_nowait(StreamingData(data=token, data_type=StreamingDataTypeEnum.LLM, metadata={**kwargs}))
+
+    async def finish(self) -> None:
+        self.done.set()
+
+    async def aiter(self) -> AsyncIterator[StreamingData]:
+        while not self.queue.empty() or not self.done.is_set():
+            done, other = await asyncio.wait(
+                [asyncio.ensure_future(self.queue.get()), asyncio.ensure_future(self.done.wait())],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in other:
+                task.cancel()
+            result = done.pop().result()
+            if result is True:
+                break
+            yield result
+
+    @staticmethod
+    def encode(item: StreamingData) -> bytes:
+        return json.dumps(jsonable_encoder(item.model_dump())).encode()
+
+
+class FramedHandler(AsyncIteratorCallbackHandler):
+    async def finish(self) -> None:
+        self.done.set()
+        self.queue.close()
+
+    @staticmethod
+    def encode(item: StreamingData) -> bytes:
+        return encode_item(item)
+
+
+async def stream(handler: Any) -> List[int]:
+    async def produce():
+        run_id = uuid4()
+        for i in range(NB_TOKENS):
+            await handler.on_llm_new_token(f" token{i}", run_id=run_id, tags=["agent_chat"])
+            await asyncio.sleep(TOKEN_INTERVAL)
+        await handler.finish()
+
+    async def consume():
+        return [len(handler.encode(item)) async for item in handler.aiter()]
+
+    _, sizes = await asyncio.gather(produce(), consume())
+    return sizes
+
+
+async def measure(handler_class: Any) -> tuple[float, int]:
+    start = time.process_time()
+    sizes = await asyncio.gather(*[stream(handler_class()) for _ in range(NB_STREAMS)])
+    return time.process_time() - start, sum(len(s) for s in sizes)
+
+
+@pytest.mark.benchmark
+def test_framed_streaming_uses_less_cpu():
+    per_token_cpu, per_token_items = run(measure(PerTokenHandler))
+    framed_cpu, framed_items = run(measure(FramedHandler))
+    print(f"\n{NB_STREAMS} streams x {NB_TOKENS} tokens, one token every {TOKEN_INTERVAL * 1e3:.0f}ms")
+    print(f"per token: cpu={per_token_cpu:.2f}s items={per_token_items}")
+    print(f"framed:    cpu={framed_cpu:.2f}s items={framed_items}")
+    assert framed_items < per_token_items
+    assert framed_cpu < per_token_cpu
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""Small timing helpers shared by the benchmarks."""
+import asyncio
+import statistics
+import time
+from typing import Any, Awaitable, Callable, List
+
+
+def report(name: str, timings: List[float]) -> float:
+    """Print mean / p50 / p95 in milliseconds and return the mean in seconds."""
+    timings = sorted(timings)
+    mean = statistics.mean(timings)
+    p50 = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"\n{name:<48} n={len(timings):<5} mean={mean * 1e3:9.3f}ms p50={p50 * 1e3:9.3f}ms p95={p95 * 1e3:9.3f}ms")
+    return mean
+
+
+def bench(name: str, fn: Callable[[], Any], iterations: int = 50, warmup: int = 3) -> float:
+    """Time a synchronous callable."""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return report(name, timings)
+
+
+async def abench(name: str, fn: Callable[[], Awaitable[Any]], iterations: int = 50, warmup: int = 3) -> float:
+    """Time an async callable."""
+    for _ in range(warmup):
+        await fn()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return report(name, timings)
+
+
+def run(coro: Awaitable[Any]) -> Any:
+    """Run a coroutine from a synchronous benchmark."""
+    return asyncio.run(coro)  # type: ignore
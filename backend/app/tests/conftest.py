@@ -20,6 +20,7 @@ from app.utils import uuid7
 from app.utils.config_loader import get_agent_config
 from app.utils.fastapi_globals import g
 from tests.fake.chat_model import FakeMessagesListChatModel
+from tests.fake.redis import FakeRedis
 
 
 def pytest_configure():
@@ -41,6 +42,17 @@ def mock_redis_client_sync():
         yield
 
 
+@pytest.fixture(autouse=True)
+def fake_redis_client():
+    fake_redis = FakeRedis()
+    with patch(
+        "app.services.chat_agent.helpers.conversation_memory.get_redis_client",
+        new_callable=AsyncMock,
+        return_value=fake_redis,
+    ):
+        yield fake_redis
+
+
 @pytest.fixture
 def messages() -> list:
     return [
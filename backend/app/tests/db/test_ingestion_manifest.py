@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+from pathlib import Path
+
+from app.db.ingestion_manifest import ManifestEntry, plan_ingestion
+
+
+def manifest_of(*entries: ManifestEntry):
+    return {entry.source: entry for entry in entries}
+
+
+def test_plan_ingestion(tmp_path: Path):
+    for name in ("unchanged", "touched", "edited", "moved", "deleted", "new"):
+        (tmp_path / f"{name}.txt").write_text(name, encoding="utf-8")
+    paths = {name: str(tmp_path / f"{name}.txt") for name in ("unchanged", "touched", "edited", "moved", "deleted")}
+    first = plan_ingestion({}, paths.values(), parser="PyMuPDF", chunking_config="a")
+    assert len(first.added) == 5 and first.stale_sources == list(paths.values())
+    manifest = manifest_of(*first.added)
+
+    os.utime(paths["touched"], (0, 0))
+    (tmp_path / "edited.txt").write_text("edited twice", encoding="utf-8")
+    (tmp_path / "moved.txt").rename(tmp_path / "renamed.txt")
+    (tmp_path / "deleted.txt").unlink()
+    file_paths = [str(p) for p in sorted(tmp_path.iterdir())]
+
+    plan = plan_ingestion(manifest, file_paths, parser="PyMuPDF", chunking_config="a")
+    assert [e.source for e in plan.added] == [str(tmp_path / "new.txt")]
+    assert [e.source for e in plan.changed] == [paths["edited"]]
+    assert [(source, e.source) for source, e in plan.moved] == [(paths["moved"], str(tmp_path / "renamed.txt"))]
+    assert [e.source for e in plan.touched] == [paths["touched"]]
+    assert plan.deleted == [paths["deleted"]]
+    assert plan.nb_unchanged == 1
+    assert str(plan) == "1 added, 1 changed, 1 moved, 1 deleted, 2 unchanged files"
+
+
+def test_plan_ingestion_reingests_on_config_change(tmp_path: Path):
+    (tmp_path / "a.txt").write_text("a", encoding="utf-8")
+    manifest = manifest_of(*plan_ingestion({}, [str(tmp_path / "a.txt")], parser="PyMuPDF", chunking_config="a").added)
+
+    assert not plan_ingestion(manifest, [str(tmp_path / "a.txt")], parser="PyMuPDF", chunking_config="a").to_ingest
+    assert plan_ingestion(manifest, [str(tmp_path / "a.txt")], parser="PyPDF", chunking_config="a").changed
+    assert plan_ingestion(manifest, [str(tmp_path / "a.txt")], parser="PyMuPDF", chunking_config="b").changed
+
+
+def test_failed_files_are_retried(tmp_path: Path):
+    paths = [str(tmp_path / f"{name}.txt") for name in ("parsed", "failed", "edited")]
+    for path in paths:
+        Path(path).write_text(path, encoding="utf-8")
+    parsed, failed, edited = paths
+    first = plan_ingestion({}, paths, parser="PyMuPDF", chunking_config="a").without_failed({failed})
+    manifest = manifest_of(*first.to_ingest)
+    assert set(manifest) == {parsed, edited}
+
+    Path(edited).write_text("edited", encoding="utf-8")
+    plan = plan_ingestion(manifest, paths, parser="PyMuPDF", chunking_config="a")
+    assert [e.source for e in plan.to_ingest] == [failed, edited]
+
+    # the failed files are not saved, the edited one keeps the entry of its previous version
+    manifest.update({e.source: e for e in plan.without_failed({failed, edited}).to_ingest})
+    assert manifest[edited] == first.added[1]
+    retry = plan_ingestion(manifest, paths, parser="PyMuPDF", chunking_config="a")
+    assert [e.source for e in retry.to_ingest] == [failed, edited]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.schemas.ingestion_schema import IndexingConfig
+from tests.fake.pdf_pipeline import FakeVectorWriter, OfflinePDFExtractionPipeline
+
+
+@pytest.fixture
+def corpus(tmp_path: Path) -> Path:
+    (tmp_path / "sub").mkdir()
+    for i in range(5):
+        (tmp_path / "sub" / f"note_{i}.txt").write_text(f"note {i} " * 40, encoding="utf-8")
+    (tmp_path / "rows.csv").write_text("text,author\nfirst row,a\nsecond row,b\n", encoding="utf-8")
+    (tmp_path / "image.png").write_bytes(b"")
+    return tmp_path
+
+
+@pytest.mark.parametrize("parse_workers", [1, 2])
+def test_ingestion_streams_parsed_files_to_the_writer(corpus: Path, parse_workers: int):
+    pipeline = OfflinePDFExtractionPipeline(
+        IndexingConfig(
+            tokenizer_chunk_size=50,
+            tokenizer_chunk_overlap=0,
+            parse_workers=parse_workers,
+            parse_max_in_flight=2,
+            vector_write_batch_size=4,
+        )
+    )
+    writer = FakeVectorWriter()
+
+    file_paths = pipeline._list_files(str(corpus))
+    assert len(file_paths) == 6
+    stats = asyncio.run(pipeline._aingest(file_paths, writer))
+
+    # each text file is split in 3 chunks, each csv row is one chunk
+    assert (stats.nb_files_parsed, stats.nb_pages, stats.nb_chunks) == (6, 7, 17)
+    assert len(writer.documents) == 17
+    # metadata of the parsed documents is kept on the chunks
+    assert {
+        (d.page_content, d.metadata.get("author"), d.metadata["type"])
+        for d in writer.documents
+        if "author" in d.metadata
+    } == {("first row", "a", "csv"), ("second row", "b", "csv")}
+    assert {d.metadata["type"] for d in writer.documents if "author" not in d.metadata} == {"plain text"}
+    assert {d.metadata["source"] for d in writer.documents} == set(file_paths)
+
+
+def test_ingestion_raises_parsing_errors(corpus: Path):
+    pipeline = OfflinePDFExtractionPipeline(IndexingConfig(parse_workers=1, vector_write_batch_size=1))
+    writer = FakeVectorWriter()
+
+    with patch("app.db.vector_db_pdf_ingestion.load_file", side_effect=RuntimeError("parser crashed")):
+        with pytest.raises(RuntimeError, match="parser crashed"):
+            asyncio.run(asyncio.wait_for(pipeline._aingest(pipeline._list_files(str(corpus)), writer), timeout=5))
+    assert not writer.documents
+
+
+def test_ingestion_reports_files_without_chunks(corpus: Path):
+    (corpus / "empty.txt").write_text("", encoding="utf-8")
+    (corpus / "broken.pdf").write_bytes(b"not a pdf")
+    pipeline = OfflinePDFExtractionPipeline(IndexingConfig(tokenizer_chunk_size=50, tokenizer_chunk_overlap=0))
+    writer = FakeVectorWriter()
+
+    stats = asyncio.run(pipeline._aingest(pipeline._list_files(str(corpus)), writer))
+
+    assert sorted(stats.failed_sources) == [str(corpus / "broken.pdf"), str(corpus / "empty.txt")]
+    assert (stats.nb_files_parsed, stats.nb_chunks) == (8, 17)
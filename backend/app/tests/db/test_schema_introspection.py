@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+from app.db import session
+from app.db.SQLDatabaseExtended import SQLDatabaseExtended
+
+
+def test_introspection_reuses_unchanged_tables(tmp_path: Path):
+    path = tmp_path / "test.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE artist (id INTEGER PRIMARY KEY, name TEXT)")
+        connection.execute("CREATE TABLE album (id INTEGER PRIMARY KEY, title TEXT)")
+    database_uri = f"sqlite:///{path}"
+
+    db_info = session._get_table_infos_multi_db(["main"], database_uri=database_uri, max_workers=2)
+    assert [t.name for t in db_info.tables] == ["main.album", "main.artist"]
+    assert all(t.fingerprint and "CREATE TABLE" in t.structure for t in db_info.tables)
+
+    with sqlite3.connect(path) as connection:
+        connection.execute("ALTER TABLE album ADD COLUMN year INTEGER")
+
+    get_table_info = SQLDatabaseExtended.get_table_info_no_throw
+    with patch.object(
+        SQLDatabaseExtended,
+        "get_table_info_no_throw",
+        autospec=True,
+        side_effect=get_table_info,
+    ) as introspect:
+        new_db_info = session._get_table_infos_multi_db(["main"], db_info, database_uri=database_uri, max_workers=2)
+
+    assert [call.args[1] for call in introspect.call_args_list] == [["album"]]
+    assert "year" in new_db_info.tables[0].structure
+    assert new_db_info.tables[0].fingerprint != db_info.tables[0].fingerprint
+    assert new_db_info.tables[1] == db_info.tables[1]
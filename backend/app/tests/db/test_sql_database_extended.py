@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from app.db.SQLDatabaseExtended import SQLDatabaseExtended, get_async_database_uri
+
+SLOW_QUERY = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 5000000) SELECT count(*) FROM n"
+
+
+@pytest.fixture
+def database_uri(tmp_path: Path) -> str:
+    path = tmp_path / "test.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE numbers (value INTEGER)")
+        connection.executemany("INSERT INTO numbers VALUES (?)", [(i,) for i in range(100)])
+    return f"sqlite:///{path}"
+
+
+def test_get_async_database_uri():
+    assert get_async_database_uri("postgresql://user:pw@host:5432/db") == "postgresql+asyncpg://user:pw@host:5432/db"
+    assert get_async_database_uri("postgresql+asyncpg://host/db") == "postgresql+asyncpg://host/db"
+    assert get_async_database_uri("mssql+pyodbc://host/db") is None
+
+
+@pytest.mark.asyncio
+async def test_async_execution_caps_rows(database_uri: str):
+    database = SQLDatabaseExtended.from_uri(database_uri, async_engine_args={}, max_rows=10)
+
+    columns, rows, truncated = await database.aexecute("SELECT value FROM numbers ORDER BY value")
+    assert columns == ["value"]
+    assert [row[0] for row in rows] == list(range(10))
+    assert truncated
+    assert (await database.aexecute("SELECT value FROM numbers WHERE value < 10"))[2] is False
+    assert await database.arun_no_str("SELECT count(*) FROM numbers", fetch="one") == 100
+    await database.adispose()
+
+
+@pytest.mark.asyncio
+async def test_async_execution_does_not_block_the_event_loop(database_uri: str):
+    database = SQLDatabaseExtended.from_uri(database_uri, statement_timeout=0.2)
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    with pytest.raises(asyncio.TimeoutError):
+        await database.arun_no_str(SLOW_QUERY)
+    ticker.cancel()
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_timed_out_query_is_aborted_and_releases_its_connection(database_uri: str):
+    database = SQLDatabaseExtended.from_uri(database_uri, statement_timeout=0.2)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await database.asample(SLOW_QUERY, nb_rows=1)
+    assert database._engine.pool.checkedout() == 0  # pylint: disable=protected-access
+    # the expired deadline does not outlive the statement on the pooled connection
+    assert database.run_no_str(SLOW_QUERY.replace("5000000", "50000"), fetch="one") == 50000
+
+
+@pytest.mark.asyncio
+async def test_sample_keeps_first_rows_and_counts_all(database_uri: str):
+    database = SQLDatabaseExtended.from_uri(database_uri)
+
+    sample = await database.asample("SELECT value FROM numbers ORDER BY value;", nb_rows=3)
+    assert sample is not None
+    assert sample.columns == ["value"]
+    assert [row[0] for row in sample.rows] == [0, 1, 2]
+    assert (sample.row_count, sample.row_count_exact) == (100, True)
+
+    # above the cutoff, the rows are counted by the database
+    sample = await database.asample("SELECT value FROM numbers WHERE value >= 50", nb_rows=3, count_cutoff=10)
+    assert sample is not None
+    assert [row[0] for row in sample.rows] == [50, 51, 52]
+    assert (sample.row_count, sample.row_count_exact) == (50, True)
+
+    assert await database.asample("DELETE FROM numbers WHERE value < 0", nb_rows=3) is None
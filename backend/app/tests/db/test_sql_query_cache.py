@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.db.sql_query_cache import SQLQueryCache
+from app.db.SQLDatabaseExtended import SQLDatabaseExtended
+from app.schemas.tool_schemas.sql_tool_schema import DatabaseInfo, TableInfo
+from app.utils.sql import normalize_sql
+
+
+@pytest.fixture
+def database(tmp_path: Path) -> SQLDatabaseExtended:
+    path = tmp_path / "test.db"
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE sales (value INTEGER)")
+        connection.executemany("INSERT INTO sales VALUES (?)", [(i,) for i in range(20)])
+    return SQLDatabaseExtended.from_uri(
+        f"sqlite:///{path}",
+        db_info=DatabaseInfo(tables=[TableInfo(schema_name="shop", table_name="sales", structure="")]),
+        query_cache=SQLQueryCache(),
+        query_cache_rows=100,
+    )
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT  a FROM T\nWHERE x = 007 AND y=1.50;") == "select a from t where x = 7 and y = 1.5"
+    assert normalize_sql("select 'Ab' from t where y = 2.0") == "select 'Ab' from t where y = 2.0"
+    assert normalize_sql("select 'Ab'") != normalize_sql("select 'ab'")
+
+
+def test_lru_is_bounded_by_size():
+    query_cache = SQLQueryCache(max_bytes=2000)
+    for i in range(10):
+        query_cache.set(str(i), ["value"], [(j,) for j in range(10)], 10, True, complete=True)
+    assert query_cache.size <= 2000
+    assert query_cache.get("0") is None
+    assert query_cache.get("9") is not None
+
+
+@pytest.mark.asyncio
+async def test_sample_and_execute_share_results(database: SQLDatabaseExtended):
+    sample = await database.asample("SELECT value FROM sales ORDER BY value", nb_rows=3)
+    assert sample is not None
+
+    with patch.object(SQLDatabaseExtended, "_fetch", side_effect=AssertionError("not cached")):
+        columns, rows, truncated = await database.aexecute("select value\n  from SALES order by value;")
+        cached_sample = await database.asample("select value from sales order by value", nb_rows=3)
+    assert columns == ["value"]
+    assert [row[0] for row in rows] == list(range(20))
+    assert not truncated
+    assert cached_sample == sample
+
+
+@pytest.mark.asyncio
+async def test_invalidate_schema(database: SQLDatabaseExtended):
+    await database.aexecute("SELECT value FROM sales")
+    assert database.query_cache is not None
+    assert database.query_cache.invalidate("other_schema") == 0
+    assert database.query_cache.invalidate("shop") == 1
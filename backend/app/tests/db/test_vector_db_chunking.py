@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import pytest
+from langchain.schema import Document
+from langchain.text_splitter import TokenTextSplitter
+
+from app.db.vector_db_chunking import DocumentChunker
+
+
+def test_chunks_match_token_text_splitter():
+    documents = [
+        Document(page_content="short row", metadata={"source": "a.csv", "type": "csv", "author": "a"}),
+        Document(page_content="A longer paragraph of text. " * 30, metadata={"source": "b.md", "type": "markdown"}),
+        Document(page_content="", metadata={"source": "empty.txt"}),
+    ]
+    chunker = DocumentChunker(chunk_size=40, chunk_overlap=10)
+    splitter = TokenTextSplitter(chunk_size=40, chunk_overlap=10, encoding_name="cl100k_base")
+
+    chunks = chunker.split_documents(documents)
+
+    assert [c.page_content for c in chunks] == [c.page_content for c in splitter.split_documents(documents)]
+    assert chunks[0].metadata == {"source": "a.csv", "type": "csv", "author": "a"}
+    assert all(c.metadata == {"source": "b.md", "type": "markdown"} for c in chunks[1:])
+    assert chunks[1].metadata is not documents[1].metadata
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        DocumentChunker(chunk_size=10, chunk_overlap=10)
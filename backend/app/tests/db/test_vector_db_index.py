@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import uuid
+from typing import Any, List, Optional
+
+import pytest
+
+from app.db.vector_db_index import (
+    VectorIndexManager,
+    create_index_sql,
+    full_text_index_name,
+    index_name_prefix,
+    ivfflat_lists,
+    keyword_search_sql,
+    similarity_search_sql,
+)
+from app.db.vector_db_retriever import session_settings_sql
+from app.schemas.ingestion_schema import VectorIndexConfig, VectorIndexTypeEnum
+
+COLLECTION_ID = str(uuid.uuid4())
+
+
+class FakeCursor:
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self.result: List[tuple] = []
+
+    def __enter__(self) -> "FakeCursor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def execute(self, statement: str, params: tuple = ()) -> None:
+        self.connection.statements.append(statement)
+        if statement.startswith("SELECT count(*)"):
+            self.result = [(self.connection.nb_rows,)]
+        elif statement.startswith("SELECT vector_dims"):
+            self.result = [(self.connection.dimensions,)] if self.connection.nb_rows else []
+        elif statement.startswith("SELECT indexname"):
+            prefix = params[0].rstrip("%")
+            self.result = [(index_name,) for index_name in self.connection.indexes if index_name.startswith(prefix)]
+        elif statement.startswith("DROP INDEX") and statement.split('"')[1] in self.connection.indexes:
+            self.connection.indexes.remove(statement.split('"')[1])
+        elif statement.startswith("CREATE INDEX") and statement.split()[5] not in self.connection.indexes:
+            self.connection.indexes.append(statement.split()[5])
+
+    def fetchone(self) -> Optional[tuple]:
+        return self.result[0] if self.result else None
+
+    def fetchall(self) -> List[tuple]:
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, nb_rows: int = 0, dimensions: int = 1536, indexes: Optional[List[str]] = None):
+        self.nb_rows = nb_rows
+        self.dimensions = dimensions
+        self.indexes = indexes or []
+        self.statements: List[str] = []
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def ddl(self) -> List[str]:
+        return [s for s in self.statements if s.startswith(("CREATE INDEX", "DROP INDEX"))]
+
+
+def test_ivfflat_lists():
+    assert ivfflat_lists(0) == 1
+    assert ivfflat_lists(50_000) == 50
+    assert ivfflat_lists(4_000_000) == 2000
+
+
+def test_create_index_sql_is_a_partial_expression_index():
+    statement = create_index_sql(COLLECTION_ID, 1536, VectorIndexConfig(), nb_rows=10_000)
+    assert statement.startswith(f"CREATE INDEX IF NOT EXISTS {index_name_prefix(COLLECTION_ID)}hnsw ")
+    assert "USING hnsw ((embedding::vector(1536)) vector_cosine_ops) WITH (m = 16, ef_construction = 64)" in statement
+    assert statement.endswith(f"WHERE collection_id = '{COLLECTION_ID}'")
+
+    ivfflat = VectorIndexConfig(index_type=VectorIndexTypeEnum.IVFFlat)
+    assert "WITH (lists = 10)" in create_index_sql(COLLECTION_ID, 1536, ivfflat, nb_rows=10_000)
+
+
+def test_create_index_sql_rejects_invalid_collection_ids():
+    with pytest.raises(ValueError):
+        create_index_sql("'; DROP TABLE langchain_pg_embedding; --", 1536, VectorIndexConfig(), nb_rows=0)
+
+
+def test_similarity_search_sql_matches_the_index_expression():
+    statement = similarity_search_sql(COLLECTION_ID, 1536)
+    assert "(embedding::vector(1536)) <=>" in statement
+    assert f"WHERE collection_id = '{COLLECTION_ID}'" in statement
+
+
+def test_keyword_search_sql_matches_the_full_text_index():
+    statement = keyword_search_sql(COLLECTION_ID, "english")
+    assert "to_tsvector('english', document) @@ query" in statement
+    assert f"WHERE collection_id = '{COLLECTION_ID}'" in statement
+
+    with pytest.raises(ValueError):
+        keyword_search_sql(COLLECTION_ID, "english'); --")
+
+
+def test_session_settings_sql():
+    assert session_settings_sql() == []
+    assert session_settings_sql(ef_search=100, probes=10) == ["SET hnsw.ef_search = 100", "SET ivfflat.probes = 10"]
+
+
+def test_first_load_builds_the_index_after_the_load():
+    connection = FakeConnection(nb_rows=0)
+    manager = VectorIndexManager(connection, COLLECTION_ID, VectorIndexConfig())
+
+    manager.before_load(load_fraction=1.0)
+    connection.nb_rows = 5000
+    manager.after_load(nb_rows_written=5000)
+
+    assert connection.indexes == [
+        f"{index_name_prefix(COLLECTION_ID)}hnsw",
+        full_text_index_name(COLLECTION_ID, "english"),
+    ]
+    assert "ANALYZE langchain_pg_embedding" in connection.statements
+
+
+def test_bulk_load_drops_and_rebuilds_the_index():
+    hnsw_index = f"{index_name_prefix(COLLECTION_ID)}hnsw"
+    connection = FakeConnection(nb_rows=1000, indexes=[hnsw_index])
+    manager = VectorIndexManager(connection, COLLECTION_ID, VectorIndexConfig())
+
+    manager.before_load(load_fraction=0.5)
+    assert manager.existing_indexes() == []
+    manager.after_load(nb_rows_written=1000)
+    assert manager.existing_indexes() == [hnsw_index]
+
+
+def test_small_load_updates_the_hnsw_index_in_place():
+    hnsw_index = f"{index_name_prefix(COLLECTION_ID)}hnsw"
+    connection = FakeConnection(nb_rows=1000, indexes=[hnsw_index])
+    manager = VectorIndexManager(connection, COLLECTION_ID, VectorIndexConfig())
+
+    manager.before_load(load_fraction=0.01)
+    manager.after_load(nb_rows_written=10)
+
+    assert not any(statement.startswith("DROP INDEX") for statement in connection.ddl())
+    assert manager.existing_indexes() == [hnsw_index]
+
+
+def test_ivfflat_index_is_rebuilt_after_a_large_load():
+    ivfflat_index = f"{index_name_prefix(COLLECTION_ID)}ivfflat"
+    connection = FakeConnection(nb_rows=1000, indexes=[ivfflat_index])
+    config = VectorIndexConfig(index_type=VectorIndexTypeEnum.IVFFlat, rebuild_fraction=0.2)
+    manager = VectorIndexManager(connection, COLLECTION_ID, config)
+
+    manager.after_load(nb_rows_written=500)
+
+    assert connection.ddl()[0] == f'DROP INDEX IF EXISTS "{ivfflat_index}"'
+    assert manager.existing_indexes() == [ivfflat_index]
+
+
+def test_changing_the_index_type_replaces_the_index():
+    connection = FakeConnection(nb_rows=1000, indexes=[f"{index_name_prefix(COLLECTION_ID)}ivfflat"])
+    manager = VectorIndexManager(connection, COLLECTION_ID, VectorIndexConfig())
+
+    manager.after_load(nb_rows_written=0)
+
+    assert manager.existing_indexes() == [f"{index_name_prefix(COLLECTION_ID)}hnsw"]
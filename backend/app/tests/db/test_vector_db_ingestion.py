@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import csv
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from langchain.schema import Document
+
+from app.db.vector_db_embedding import BatchEmbedder, RateLimiter
+from app.db.vector_db_writer import COPY_EMBEDDINGS_STATEMENT, PGVectorCopyWriter, format_vector
+from tests.fake.embeddings import FakeEmbeddingProvider
+
+
+@pytest.mark.asyncio
+async def test_batches_are_concurrent_and_in_order():
+    provider = FakeEmbeddingProvider(request_latency=0.01, max_batch_size=16)
+    embedder = BatchEmbedder(provider, batch_size=16, max_concurrency=4)
+    texts = [f"text {i}" for i in range(100)]
+
+    offsets = [offset async for offset, _ in embedder.aembed_batches(texts)]
+    assert offsets == list(range(0, 100, 16))
+    assert await embedder.aembed_documents(texts) == [provider._embed(text) for text in texts]
+    assert provider.nb_requests == 2 * 7
+    assert provider.max_in_flight == 4
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_requests():
+    rate_limiter = RateLimiter(requests_per_minute=60 * 50)
+    start = time.monotonic()
+    await asyncio.gather(*[rate_limiter.acquire() for _ in range(6)])
+    assert time.monotonic() - start >= 5 / 50
+
+
+def test_copy_writer_writes_one_csv_copy():
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    writer = PGVectorCopyWriter(connection, collection_id="collection")
+    documents = [
+        Document(page_content='a "quoted",\nmultiline\x00 text', metadata={"source": "a.pdf", "page": 1}),
+        Document(page_content="b", metadata={}),
+    ]
+
+    assert writer.write(documents, [[0.5, 1.0], [0.25, 0.0]], ids=["a", "b"]) == 2
+
+    statement, buffer = cursor.copy_expert.call_args.args
+    assert statement == COPY_EMBEDDINGS_STATEMENT
+    rows = list(csv.reader(buffer.getvalue().splitlines(keepends=True)))
+    assert [row[1:] for row in rows] == [
+        ["collection", "[0.5,1.0]", 'a "quoted",\nmultiline text', json.dumps({"source": "a.pdf", "page": 1}), "a"],
+        ["collection", "[0.25,0.0]", "b", "{}", "b"],
+    ]
+    connection.commit.assert_called_once()
+    assert format_vector([1, 2.5]) == "[1,2.5]"
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import json
+from typing import List, Sequence, Tuple
+
+import pytest
+from langchain.schema import Document
+
+from app.db.vector_db_retriever import (
+    PGVectorAsyncRetriever,
+    PGVectorAsyncStore,
+    reciprocal_rank_fusion,
+    to_document,
+)
+from tests.fake.embeddings import FakeEmbeddingProvider
+
+
+class RecordingStore(PGVectorAsyncStore):
+    def __init__(self, keyword_results: Sequence[str] = ()):  # pylint: disable=super-init-not-called
+        self.searches: List[Tuple[Sequence[float], int]] = []
+        self.keyword_searches: List[Tuple[str, int]] = []
+        self.keyword_results = keyword_results
+
+    async def asimilarity_search_with_score_by_vector(self, embedding, k=4):
+        self.searches.append((embedding, k))
+        return [(Document(page_content=f"doc {i}"), i / 10) for i in range(k)]
+
+    async def akeyword_search_with_score(self, query, k=4):
+        self.keyword_searches.append((query, k))
+        if self.keyword_results is None:
+            raise RuntimeError("no full-text index")
+        return [(Document(page_content=content), 1.0) for content in self.keyword_results[:k]]
+
+
+@pytest.mark.asyncio
+async def test_retriever_embeds_the_query_and_searches_the_store():
+    store = RecordingStore()
+    embeddings = FakeEmbeddingProvider()
+    retriever = PGVectorAsyncRetriever(store, embeddings, k=2)
+
+    documents = await retriever.aget_relevant_documents("question")
+
+    assert [d.page_content for d in documents] == ["doc 0", "doc 1"]
+    assert store.searches == [(embeddings.embed_query("question"), 2)]
+
+
+def test_to_document_parses_json_metadata():
+    assert to_document("text", json.dumps({"source": "a.pdf"})) == Document(
+        page_content="text", metadata={"source": "a.pdf"}
+    )
+    assert to_document(None, None) == Document(page_content="", metadata={})
+
+
+def test_reciprocal_rank_fusion():
+    a, b, c = (Document(page_content=content) for content in "abc")
+    assert reciprocal_rank_fusion([[a, b, c], [b]]) == [b, a, c]
+    assert reciprocal_rank_fusion([[a], [b]]) == [a, b]
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retriever_fuses_vector_and_keyword_search():
+    store = RecordingStore(keyword_results=["exact name match", "doc 3", "doc 0"])
+    retriever = PGVectorAsyncRetriever(store, FakeEmbeddingProvider(), k=3, fetch_k=4, keyword_search=True)
+
+    documents = await retriever.aget_relevant_documents("formatted query", keyword_query="question")
+
+    assert [d.page_content for d in documents] == ["doc 0", "doc 3", "exact name match"]
+    assert store.keyword_searches == [("question", 4)]
+    assert len(store.searches) == 1
+
+
+@pytest.mark.asyncio
+async def test_hybrid_retriever_falls_back_to_vector_search():
+    store = RecordingStore(keyword_results=None)
+    retriever = PGVectorAsyncRetriever(store, FakeEmbeddingProvider(), k=2, keyword_search=True)
+
+    documents = await retriever.aget_relevant_documents("question")
+
+    assert [d.page_content for d in documents] == ["doc 0", "doc 1"]
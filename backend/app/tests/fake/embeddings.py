@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import hashlib
+import time
+from typing import List
+
+from langchain.schema.embeddings import Embeddings
+
+
+class FakeEmbeddingProvider(Embeddings):
+    """
+    Offline embedding provider with the request profile of a remote API.
+
+    Vectors are derived from a hash of the text. Each request takes `request_latency` plus `text_latency` per text
+    and may embed at most `max_batch_size` texts.
+    """
+
+    def __init__(
+        self,
+        size: int = 16,
+        request_latency: float = 0.0,
+        text_latency: float = 0.0,
+        max_batch_size: int = 2048,
+    ):
+        self.size = size
+        self.request_latency = request_latency
+        self.text_latency = text_latency
+        self.max_batch_size = max_batch_size
+        self.nb_requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255 for i in range(self.size)]
+
+    def _start_request(self, texts: List[str]) -> float:
+        if len(texts) > self.max_batch_size:
+            raise ValueError(f"Too many inputs in one request: {len(texts)} > {self.max_batch_size}")
+        self.nb_requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return self.request_latency + self.text_latency * len(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._start_request(texts))
+        self.in_flight -= 1
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._start_request(texts))
+        self.in_flight -= 1
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -1,12 +1,33 @@
 # -*- coding: utf-8 -*-
-from langchain.vectorstores import VectorStore
+from typing import List, Optional, Sequence
 
+from langchain.schema import Document
+
+from app.db.vector_db_embedding import BatchEmbedder
 from app.db.vector_db_pdf_ingestion import PDFExtractionPipeline
+from app.schemas.ingestion_schema import IndexingConfig
+from tests.fake.embeddings import FakeEmbeddingProvider
+
+
+class FakeVectorWriter:
+    """Collects the written documents instead of copying them to Postgres."""
+
+    def __init__(self):
+        self.documents: List[Document] = []
+
+    def write(
+        self,
+        documents: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+        ids: Optional[Sequence[str]] = None,
+    ) -> int:
+        self.documents.extend(documents)
+        return len(documents)
 
 
-class FakePDFExtractionPipeline(PDFExtractionPipeline):
-    def __init__(self, vector_db: VectorStore):
-        self.vector_db = vector_db
+class OfflinePDFExtractionPipeline(PDFExtractionPipeline):
+    """Ingestion pipeline without database nor embedding API, to test and benchmark the ingestion stages."""
 
-    def run(self, **kwargs):
-        return self.vector_db
+    def __init__(self, pipeline_config: IndexingConfig):
+        self.pipeline_config = pipeline_config
+        self.batch_embedder = BatchEmbedder(FakeEmbeddingProvider(), batch_size=pipeline_config.embedding_batch_size)
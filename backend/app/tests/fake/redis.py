@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.exceptions import ResponseError
+
+
+def _stream_id(event_id: str) -> Tuple[int, int]:
+    milliseconds, _, sequence = event_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the async Redis client (string, sorted set, hash, stream and consumer group commands,
+    no expiry).
+    """
+
+    def __init__(self):
+        self.store: Dict[str, Any] = {}
+        self.groups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._stream_ids = count(1)
+        self._stream_waiters: List[asyncio.Future] = []
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self.store.get(key)
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        return [self.store.get(key) for key in keys]
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        command, *arguments = args
+        if command.upper() == "MGET":
+            return await self.mget(arguments)
+        return await getattr(self, command.lower())(*arguments)
+
+    async def set(self, key: str, value: Any, ex: Optional[int] = None, **kwargs) -> bool:
+        self.store[key] = value
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self.store.pop(key, None) is not None for key in keys)
+
+    async def publish(self, channel: str, message: Any) -> int:
+        return 0
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return key in self.store
+
+    async def exists(self, *keys: str) -> int:
+        return sum(key in self.store for key in keys)
+
+    async def xadd(
+        self, name: str, fields: Dict[str, Any], maxlen: Optional[int] = None, approximate: bool = True
+    ) -> str:
+        stream = self.store.setdefault(name, [])
+        event_id = f"0-{next(self._stream_ids)}"
+        stream.append((event_id, dict(fields)))
+        if maxlen is not None:
+            del stream[:-maxlen]
+        for waiter in self._stream_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._stream_waiters.clear()
+        return event_id
+
+    async def xread(
+        self, streams: Dict[str, str], count: Optional[int] = None, block: Optional[int] = None
+    ) -> List[Any]:
+        while True:
+            response = []
+            for name, last_id in streams.items():
+                entries = [e for e in self.store.get(name, []) if _stream_id(e[0]) > _stream_id(last_id)][:count]
+                if entries:
+                    response.append([name, entries])
+            if response or block is None or not await self._await_stream(block):
+                return response
+
+    async def _await_stream(self, block: int) -> bool:
+        waiter = asyncio.get_running_loop().create_future()
+        self._stream_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, block / 1000)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def xdel(self, name: str, *ids: str) -> int:
+        stream = self.store.get(name, [])
+        self.store[name] = [entry for entry in stream if entry[0] not in ids]
+        return len(stream) - len(self.store[name])
+
+    async def xgroup_create(self, name: str, groupname: str, id: str = "$", mkstream: bool = False) -> bool:
+        if (name, groupname) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        if name not in self.store and not mkstream:
+            raise ResponseError("ERR The XGROUP subcommand requires the key to exist")
+        stream = self.store.setdefault(name, [])
+        last_id = stream[-1][0] if id == "$" and stream else id
+        self.groups[(name, groupname)] = {"last_id": last_id, "pending": {}}
+        return True
+
+    def _deliver(self, group: Dict[str, Any], entry_id: str, consumer: str) -> None:
+        pending = group["pending"].setdefault(entry_id, {"times_delivered": 0})
+        pending.update(consumer=consumer, delivered_at=time.monotonic())
+        pending["times_delivered"] += 1
+
+    async def xreadgroup(
+        self,
+        groupname: str,
+        consumername: str,
+        streams: Dict[str, str],
+        count: Optional[int] = None,
+        block: Optional[int] = None,
+    ) -> List[Any]:
+        while True:
+            response = []
+            for name, last_id in streams.items():
+                group = self.groups[(name, groupname)]
+                assert last_id == ">", "only new entries are supported"
+                entries = [e for e in self.store.get(name, []) if _stream_id(e[0]) > _stream_id(group["last_id"])]
+                entries = entries[:count]
+                for entry_id, _ in entries:
+                    self._deliver(group, entry_id, consumername)
+                if entries:
+                    group["last_id"] = entries[-1][0]
+                    response.append([name, entries])
+            if response or block is None or not await self._await_stream(block):
+                return response
+
+    def _idle_time(self, pending: Dict[str, Any]) -> int:
+        return int((time.monotonic() - pending["delivered_at"]) * 1000)
+
+    async def xautoclaim(
+        self,
+        name: str,
+        groupname: str,
+        consumername: str,
+        min_idle_time: int,
+        start_id: str = "0-0",
+        count: Optional[int] = None,
+    ) -> List[Any]:
+        group = self.groups[(name, groupname)]
+        entries = dict(self.store.get(name, []))
+        claimed, deleted = [], []
+        for entry_id, pending in sorted(group["pending"].items(), key=lambda item: _stream_id(item[0])):
+            if _stream_id(entry_id) < _stream_id(start_id) or self._idle_time(pending) < min_idle_time:
+                continue
+            if count is not None and len(claimed) >= count:
+                break
+            if entry_id not in entries:
+                deleted.append(entry_id)
+                continue
+            self._deliver(group, entry_id, consumername)
+            claimed.append((entry_id, entries[entry_id]))
+        for entry_id in deleted:
+            del group["pending"][entry_id]
+        return ["0-0", claimed, deleted]
+
+    async def xpending_range(
+        self, name: str, groupname: str, min: str, max: str, count: int, consumername: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        group = self.groups[(name, groupname)]
+        return [
+            {
+                "message_id": entry_id,
+                "consumer": pending["consumer"],
+                "time_since_delivered": self._idle_time(pending),
+                "times_delivered": pending["times_delivered"],
+            }
+            for entry_id, pending in sorted(group["pending"].items(), key=lambda item: _stream_id(item[0]))
+            if _stream_id(min) <= _stream_id(entry_id) <= _stream_id(max)
+            and consumername in (None, pending["consumer"])
+        ][:count]
+
+    async def xclaim(
+        self,
+        name: str,
+        groupname: str,
+        consumername: str,
+        min_idle_time: int,
+        message_ids: List[str],
+        justid: bool = False,
+    ) -> List[Any]:
+        group = self.groups[(name, groupname)]
+        claimed = []
+        for entry_id in message_ids:
+            pending = group["pending"].get(entry_id)
+            if pending is None or self._idle_time(pending) < min_idle_time:
+                continue
+            pending.update(consumer=consumername, delivered_at=time.monotonic())
+            if not justid:
+                pending["times_delivered"] += 1
+            claimed.append(entry_id)
+        return claimed
+
+    async def xack(self, name: str, groupname: str, *ids: str) -> int:
+        pending = self.groups[(name, groupname)]["pending"]
+        return sum(pending.pop(entry_id, None) is not None for entry_id in ids)
+
+    async def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        zset = self.store.setdefault(key, {})
+        nb_added = sum(member not in zset for member in mapping)
+        zset.update(mapping)
+        return nb_added
+
+    async def zremrangebyscore(self, key: str, min_score: Any, max_score: float) -> int:
+        zset = self.store.get(key, {})
+        removed = [member for member, score in zset.items() if score <= max_score]
+        for member in removed:
+            del zset[member]
+        return len(removed)
+
+    async def zcard(self, key: str) -> int:
+        return len(self.store.get(key, {}))
+
+    async def zpopmin(self, key: str, count: int = 1) -> List[Tuple[str, float]]:
+        zset = self.store.get(key, {})
+        popped = sorted(zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues the commands of a FakeRedis and runs them in order on execute."""
+
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands: List[Tuple[str, Tuple[Any, ...], Dict[str, Any]]] = []
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        pass
+
+    def __getattr__(self, name: str) -> Any:
+        def queue(*args: Any, **kwargs: Any) -> "FakePipeline":
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> List[Any]:
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeSyncRedis:
+    """In-memory stand-in for the synchronous Redis client (MGET and pipelined SET), counting round trips."""
+
+    def __init__(self):
+        self.store: Dict[str, Any] = {}
+        self.nb_round_trips = 0
+
+    def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        self.nb_round_trips += 1
+        return [self.store.get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True) -> "FakeSyncPipeline":
+        return FakeSyncPipeline(self)
+
+
+class FakeSyncPipeline:
+    def __init__(self, redis: FakeSyncRedis):
+        self.redis = redis
+        self.commands: List[Tuple[str, Any]] = []
+
+    def __enter__(self) -> "FakeSyncPipeline":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def set(self, key: str, value: Any, ex: Optional[int] = None) -> "FakeSyncPipeline":
+        self.commands.append((key, value))
+        return self
+
+    def execute(self) -> List[bool]:
+        self.redis.nb_round_trips += 1
+        self.redis.store.update(self.commands)
+        return [True] * len(self.commands)
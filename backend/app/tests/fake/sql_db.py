@@ -6,7 +6,7 @@ from sqlalchemy.engine.result import Row
 from sqlalchemy.sql import column
 from sqlalchemy.sql.sqltypes import String
 
-from app.db.SQLDatabaseExtended import SQLDatabaseExtended
+from app.db.SQLDatabaseExtended import QuerySample, SQLDatabaseExtended
 
 
 class FakeTable(BaseModel):
@@ -24,3 +24,10 @@ class FakeSQLDatabase(SQLDatabaseExtended):
 
     def run_no_str(self, command: str, fetch: str = "all") -> Sequence | Row | List[Row] | None:
         return ["col1, col2; value1, value2"]
+
+    async def arun_no_str(self, command: str, fetch: str = "all") -> Sequence | Row | List[Row] | None:
+        return self.run_no_str(command, fetch)
+
+    async def asample(self, command: str, nb_rows: int, count_cutoff: int = 10000) -> QuerySample | None:
+        rows = self.run_no_str(command)
+        return QuerySample(columns=[], rows=rows[:nb_rows], row_count=len(rows), row_count_exact=True)
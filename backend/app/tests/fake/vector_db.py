@@ -1,26 +1,17 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import List, Optional
 
 from langchain.schema import Document
-from langchain.vectorstores import VectorStore
 
+from app.db.vector_db_retriever import PGVectorAsyncRetriever
 
-class FakeVectorDB(VectorStore):
-    docs: List[Document]
-
-    def __init__(self, *args, **kwargs):
-        self.docs = kwargs.get("docs", [])
 
-    def add_texts(self):
-        pass
-
-    @classmethod
-    def from_texts(cls):
-        pass
+class FakeRetriever(PGVectorAsyncRetriever):
+    docs: List[Document]
 
-    @classmethod
-    def from_documents(cls, docs: List[Document]):
-        return cls(docs=docs)
+    def __init__(self, docs: List[Document], k: int = 4):  # pylint: disable=super-init-not-called
+        self.docs = docs
+        self.k = k
 
-    def similarity_search(self, query: str, k: int = 1, **kwargs) -> List[Document]:
-        return self.docs[:k]
+    async def aget_relevant_documents(self, query: str, keyword_query: Optional[str] = None) -> List[Document]:
+        return self.docs[: self.k]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from langchain.base_language import BaseLanguageModel
+
+from app.schemas.agent_schema import AgentConfig
+from app.services.chat_agent.agent_registry import MetaAgentRegistry
+
+
+def test_executor_shares_tools_but_not_action_plan(agent_config: AgentConfig, llm: BaseLanguageModel):
+    registry = MetaAgentRegistry(agent_config, get_llm_hook=lambda type, key: llm)  # pylint: disable=unused-argument
+
+    first = registry.get_executor()
+    second = registry.get_executor()
+
+    assert first.agent is not second.agent
+    assert second.agent.action_plan is None
+    # pydantic shallow-copies the tool models, the expensive members (LLM clients, pipelines) are shared
+    assert [id(tool.llm) for tool in first.tools] == [id(tool.llm) for tool in registry.tools]
+    assert [id(tool.llm) for tool in second.tools] == [id(tool.llm) for tool in registry.tools]
+    assert first.agent.llm_chain.llm is registry.default_llm
+
+
+def test_executor_uses_request_api_key(agent_config: AgentConfig, llm: BaseLanguageModel):
+    requested_keys = []
+
+    def get_llm_hook(type, key):  # pylint: disable=unused-argument,redefined-builtin
+        requested_keys.append(key)
+        return llm
+
+    registry = MetaAgentRegistry(agent_config, get_llm_hook=get_llm_hook)
+    registry.get_executor("sk-user-key")
+
+    assert requested_keys[-1] == "sk-user-key"
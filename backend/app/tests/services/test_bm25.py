@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from app.services.chat_agent.helpers.bm25 import bm25_idf, tokenize_identifiers, tokenize_text
+
+
+def test_tokenize_identifiers():
+    assert tokenize_identifiers('"InvoiceLine" customer_id Countries') == [
+        "invoice",
+        "line",
+        "customer",
+        "id",
+        "country",
+    ]
+
+
+def test_tokenize_text_keeps_non_ascii_letters():
+    assert tokenize_text("Beyoncé's albums, Sigur Rós & Motörhead_live") == [
+        "beyoncé",
+        "s",
+        "album",
+        "sigur",
+        "rós",
+        "motörhead",
+        "live",
+    ]
+
+
+def test_rare_tokens_weigh_more():
+    assert bm25_idf(10, 1) > bm25_idf(10, 5) > bm25_idf(10, 10) > 0
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+import pytest
+from langchain.memory import ChatMessageHistory, ConversationTokenBufferMemory
+from langchain.schema import AIMessage, HumanMessage
+
+from app.services.chat_agent.helpers import conversation_memory
+from app.services.chat_agent.helpers.conversation_memory import ConversationMemoryStore
+from tests.fake.redis import FakeRedis
+
+
+def _conversation(nb_turns: int) -> list:
+    messages = []
+    for i in range(nb_turns):
+        messages.append(HumanMessage(content=f"Question {i}: " + "how many albums? " * (i % 7)))
+        messages.append(AIMessage(content=f"Answer {i}: " + "there are 347 albums. " * (i % 5)))
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_window_matches_full_rebuild():
+    store = ConversationMemoryStore(max_token_limit=200, redis_client=FakeRedis())
+    messages = _conversation(30)
+
+    for turn in range(1, 31):
+        incremental = await store.aget_chat_history("conversation", messages[: 2 * turn])
+        rebuilt = await ConversationMemoryStore(max_token_limit=200, redis_client=FakeRedis()).aget_chat_history(
+            "conversation", messages[: 2 * turn]
+        )
+        assert incremental == rebuilt
+    assert 0 < len(incremental) < len(messages)
+    assert incremental == messages[-len(incremental) :]
+
+
+@pytest.mark.asyncio
+async def test_only_new_messages_are_tokenized():
+    store = ConversationMemoryStore(max_token_limit=10_000, redis_client=FakeRedis())
+    messages = _conversation(10)
+    await store.aget_chat_history("conversation", messages[:18])
+
+    with patch.object(
+        conversation_memory, "get_token_lengths", wraps=conversation_memory.get_token_lengths
+    ) as get_token_lengths:
+        history = await store.aget_chat_history("conversation", messages)
+
+    assert len(get_token_lengths.call_args.args[0]) == 2
+    assert history == messages
+
+
+@pytest.mark.asyncio
+async def test_edited_history_is_rebuilt():
+    store = ConversationMemoryStore(max_token_limit=10_000, redis_client=FakeRedis())
+    messages = _conversation(5)
+    await store.aget_chat_history("conversation", messages)
+
+    edited = [HumanMessage(content="A different first question"), *messages[1:]]
+    assert await store.aget_chat_history("conversation", edited) == edited
+
+
+@pytest.mark.asyncio
+async def test_window_matches_conversation_token_buffer_memory(llm):
+    messages = _conversation(20)
+    memory = ConversationTokenBufferMemory(
+        memory_key="chat_history",
+        return_messages=True,
+        max_token_limit=300,
+        llm=llm,
+        chat_memory=ChatMessageHistory(),
+    )
+    with patch.object(type(llm), "get_num_tokens_from_messages", autospec=True) as count:
+        # count like the store does, to compare the pruning only
+        count.side_effect = lambda _, msgs: sum(
+            conversation_memory.get_token_lengths([m.content])[0] + conversation_memory.TOKENS_PER_MESSAGE for m in msgs
+        )
+        for i in range(0, len(messages), 2):
+            memory.save_context({"input": messages[i].content}, {"output": messages[i + 1].content})
+
+    store = ConversationMemoryStore(max_token_limit=300, redis_client=FakeRedis())
+    assert await store.aget_chat_history("conversation", messages) == memory.chat_memory.messages
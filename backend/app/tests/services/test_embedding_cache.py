@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from typing import Optional
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+from app.services.chat_agent.helpers.embedding_cache import CacheBackedEmbeddingsExtended, EmbeddingCache
+from tests.fake.embeddings import FakeEmbeddingProvider
+from tests.fake.redis import FakeRedis, FakeSyncRedis
+
+
+def embedder(
+    redis: FakeSyncRedis, max_size: int = 16, async_redis: Optional[FakeRedis] = None
+) -> CacheBackedEmbeddingsExtended:
+    return CacheBackedEmbeddingsExtended(
+        FakeEmbeddingProvider(size=8),
+        EmbeddingCache(
+            namespace="test",
+            redis_client=redis,
+            get_async_redis_client=AsyncMock(return_value=async_redis) if async_redis is not None else None,
+            max_size=max_size,
+        ),
+    )
+
+
+def test_embed_documents_batches_redis_round_trips():
+    redis = FakeSyncRedis()
+    embeddings = embedder(redis)
+    texts = [f"text {i}" for i in range(10)]
+
+    vectors = embeddings.embed_documents(texts)
+
+    assert redis.nb_round_trips == 2  # one MGET, one pipeline
+    assert embeddings.underlying_embeddings.nb_requests == 1
+    expected = [np.float32(embeddings.underlying_embeddings._embed(text)).tolist() for text in texts]
+    assert vectors == expected
+    assert all(len(value) == 8 * 4 for value in redis.store.values())  # packed float32
+
+
+def test_memory_tier_serves_repeated_queries_without_redis():
+    redis = FakeSyncRedis()
+    embeddings = embedder(redis)
+
+    first = embeddings.embed_query("question")
+    nb_round_trips = redis.nb_round_trips
+    assert embeddings.embed_query("question") == first
+    assert redis.nb_round_trips == nb_round_trips
+    assert embeddings.underlying_embeddings.nb_requests == 1
+
+
+def test_redis_tier_is_shared_across_processes():
+    redis = FakeSyncRedis()
+    vectors = embedder(redis).embed_documents(["a", "b"])
+
+    other_process = embedder(redis)
+    assert other_process.embed_documents(["a", "b", "c"]) == vectors + [other_process.embed_query("c")]
+    assert other_process.underlying_embeddings.nb_requests == 1  # only "c"
+
+
+def test_memory_tier_is_bounded():
+    embeddings = embedder(FakeSyncRedis(), max_size=2)
+    embeddings.embed_documents(["a", "b", "c"])
+    assert len(embeddings.cache._entries) == 2
+
+
+@pytest.mark.asyncio
+async def test_async_embeddings_use_the_async_redis_client():
+    redis, async_redis = FakeSyncRedis(), FakeRedis()
+    embeddings = embedder(redis, async_redis=async_redis)
+
+    vectors = await embeddings.aembed_documents(["a", "b"])
+    assert await embeddings.aembed_query("a") == vectors[0]
+    assert embeddings.underlying_embeddings.nb_requests == 1
+    assert redis.nb_round_trips == 0
+    assert all(isinstance(value, bytes) and len(value) == 8 * 4 for value in async_redis.store.values())
+
+    other_process = embedder(FakeSyncRedis(), async_redis=async_redis)
+    assert await other_process.aembed_documents(["a", "b"]) == vectors
+    assert other_process.underlying_embeddings.nb_requests == 0
+
+
+def test_redis_errors_fall_back_to_the_model():
+    class BrokenRedis(FakeSyncRedis):
+        def mget(self, keys):
+            raise ConnectionError("redis is down")
+
+    embeddings = embedder(BrokenRedis())
+    assert len(embeddings.embed_query("question")) == 8
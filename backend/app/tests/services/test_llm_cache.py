@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from langchain.base_language import BaseLanguageModel
+from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema.embeddings import Embeddings
+
+from app.schemas.agent_schema import AgentConfig
+from app.schemas.streaming_schema import StreamingDataTypeEnum, StreamingSignalsEnum
+from app.services.chat_agent.helpers.llm_cache import LLMResponseCache, areplay_cached_response
+from app.services.chat_agent.tools.library.basellm_tool.basellm_tool import BaseLLM
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from tests.fake.redis import FakeRedis
+
+
+class KeywordEmbeddings(Embeddings):
+    """Embeds a text on the keywords it contains."""
+
+    keywords = ["sales", "revenue", "chart"]
+
+    def __init__(self) -> None:
+        self.nb_calls = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.nb_calls += 1
+        return [float(keyword in text) for keyword in self.keywords] + [0.1]
+
+
+def prompt(question: str, system: str = "You are an analyst.") -> list:
+    return [SystemMessage(content=system), HumanMessage(content=question)]
+
+
+@pytest.mark.asyncio
+async def test_exact_tier_is_scoped_by_cache_and_llm():
+    cache = LLMResponseCache(redis_client=FakeRedis())
+    await cache.aupdate("sql_tool", "gpt-4", prompt("sales in 2023?"), "SELECT 1")
+
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("sales in 2023?")) == "SELECT 1"
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("sales in 2024?")) is None
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("sales in 2023?")) is None
+    assert await cache.alookup("sql_tool", "gpt-3.5-turbo", prompt("sales in 2023?")) is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_tier_matches_similar_last_message_with_same_context():
+    cache = LLMResponseCache(redis_client=FakeRedis(), embeddings=KeywordEmbeddings())
+    await cache.aupdate("expert_tool", "gpt-4", prompt("Show the sales per month"), "answer", semantic=True)
+
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("How many sales last month?")) is None
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("How many sales last month?"), 0.95) == "answer"
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("Draw a revenue chart"), 0.95) is None
+    other_context = prompt("How many sales last month?", system="You are a poet.")
+    assert await cache.alookup("expert_tool", "gpt-4", other_context, 0.95) is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_tier_evicts_oldest_prompts_and_skips_empty_scopes():
+    redis = FakeRedis()
+    embeddings = KeywordEmbeddings()
+    cache = LLMResponseCache(redis_client=redis, embeddings=embeddings, semantic_max_entries=2)
+    for question in ["Show the sales", "Show the revenue", "Draw a chart"]:
+        await cache.aupdate("expert_tool", "gpt-4", prompt(question), question, semantic=True)
+
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("sales per year"), 0.95) is None
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("revenue per year"), 0.95) == "Show the revenue"
+    assert await cache.alookup("expert_tool", "gpt-4", prompt("chart per year"), 0.95) == "Draw a chart"
+
+    nb_calls = embeddings.nb_calls
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("revenue per year"), 0.95) is None
+    assert embeddings.nb_calls == nb_calls
+    assert not any(key.startswith("llm_cache:expert_tool:semantic") for key in redis.store)
+
+
+def test_semantic_tier_is_opt_in(agent_config: AgentConfig):
+    assert all(config.llm_cache_similarity_threshold is None for config in agent_config.tools_library.library.values())
+
+
+@pytest.mark.asyncio
+async def test_entries_are_capped_and_large_responses_skipped():
+    redis = FakeRedis()
+    cache = LLMResponseCache(redis_client=redis, max_entries=2, max_response_bytes=10)
+    for i in range(3):
+        await cache.aupdate("sql_tool", "gpt-4", prompt(f"question {i}"), f"answer {i}")
+    await cache.aupdate("sql_tool", "gpt-4", prompt("long"), "a very long answer")
+
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("question 0")) is None
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("question 2")) == "answer 2"
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("long")) is None
+    assert len(redis.store["llm_cache:sql_tool:index"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_misses():
+    class BrokenRedis(FakeRedis):
+        async def get(self, key):
+            raise ConnectionError("redis is down")
+
+    cache = LLMResponseCache(redis_client=BrokenRedis())
+    await cache.aupdate("sql_tool", "gpt-4", prompt("question"), "answer")
+    assert await cache.alookup("sql_tool", "gpt-4", prompt("question")) is None
+
+
+@pytest.mark.asyncio
+async def test_tool_reuses_cached_response(agent_config: AgentConfig, llm: BaseLanguageModel, tool_input: str):
+    cache = LLMResponseCache(redis_client=FakeRedis())
+    with patch("app.services.chat_agent.tools.library.basellm_tool.basellm_tool.get_llm", return_value=llm), patch(
+        "app.services.chat_agent.tools.ExtendedBaseTool.get_llm_response_cache", return_value=cache
+    ):
+        tool = BaseLLM.from_config(
+            config=agent_config.tools_library.library["expert_tool"], common_config=agent_config.common
+        )
+        assert await tool._arun(tool_input) == "0"
+        assert await tool._arun(tool_input) == "1"  # the cache is opt-in
+
+        tool.llm_cache = True
+        assert await tool._arun(tool_input) == "2"
+        assert await tool._arun(tool_input) == "2"
+
+
+@pytest.mark.asyncio
+async def test_cached_response_is_streamed(llm: BaseLanguageModel):
+    with patch("app.utils.streaming.callbacks.stream.settings.ENABLE_LLM_CACHE", True):
+        handler = AsyncIteratorCallbackHandler()
+        await areplay_cached_response(llm, prompt("question"), "cached answer", callbacks=[handler])
+
+    streamed = [handler.queue.get_nowait() for _ in range(handler.queue.qsize())]
+    assert [(data.data, data.data_type) for data in streamed[1:]] == [
+        ("cached answer", StreamingDataTypeEnum.LLM),
+        (StreamingSignalsEnum.LLM_END.value, StreamingDataTypeEnum.SIGNAL),
+    ]
+    assert not handler.run_id_cached
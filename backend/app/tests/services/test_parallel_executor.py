@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from typing import Any, List, Optional, Tuple, Union
+
+import pytest
+from langchain.agents import BaseMultiActionAgent
+from langchain.callbacks.manager import AsyncCallbackManagerForToolRun
+from langchain.schema import AgentAction, AgentFinish, OutputParserException
+from langchain.tools import BaseTool
+
+from app.schemas.streaming_schema import StreamingDataTypeEnum
+from app.services.chat_agent.parallel_executor import ParallelAgentExecutor
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+
+
+class SleepingTool(BaseTool):
+    delay: float = 0.0
+    fail: bool = False
+
+    def _run(self, *args: Any, **kwargs: Any) -> str:
+        raise NotImplementedError
+
+    async def _arun(self, *args: Any, run_manager: Optional[AsyncCallbackManagerForToolRun] = None, **kwargs: Any):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ValueError(f"{self.name} broke")
+        if run_manager:
+            await run_manager.on_text(f"{self.name} result", data_type=StreamingDataTypeEnum.TEXT)
+        return f"{self.name} result"
+
+
+class OneStepAgent(BaseMultiActionAgent):
+    tool_names: List[str]
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["input"]
+
+    def plan(self, intermediate_steps: List[Tuple[AgentAction, str]], **kwargs: Any):
+        raise NotImplementedError
+
+    async def aplan(
+        self,
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        **kwargs: Any,
+    ) -> Union[List[AgentAction], AgentFinish]:
+        if intermediate_steps:
+            return AgentFinish({"output": [observation for _, observation in intermediate_steps]}, "")
+        return [AgentAction(tool=name, tool_input="", log="") for name in self.tool_names]
+
+
+def create_executor(tools: List[BaseTool], **kwargs: Any) -> ParallelAgentExecutor:
+    return ParallelAgentExecutor.from_agent_and_tools(
+        agent=OneStepAgent(tool_names=[tool.name for tool in tools]),
+        tools=tools,
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_tools_of_a_step_run_concurrently():
+    tools = [SleepingTool(name=f"tool_{i}", description="", delay=0.2) for i in range(4)]
+
+    start = time.perf_counter()
+    output = await create_executor(tools).arun(input="")
+
+    assert time.perf_counter() - start < 0.5
+    assert output == [f"tool_{i} result" for i in range(4)]
+
+
+@pytest.mark.asyncio
+async def test_failing_and_timed_out_tools_do_not_fail_the_step():
+    tools = [
+        SleepingTool(name="slow_tool", description="", delay=5),
+        SleepingTool(name="broken_tool", description="", fail=True),
+        SleepingTool(name="fast_tool", description=""),
+    ]
+
+    output = await create_executor(tools, default_tool_timeout=0.1).arun(input="")
+
+    assert output[0] == "slow_tool timed out after 0.1 seconds"
+    assert output[1].startswith("broken_tool failed: ValueError")
+    assert output[2] == "fast_tool result"
+
+
+@pytest.mark.asyncio
+async def test_stream_events_keep_action_order():
+    tools = [
+        SleepingTool(name="slow_tool", description="", delay=0.2),
+        SleepingTool(name="fast_tool", description=""),
+    ]
+    stream_handler = AsyncIteratorCallbackHandler()
+
+    await create_executor(tools, tool_timeouts={"fast_tool": 1}).arun(input="", callbacks=[stream_handler])
+
+    events = []
+    while not stream_handler.queue.empty():
+        events.append(stream_handler.queue.get_nowait())
+    tool_events = [(e.data, e.metadata.get("tool")) for e in events if e.data_type != StreamingDataTypeEnum.SIGNAL]
+    assert tool_events == [
+        ("slow_tool", "slow_tool"),
+        ("slow_tool result", None),
+        ("fast_tool", "fast_tool"),
+        ("fast_tool result", None),
+    ]
+
+
+class UnparsableOutputAgent(OneStepAgent):
+    nb_plans: int = 0
+
+    async def aplan(
+        self,
+        intermediate_steps: List[Tuple[AgentAction, str]],
+        **kwargs: Any,
+    ) -> Union[List[AgentAction], AgentFinish]:
+        self.nb_plans += 1
+        if not intermediate_steps:
+            raise OutputParserException("not an action")
+        return await super().aplan(intermediate_steps, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_parsing_errors_are_observations_without_planning_again():
+    agent = UnparsableOutputAgent(tool_names=[])
+    executor = ParallelAgentExecutor.from_agent_and_tools(agent=agent, tools=[], handle_parsing_errors=True)
+
+    assert await executor.arun(input="") == ["Invalid or incomplete response"]
+    assert agent.nb_plans == 2
+
+    executor.handle_parsing_errors = False
+    with pytest.raises(ValueError, match="not an action"):
+        await executor.arun(input="")
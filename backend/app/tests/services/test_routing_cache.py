@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from typing import List
+
+import pytest
+from langchain.schema import AIMessage, HumanMessage
+from langchain.schema.embeddings import Embeddings
+
+from app.services.chat_agent.helpers.routing_cache import RoutingCache
+
+
+class KeywordEmbeddings(Embeddings):
+    """Embeds a text on the keywords it contains."""
+
+    keywords = ["sales", "revenue", "chart", "pdf"]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(keyword in text) for keyword in self.keywords] + [0.1]
+
+
+@pytest.mark.asyncio
+async def test_exact_tier_ignores_case_and_whitespace_but_not_history():
+    routing_cache = RoutingCache()
+    await routing_cache.aset("What were the sales in 2023?", [], "1")
+
+    assert await routing_cache.aget("  what were the SALES in 2023? ", []) == "1"
+    chat_history = [HumanMessage(content="hi"), AIMessage(content="")]
+    assert await routing_cache.aget("What were the sales in 2023?", chat_history) is None
+
+
+@pytest.mark.asyncio
+async def test_semantic_tier_matches_similar_questions():
+    routing_cache = RoutingCache(embeddings=KeywordEmbeddings(), similarity_threshold=0.95)
+    await routing_cache.aset("Show the sales per month", [], "1")
+    await routing_cache.aset("Summarize the pdf", [], "3")
+
+    assert await routing_cache.aget("How many sales last month?", []) == "1"
+    assert await routing_cache.aget("Draw a revenue chart", []) is None
+
+
+@pytest.mark.asyncio
+async def test_eviction_by_size_and_ttl():
+    routing_cache = RoutingCache(max_size=2)
+    for i in range(3):
+        await routing_cache.aset(f"question {i}", [], str(i))
+    assert await routing_cache.aget("question 0", []) is None
+    assert await routing_cache.aget("question 2", []) == "2"
+
+    expired_cache = RoutingCache(ttl=0)
+    await expired_cache.aset("question", [], "0")
+    assert await expired_cache.aget("question", []) is None
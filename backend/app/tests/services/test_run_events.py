@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+
+import pytest
+from langchain.schema import AgentFinish
+
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum, StreamingSignalsEnum
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.helpers import sse_event_generator
+from app.utils.streaming.run_events import RunEventStream, apublish_run_events
+from tests.fake.redis import FakeRedis
+
+
+async def read_events(reader) -> list:
+    return [event async for event in reader]
+
+
+async def read_all(events: RunEventStream, last_event_id=None) -> list:
+    return [event async for event in events.aread(last_event_id, block=0.01, idle_timeout=1) if event is not None]
+
+
+@pytest.mark.asyncio
+async def test_events_resume_after_the_last_event_id():
+    events = RunEventStream("run", redis_client=FakeRedis())
+    for data in ["a", "b", "c"]:
+        await events.apublish(StreamingData(data=data))
+    await events.aclose()
+
+    all_events = await read_all(events)
+    assert [json.loads(event.data)["data"] for event in all_events] == ["a", "b", "c"]
+    assert [event.id for event in all_events] == sorted(event.id for event in all_events)
+
+    resumed = await read_all(events, last_event_id=all_events[0].id)
+    assert [json.loads(event.data)["data"] for event in resumed] == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_reader_waits_for_live_events_and_sends_heartbeats():
+    events = RunEventStream("run", redis_client=FakeRedis())
+    await events.apublish(StreamingData(data="a"))
+    reader = events.aread(block=0.01, idle_timeout=1)
+
+    assert json.loads((await reader.__anext__()).data)["data"] == "a"
+    assert await reader.__anext__() is None  # heartbeat
+    await events.apublish(StreamingData(data="b"))
+    assert json.loads((await reader.__anext__()).data)["data"] == "b"
+    await events.aclose()
+    with pytest.raises(StopAsyncIteration):
+        await reader.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_reader_gives_up_on_idle_runs():
+    events = RunEventStream("run", redis_client=FakeRedis())
+    await events.apublish(StreamingData(data="a"))
+    reader = events.aread(block=0.01, idle_timeout=0.05)
+    received = await asyncio.wait_for(read_events(reader), timeout=1)
+    assert [json.loads(event.data)["data"] for event in received if event is not None] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_reader_waits_for_the_first_event_of_a_queued_run():
+    events = RunEventStream("run", redis_client=FakeRedis())
+    reader = asyncio.create_task(read_events(events.aread(block=0.01, idle_timeout=0.02)))
+    await asyncio.sleep(0.1)  # queued longer than the idle timeout
+    await events.apublish(StreamingData(data="a"))
+    received = await asyncio.wait_for(reader, timeout=1)
+    assert [json.loads(event.data)["data"] for event in received if event is not None] == ["a"]
+
+    expired = RunEventStream("expired", redis_client=FakeRedis(), ttl=0)
+    assert await asyncio.wait_for(read_events(expired.aread(block=0.01, idle_timeout=1)), timeout=1) == []
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_bounded():
+    redis = FakeRedis()
+    events = RunEventStream("run", redis_client=redis, max_len=2)
+    for data in ["a", "b", "c"]:
+        await events.apublish(StreamingData(data=data))
+    assert len(redis.store[events.key]) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_is_published_as_server_sent_events():
+    events = RunEventStream("run", redis_client=FakeRedis())
+    handler = AsyncIteratorCallbackHandler()
+    publisher = asyncio.create_task(apublish_run_events(handler, events))
+    await handler.on_llm_new_token("Hello", run_id="llm")
+    await handler.on_agent_finish(AgentFinish(return_values={}, log=""))
+    await publisher
+
+    frames = [frame async for frame in sse_event_generator(events)]
+    parsed = [dict(line.split(": ", 1) for line in frame.decode().strip().split("\n")) for frame in frames]
+    assert [json.loads(event["data"])["data"] for event in parsed] == [
+        StreamingSignalsEnum.START.value,
+        "Hello",
+        StreamingSignalsEnum.END.value,
+    ]
+    assert json.loads(parsed[1]["data"])["data_type"] == StreamingDataTypeEnum.LLM.value
+    assert [event["id"] for event in parsed] == [event.id for event in await read_all(events)]
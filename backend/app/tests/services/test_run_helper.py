@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from app.services.chat_agent.helpers.run_helper import cancel_local_run, get_run_token, is_running, start_run
+
+
+@pytest.mark.asyncio
+async def test_cancel_local_run_aborts_in_flight_work():
+    started = asyncio.Event()
+
+    async def long_running_tool():
+        started.set()
+        await asyncio.sleep(60)
+
+    task = start_run("run-to-cancel", long_running_tool())
+    await started.wait()
+    assert await is_running("run-to-cancel")
+
+    assert cancel_local_run("run-to-cancel")
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(task, timeout=1)
+    assert get_run_token("run-to-cancel") is None
+
+
+@pytest.mark.asyncio
+async def test_finished_run_is_unregistered():
+    task = start_run("run-to-finish", asyncio.sleep(0))
+    assert get_run_token("run-to-finish") is not None
+    await task
+    await asyncio.sleep(0)
+    assert get_run_token("run-to-finish") is None
+    assert not cancel_local_run("run-to-finish")
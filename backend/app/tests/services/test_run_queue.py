@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from typing import Optional
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from langchain.agents import AgentExecutor
+
+from app.schemas.message_schema import IAgentRun, IChatMessage, IChatQuery, ICreatorRole
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum, StreamingSignalsEnum
+from app.services.chat_agent.run_queue import AgentRunWorker, RunQueue
+from app.utils import uuid7
+from app.utils.streaming.helpers import ndjson_event_generator
+from app.utils.streaming.run_events import RunEventStream
+from tests.fake.redis import FakeRedis
+
+
+@pytest.fixture
+def redis() -> FakeRedis:
+    fake_redis = FakeRedis()
+    with patch("app.api.deps.get_redis_client", new_callable=AsyncMock, return_value=fake_redis), patch(
+        "app.api.deps.get_redis_blocking_client", new_callable=AsyncMock, return_value=fake_redis
+    ):
+        yield fake_redis
+
+
+def agent_run(api_key: Optional[str] = None) -> IAgentRun:
+    return IAgentRun(
+        run_id=str(uuid7()),
+        chat=IChatQuery(
+            messages=[IChatMessage(role=ICreatorRole.USER, content="Hello, I am a test user.")],
+            api_key=api_key,
+            conversation_id=uuid7(),
+            new_message_id=uuid7(),
+            user_email="",
+            settings=None,
+        ),
+    )
+
+
+async def read_run(run_id: str) -> list:
+    events = RunEventStream(run_id)
+    lines = b"".join([chunk async for chunk in ndjson_event_generator(events)]).split(b"\n")
+    return [json.loads(line)["data"] for line in lines]
+
+
+async def run_step(worker: AgentRunWorker) -> None:
+    await worker.astep()
+    await asyncio.wait_for(asyncio.gather(*worker.running.values()), timeout=10)
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_enqueued_runs_and_publishes_events(
+    redis: FakeRedis, meta_agent: AgentExecutor  # pylint: disable=redefined-outer-name
+):
+    queue = RunQueue(redis, stream="runs")
+    await queue.aensure_group()
+    await queue.aensure_group()  # the group already exists
+    runs = [agent_run(), agent_run()]
+    for run in runs:
+        await queue.aenqueue(run)
+    worker = AgentRunWorker(queue, "worker", concurrency=1, get_executor=lambda _: meta_agent, block=0.01)
+
+    await worker.astep()
+    assert len(worker.running) == 1  # bounded concurrency
+    await asyncio.wait_for(asyncio.gather(*worker.running.values()), timeout=10)
+    await run_step(worker)
+
+    for run in runs:
+        data = await read_run(run.run_id)
+        assert data[0] == StreamingSignalsEnum.START.value
+        assert data[-1] == StreamingSignalsEnum.END.value
+    assert redis.store["runs"] == []
+    assert redis.groups[("runs", queue.group)]["pending"] == {}
+
+
+@pytest.mark.asyncio
+async def test_runs_of_a_dead_worker_are_claimed(
+    redis: FakeRedis, meta_agent: AgentExecutor  # pylint: disable=redefined-outer-name
+):
+    queue = RunQueue(redis, stream="runs")
+    await queue.aensure_group()
+    run = agent_run()
+    await queue.aenqueue(run)
+    [queued_run] = await queue.aread("dead", count=1, block=0.01)
+    worker = AgentRunWorker(queue, "worker", get_executor=lambda _: meta_agent, block=0.01, claim_idle_time=0.05)
+
+    await queue.aheartbeat("dead", [queued_run.entry_id])
+    assert await queue.aclaim_stale("worker", count=1, min_idle_time=0.05) == []
+    await asyncio.sleep(0.06)
+    await run_step(worker)
+
+    assert (await read_run(run.run_id))[-1] == StreamingSignalsEnum.END.value
+    assert redis.groups[("runs", queue.group)]["pending"] == {}
+
+    # a run that died after publishing part of its answer is not run again into the same events
+    interrupted_run = agent_run()
+    await queue.aenqueue(interrupted_run)
+    await queue.aread("dead", count=1, block=0.01)
+    await RunEventStream(interrupted_run.run_id).apublish(
+        StreamingData(data=StreamingSignalsEnum.START.value, data_type=StreamingDataTypeEnum.SIGNAL)
+    )
+    await asyncio.sleep(0.06)
+    await run_step(worker)
+
+    assert await read_run(interrupted_run.run_id) == [StreamingSignalsEnum.START.value, "The run was interrupted."]
+    assert redis.groups[("runs", queue.group)]["pending"] == {}
+
+
+@pytest.mark.asyncio
+async def test_runs_failing_too_many_times_are_dropped(redis: FakeRedis):  # pylint: disable=redefined-outer-name
+    queue = RunQueue(redis, stream="runs")
+    await queue.aensure_group()
+    run = agent_run()
+    await queue.aenqueue(run)
+    await queue.aread("dead", count=1, block=0.01)
+    get_executor = AsyncMock(side_effect=AssertionError("the run must not start"))
+    worker = AgentRunWorker(
+        queue, "worker", get_executor=get_executor, block=0.01, claim_idle_time=0.01, max_deliveries=1
+    )
+
+    await asyncio.sleep(0.02)
+    await run_step(worker)
+
+    assert await read_run(run.run_id) == ["The run failed too many times."]
+    assert redis.groups[("runs", queue.group)]["pending"] == {}
+
+
+@pytest.mark.asyncio
+async def test_runs_cancelled_while_queued_are_not_started(redis: FakeRedis):  # pylint: disable=redefined-outer-name
+    queue = RunQueue(redis, stream="runs")
+    await queue.aensure_group()
+    run = agent_run()
+    await queue.aenqueue(run)
+    get_executor = AsyncMock(side_effect=AssertionError("the run must not start"))
+    worker = AgentRunWorker(queue, "worker", get_executor=get_executor, block=0.01)
+
+    with patch(
+        "app.services.chat_agent.helpers.run_helper.get_redis_client", new_callable=AsyncMock, return_value=redis
+    ):
+        await run_step(worker)
+
+    assert await read_run(run.run_id) == ["The run was cancelled."]
+
+
+@pytest.mark.asyncio
+async def test_api_keys_are_not_stored_in_the_queue(
+    redis: FakeRedis, meta_agent: AgentExecutor  # pylint: disable=redefined-outer-name
+):
+    queue = RunQueue(redis, stream="runs")
+    await queue.aensure_group()
+    run, expired_run = agent_run(api_key="sk-user"), agent_run(api_key="sk-expired")
+    await queue.aenqueue(run)
+    await queue.aenqueue(expired_run)
+    assert "sk-user" not in json.dumps(redis.store["runs"])
+    del redis.store[f"agent_run_api_key:{expired_run.run_id}"]
+    get_executor = MagicMock(return_value=meta_agent)
+    worker = AgentRunWorker(queue, "worker", get_executor=get_executor, block=0.01)
+
+    await run_step(worker)
+
+    get_executor.assert_called_once_with("sk-user")
+    assert (await read_run(run.run_id))[-1] == StreamingSignalsEnum.END.value
+    assert await read_run(expired_run.run_id) == ["The run waited too long in the queue."]
+    assert f"agent_run_api_key:{run.run_id}" not in redis.store
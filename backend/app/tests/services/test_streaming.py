@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+from langchain.schema import AgentFinish
+
+from app.schemas.streaming_schema import StreamingData, StreamingDataTypeEnum, StreamingSignalsEnum
+from app.utils.streaming.callbacks.stream import AsyncIteratorCallbackHandler
+from app.utils.streaming.stream_queue import StreamQueue
+from app.utils.streaming.StreamingJsonListResponse import encode_item
+
+
+async def collect(handler: AsyncIteratorCallbackHandler) -> list:
+    return [item async for item in handler.aiter()]
+
+
+@pytest.mark.asyncio
+async def test_tokens_of_a_run_are_coalesced_into_frames():
+    handler = AsyncIteratorCallbackHandler()
+    first_run, second_run = uuid4(), uuid4()
+    for token in ["Hel", "lo", " world"]:
+        await handler.on_llm_new_token(token, run_id=first_run, chunk=object())
+    await handler.on_llm_new_token("Bye", run_id=second_run)
+    await handler.on_agent_finish(AgentFinish(return_values={}, log=""))
+
+    items = await asyncio.wait_for(collect(handler), timeout=1)
+
+    assert [(item.data, item.data_type) for item in items] == [
+        (StreamingSignalsEnum.START.value, StreamingDataTypeEnum.SIGNAL),
+        ("Hello world", StreamingDataTypeEnum.LLM),
+        ("Bye", StreamingDataTypeEnum.LLM),
+        (StreamingSignalsEnum.END.value, StreamingDataTypeEnum.SIGNAL),
+    ]
+    assert "chunk" not in items[1].metadata
+
+
+@pytest.mark.asyncio
+async def test_open_frame_is_held_for_the_frame_interval():
+    queue = StreamQueue(frame_interval=0.05, max_frame_size=8)
+    run_id = uuid4()
+
+    async def produce():
+        for token in ["a", "b", "c"]:
+            queue.put_token(token, run_id, dict)
+            await asyncio.sleep(0.005)
+        queue.put_token("0123456789", run_id, dict)  # the frame is full after this token
+        queue.put_token("d", run_id, dict)
+        queue.close()
+
+    producer = asyncio.create_task(produce())
+    frames = []
+    while (item := await queue.get()) is not None:
+        frames.append(item.data)
+    await producer
+
+    assert frames == ["abc0123456789", "d"]
+
+
+@pytest.mark.asyncio
+async def test_consumer_waits_for_items_and_stops_when_closed():
+    queue = StreamQueue()
+    consumer = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    queue.put_nowait(StreamingData(data="action", data_type=StreamingDataTypeEnum.ACTION))
+    assert (await consumer).data == "action"
+
+    consumer = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    queue.close()
+    assert await consumer is None
+
+
+def test_encoding_matches_the_json_encoder():
+    item = StreamingData(
+        data="réponse",
+        data_type=StreamingDataTypeEnum.LLM,
+        metadata={"run_id": uuid4(), "time": datetime(2024, 1, 2, 3, 4, 5, 6), "tags": ["a"], "step": 1},
+    )
+    assert orjson.loads(encode_item(item)) == json.loads(json.dumps(jsonable_encoder(item.model_dump())))
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from app.services.chat_agent.helpers.llm import get_encoding, get_token_length, get_token_lengths
+
+
+def test_token_lengths_match_tiktoken():
+    strings = ["Hello, I am a test user.", "", "This is the AI message response " * 20, "Hello, I am a test user."]
+    expected = [len(get_encoding().encode(s)) for s in strings]
+
+    assert get_token_lengths(strings) == expected
+    assert [get_token_length(s) for s in strings] == expected
+
+
+def test_encoder_is_memoized():
+    assert get_encoding("gpt-4") is get_encoding("gpt-4")
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from langchain.schema import Document
+
+from app.services.chat_agent.helpers.llm import get_token_length
+from app.services.chat_agent.tools.library.pdf_tool.passage_reranker import PassageReranker
+
+FILLER = "The weather was mild that year and nothing else happened. "
+
+
+def test_split_passages_groups_sentences_up_to_the_passage_size():
+    reranker = PassageReranker(passage_max_tokens=30)
+    text = FILLER * 5 + "\n\nA new paragraph."
+
+    passages = reranker.split_passages(text)
+
+    assert len(passages) > 1
+    assert all(length <= 30 for _, length in passages)
+    assert passages[-1][0].endswith("A new paragraph.")
+
+
+def test_rerank_keeps_the_answering_passages_within_the_budget():
+    documents = [
+        Document(page_content=FILLER * 10, metadata={"source": "filler.pdf"}),
+        Document(
+            page_content=FILLER * 5 + "Freddie Mercury was born in Zanzibar in 1946. " + FILLER * 5,
+            metadata={"source": "queen.pdf"},
+        ),
+    ]
+    reranker = PassageReranker(max_tokens=40, passage_max_tokens=20)
+
+    reranked = reranker.rerank("Where was Freddie Mercury born?", documents)
+
+    queen = [d for d in reranked if d.metadata == {"source": "queen.pdf"}]
+    assert queen[0].page_content == "Freddie Mercury was born in Zanzibar in 1946."
+    assert sum(get_token_length(d.page_content) for d in reranked) <= 40 + len(reranked)
+
+
+def test_rerank_truncates_a_passage_over_the_budget():
+    reranker = PassageReranker(max_tokens=5, passage_max_tokens=100)
+
+    reranked = reranker.rerank("weather", [Document(page_content=FILLER)])
+
+    assert len(reranked) == 1
+    assert get_token_length(reranked[0].page_content) <= 5
+    assert reranker.rerank("weather", []) == []
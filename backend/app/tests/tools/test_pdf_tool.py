@@ -7,8 +7,7 @@ from langchain.schema import Document
 
 from app.schemas.agent_schema import AgentConfig
 from app.services.chat_agent.tools.library.pdf_tool.pdf_tool import PDFTool
-from tests.fake.pdf_pipeline import FakePDFExtractionPipeline
-from tests.fake.vector_db import FakeVectorDB
+from tests.fake.vector_db import FakeRetriever
 
 
 @pytest.fixture(autouse=True)
@@ -18,15 +17,13 @@ def mock_llm_call(llm: BaseLanguageModel):  # pylint: disable=redefined-outer-na
 
 
 @pytest.fixture
-def pdf_pipeline():
-    db = FakeVectorDB.from_documents(docs=[Document(page_content="This is a test document.")])
-    pdf_pipeline = FakePDFExtractionPipeline(vector_db=db)
-    return pdf_pipeline
+def retriever():
+    return FakeRetriever(docs=[Document(page_content="This is a test document.")])
 
 
 @pytest.fixture(autouse=True)
-def fake_get_pdf_pipeline(pdf_pipeline: FakePDFExtractionPipeline):  # pylint: disable=redefined-outer-name
-    with patch("app.services.chat_agent.tools.library.pdf_tool.pdf_tool.get_pdf_pipeline", return_value=pdf_pipeline):
+def fake_get_pdf_retriever(retriever: FakeRetriever):  # pylint: disable=redefined-outer-name
+    with patch("app.services.chat_agent.tools.library.pdf_tool.pdf_tool.get_pdf_retriever", return_value=retriever):
         yield
 
 
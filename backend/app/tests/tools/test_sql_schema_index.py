@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from typing import List
+
+import pytest
+from langchain.schema.embeddings import Embeddings
+
+from app.schemas.tool_schemas.sql_tool_schema import TableInfo
+from app.services.chat_agent.tools.library.sql_tool.schema_index import SchemaIndex
+
+TABLES = [
+    TableInfo(
+        schema_name="public",
+        table_name=name,
+        structure=f'CREATE TABLE "{name}" ({columns})\n\n/*\n3 rows from {name} table:\n...\n*/',
+    )
+    for name, columns in [
+        ("Artist", '"ArtistId" INTEGER, "Name" VARCHAR'),
+        ("Album", '"AlbumId" INTEGER, "Title" VARCHAR, "ArtistId" INTEGER'),
+        ("InvoiceLine", '"InvoiceLineId" INTEGER, "TrackId" INTEGER, "UnitPrice" NUMERIC, "Quantity" INTEGER'),
+        ("Customer", '"CustomerId" INTEGER, "FirstName" VARCHAR, "Country" VARCHAR'),
+    ]
+]
+
+
+class TopicEmbeddings(Embeddings):
+    """Embeds a text on the topics it mentions."""
+
+    topics = [["artist", "album", "band"], ["invoice", "price", "revenue"], ["customer", "country"]]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(any(word in text.lower() for word in topic)) for topic in self.topics] + [0.01]
+
+
+def test_get_tables_is_case_insensitive():
+    index = SchemaIndex(TABLES)
+    assert [t.name for t in index.get_tables(["PUBLIC.customer", "public.Artist", "public.missing"])] == [
+        "public.Artist",
+        "public.Customer",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_keyword_search_is_confident_on_table_names():
+    index = SchemaIndex(TABLES)
+
+    tables, confident = await index.asearch("How many customers are there per country?")
+    assert tables[0] == "public.Customer"
+    assert confident
+
+    _, confident = await index.asearch("What is the weather like?")
+    assert not confident
+
+
+@pytest.mark.asyncio
+async def test_vector_search_finds_tables_without_name_match():
+    index = SchemaIndex(TABLES, embeddings=TopicEmbeddings(), min_similarity=0.9)
+
+    tables, confident = await index.asearch("Which band has the most records?")
+    assert set(tables[:2]) == {"public.Artist", "public.Album"}
+    assert confident
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
 
 import pytest
 from langchain.base_language import BaseLanguageModel
 
+from app.db.session import DatabaseResources
 from app.schemas.agent_schema import AgentConfig
 from app.services.chat_agent.tools.library.sql_tool.sql_tool import SQLTool
 from tests.fake.sql_db import FakeDBInfo, FakeSQLDatabase, FakeTable
@@ -28,7 +29,7 @@ def patch_check_init():  # pylint: disable=redefined-outer-name
 def sql_tool_db():
     db_info = FakeDBInfo(tables=[FakeTable(name="fake_table", structure="test_structure")])
     fake_db = FakeSQLDatabase(db_info=db_info)
-    with patch("app.services.chat_agent.tools.library.sql_tool.sql_tool.sql_tool_db", new=fake_db):
+    with patch.object(DatabaseResources, "sql_tool_db", new_callable=PropertyMock, return_value=fake_db):
         yield
 
 
@@ -7,4 +7,5 @@ export type ExecutionResult = {
   rawResult: Array<Record<string, any>>
   affectedRows?: number | null
   error?: string | null
+  truncated?: boolean
 }
@@ -7,6 +7,9 @@ export const getMessageFromExecutionResult = (result: ExecutionResult): string =
   if (result.affectedRows) {
     return `${result.affectedRows} rows affected.`
   }
+  if (result.truncated) {
+    return `Only the first ${result.rawResult.length} rows are shown.`
+  }
   return ""
 }
 